@@ -2,6 +2,9 @@ import time
 import heapq
 from typing import List, Tuple, Optional, Set, FrozenSet
 
+from level_context import LevelContext, get_level_context
+from search_checkpoint import SearchCheckpoint, save_checkpoint, load_checkpoint
+
 
 COST_PLAYER_MOVE = 1
 COST_BOX_PUSH = 10
@@ -28,31 +31,21 @@ def heuristic_manhattan_distance(boxes: FrozenSet[Tuple[int, int]], goals: Set[T
         total_distance += min_dist_for_box
     return total_distance
 
-def solve_with_a_star(level_data: List[List[str]], level_idx: int, max_states=50000):
-
-    def find_player(g: List[List[str]]) -> Optional[Tuple[int, int]]:
-        for y, row in enumerate(g):
-            for x, char in enumerate(row):
-                if char in ['@', '+']: return (x, y)
-        return None
-
-    def get_goals(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['.', '+', '*']}
+def solve_with_a_star(level_data: List[List[str]], level_idx: int, max_states=50000,
+                      context: Optional[LevelContext] = None,
+                      checkpoint_file: Optional[str] = None,
+                      resume_from: Optional[str] = None):
 
-    def get_boxes(g: List[List[str]]) -> FrozenSet[Tuple[int, int]]:
-        return frozenset(sorted([(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['$', '*']]))
+    ctx = get_level_context(level_data, context)
 
-    def get_walls(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char == '#'}
-
-    initial_player_pos = find_player(level_data)
+    initial_player_pos = ctx.player
     if initial_player_pos is None:
         print(f"A*: Không tìm thấy người chơi ở Level {level_idx}")
         return None
 
-    initial_boxes = get_boxes(level_data)
-    goals = get_goals(level_data)
-    walls = get_walls(level_data)
+    initial_boxes = ctx.boxes
+    goals = ctx.goals
+    walls = ctx.walls
     initial_state = (initial_player_pos, initial_boxes)
     initial_g_cost = 0
     initial_h_cost = heuristic_manhattan_distance(initial_boxes, goals)
@@ -61,6 +54,19 @@ def solve_with_a_star(level_data: List[List[str]], level_idx: int, max_states=50
     pq = [(initial_f_cost, initial_g_cost, [], initial_state)]
     heapq.heapify(pq)
     visited = {initial_state: 0}
+    incumbent = (initial_h_cost, [])
+
+    if resume_from is not None:
+        try:
+            checkpoint = load_checkpoint(resume_from, ctx, 'A*')
+        except (OSError, ValueError) as e:
+            print(f"A*: Không đọc được checkpoint {resume_from}: {e}")
+            return None
+        pq = [(f, g, path, ctx.unpack_state(key)) for f, g, key, path in checkpoint.open_list]
+        heapq.heapify(pq)
+        visited = {ctx.unpack_state(key): g for key, g in checkpoint.visited.items()}
+        incumbent = checkpoint.incumbent or incumbent
+        print(f"A*: Tiếp tục từ checkpoint: {len(pq)} nút mở, {len(visited)} trạng thái đã duyệt.")
 
     print(f"A*: Bắt đầu giải Level {level_idx}...")
     start_time = time.time()
@@ -70,14 +76,28 @@ def solve_with_a_star(level_data: List[List[str]], level_idx: int, max_states=50
     while pq:
         if len(visited) > max_states:
             print(f"A*: Đã vượt quá {max_states} trạng thái. Dừng lại.")
+            if checkpoint_file is not None:
+                checkpoint = SearchCheckpoint(
+                    'A*',
+                    [(f, g, ctx.pack_state(*state), p) for f, g, p, state in pq],
+                    {ctx.pack_state(*state): g for state, g in visited.items()},
+                    incumbent)
+                try:
+                    save_checkpoint(checkpoint_file, ctx, checkpoint)
+                    print(f"A*: Đã lưu checkpoint vào {checkpoint_file}")
+                except OSError as e:
+                    print(f"A*: Không lưu được checkpoint: {e}")
             return None
 
-        _, current_g_cost, path, current_state = heapq.heappop(pq)
+        current_f_cost, current_g_cost, path, current_state = heapq.heappop(pq)
         current_player_pos, current_boxes = current_state
 
         if current_g_cost > visited[current_state]:
             continue
 
+        if current_f_cost - current_g_cost < incumbent[0]:
+            incumbent = (current_f_cost - current_g_cost, path)
+
         if goals.issubset(current_boxes):
             elapsed_time = time.time() - start_time
             print(f"A*: Tìm thấy lời giải sau {elapsed_time:.2f} giây.")
@@ -1,8 +1,10 @@
 import time
-import sys
 from typing import List, Tuple, Optional, Set, FrozenSet
 
-sys.setrecursionlimit(10000)
+from iterative_dfs import depth_first_search, sokoban_successors
+from level_context import LevelContext, get_level_context
+from transposition_table import DepthFirstMemo
+
 
 
 def save_dls_solution(level_idx, path,elapsed_time):
@@ -16,75 +18,29 @@ def save_dls_solution(level_idx, path,elapsed_time):
         f.write(f"Path DLS: {path}\n\n")
     print(f"DLS: Đã lưu lời giải cho Level {level_idx} vào solutions.txt")
 
-def solve_with_dls(level_data: List[List[str]], level_idx: int, depth_limit=30):
-    def find_player(g: List[List[str]]) -> Optional[Tuple[int, int]]:
-        for y, row in enumerate(g):
-            for x, char in enumerate(row):
-                if char in ['@', '+']: return (x, y)
-        return None
-
-    def get_goals(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['.', '+', '*']}
-
-    def get_boxes(g: List[List[str]]) -> FrozenSet[Tuple[int, int]]:
-        return frozenset(sorted([(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['$', '*']]))
+def solve_with_dls(level_data: List[List[str]], level_idx: int, depth_limit=30,
+                   context: Optional[LevelContext] = None,
+                   tt_capacity: int = 1 << 18):
+    ctx = get_level_context(level_data, context)
 
-    def get_walls(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char == '#'}
-
-    initial_player_pos = find_player(level_data)
+    initial_player_pos = ctx.player
     if initial_player_pos is None:
         print(f"DLS: Không tìm thấy người chơi ở Level {level_idx}")
         return None
 
-    initial_boxes = get_boxes(level_data)
-    goals = get_goals(level_data)
-    walls = get_walls(level_data)
-    visited = set()
+    initial_boxes = ctx.boxes
+    goals = ctx.goals
+    walls = ctx.walls
+    visited = DepthFirstMemo(tt_capacity)
 
     print(f"DLS: Bắt đầu giải Level {level_idx} (depth_limit={depth_limit})...")
     start_time = time.time()
 
-    directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-
-    def _dls_recursive(current_player_pos, current_boxes_pos, current_depth):
-        if current_depth > depth_limit:
-            return None
-
-        current_state = (current_player_pos, current_boxes_pos)
-        if current_state in visited:
-            return None
-        visited.add(current_state)
-
-        for action, (dx, dy) in enumerate(directions):
-            next_player_pos = (current_player_pos[0] + dx, current_player_pos[1] + dy)
-
-            if next_player_pos in walls:
-                continue
-
-            new_boxes_pos = current_boxes_pos
-            if next_player_pos in current_boxes_pos:
-                next_box_pos = (next_player_pos[0] + dx, next_player_pos[1] + dy)
-                if next_box_pos in walls or next_box_pos in current_boxes_pos:
-                    continue
-
-                box_list = list(current_boxes_pos)
-                box_list.remove(next_player_pos)
-                box_list.append(next_box_pos)
-                new_boxes_pos = frozenset(sorted(box_list))
-
-            if goals.issubset(new_boxes_pos):
-                return [action]
-
-            result_path = _dls_recursive(next_player_pos, new_boxes_pos, current_depth + 1)
-
-            if result_path is not None:
-                return [action] + result_path
-
-        visited.remove(current_state)
-        return None
+    successors = sokoban_successors(walls)
 
-    solution_path = _dls_recursive(initial_player_pos, initial_boxes, 0)
+    # Các trạng thái ở độ sâu depth_limit + 1 vẫn được kiểm tra đích nhưng không mở rộng.
+    solution_path = depth_first_search((initial_player_pos, initial_boxes), successors,
+                                       lambda state: goals.issubset(state[1]), depth_limit + 1, memo=visited)
 
     if solution_path is not None:
         elapsed_time = time.time() - start_time
@@ -1,8 +1,9 @@
 import time
-import sys
 from typing import List, Tuple, Optional, Set, FrozenSet
 
-sys.setrecursionlimit(10000)
+from iterative_dfs import depth_first_search, sokoban_successors
+from level_context import LevelContext, get_level_context
+
 
 def save_ids_solution(level_idx, path, elapsed_time):
     if path is None:
@@ -15,77 +16,38 @@ def save_ids_solution(level_idx, path, elapsed_time):
         f.write(f"Path IDS: {path}\n\n")
     print(f"IDS: Đã lưu lời giải cho Level {level_idx} vào solutions.txt")
 
-def solve_with_ids(level_data: List[List[str]], level_idx: int, max_depth=150):
-    def find_player(g: List[List[str]]) -> Optional[Tuple[int, int]]:
-        for y, row in enumerate(g):
-            for x, char in enumerate(row):
-                if char in ['@', '+']: return (x, y)
-        return None
-
-    def get_goals(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['.', '+', '*']}
-
-    def get_boxes(g: List[List[str]]) -> FrozenSet[Tuple[int, int]]:
-        return frozenset(sorted([(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['$', '*']]))
-
-    def get_walls(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char == '#'}
+def solve_with_ids(level_data: List[List[str]], level_idx: int, max_depth=150,
+                   context: Optional[LevelContext] = None):
+    ctx = get_level_context(level_data, context)
 
-    initial_player_pos = find_player(level_data)
+    initial_player_pos = ctx.player
     if initial_player_pos is None:
         print(f"IDS: Không tìm thấy người chơi ở Level {level_idx}")
         return None
 
-    initial_boxes = get_boxes(level_data)
-    goals = get_goals(level_data)
-    walls = get_walls(level_data)
+    initial_boxes = ctx.boxes
+    goals = ctx.goals
+    walls = ctx.walls
 
     print(f"IDS: Bắt đầu giải Level {level_idx} (max_depth={max_depth})...")
     start_time = time.time()
 
-    directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-
-    def _dls_recursive(path, current_player_pos, current_boxes_pos, depth_limit):
-        if len(path) >= depth_limit:
-            return None
-
-        for action, (dx, dy) in enumerate(directions):
-            next_player_pos = (current_player_pos[0] + dx, current_player_pos[1] + dy)
-
-            if next_player_pos in walls:
-                continue
-
-            new_boxes_pos = current_boxes_pos
-            if next_player_pos in current_boxes_pos:
-                next_box_pos = (next_player_pos[0] + dx, next_player_pos[1] + dy)
-                if next_box_pos in walls or next_box_pos in current_boxes_pos:
-                    continue
+    successors = sokoban_successors(walls)
 
-                box_list = list(current_boxes_pos)
-                box_list.remove(next_player_pos)
-                box_list.append(next_box_pos)
-                new_boxes_pos = frozenset(sorted(box_list))
-
-            new_path = path + [action]
-            new_state = (next_player_pos, new_boxes_pos)
-
-            if new_state in visited_this_iteration:
-                continue
-
-            visited_this_iteration.add(new_state)
-
-            if goals.issubset(new_boxes_pos):
-                return new_path
-
-            result = _dls_recursive(new_path, next_player_pos, new_boxes_pos, depth_limit)
-            if result is not None:
-                return result
-
-        return None
+    def is_goal(state):
+        return goals.issubset(state[1])
 
     for depth_limit in range(max_depth):
         visited_this_iteration = {(initial_player_pos, initial_boxes)}
-        solution_path = _dls_recursive([], initial_player_pos, initial_boxes, depth_limit)
+
+        def seen_before(state, depth):
+            if state in visited_this_iteration:
+                return True
+            visited_this_iteration.add(state)
+            return False
+
+        solution_path = depth_first_search((initial_player_pos, initial_boxes), successors, is_goal,
+                                           depth_limit, prune=seen_before)
 
         if solution_path is not None:
             elapsed_time = time.time() - start_time
@@ -2,6 +2,9 @@ import time
 import heapq
 from typing import List, Tuple, Optional, Set, FrozenSet
 
+from level_context import LevelContext, get_level_context
+from search_checkpoint import SearchCheckpoint, save_checkpoint, load_checkpoint
+
 COST_PLAYER_MOVE = 1
 COST_BOX_PUSH = 10
 
@@ -16,36 +19,39 @@ def save_ucs_solution(level_idx, path,elapsed_time):
         f.write(f"Path UCS: {path}\n\n")
     print(f"UCS: Đã lưu lời giải cho Level {level_idx} vào solutions.txt")
 
-def solve_with_ucs(level_data: List[List[str]], level_idx: int, max_states=50000):
-    def find_player(g: List[List[str]]) -> Optional[Tuple[int, int]]:
-        for y, row in enumerate(g):
-            for x, char in enumerate(row):
-                if char in ['@', '+']: return (x, y)
-        return None
-
-    def get_goals(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['.', '+', '*']}
-
-    def get_boxes(g: List[List[str]]) -> FrozenSet[Tuple[int, int]]:
-        return frozenset(sorted([(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['$', '*']]))
+def solve_with_ucs(level_data: List[List[str]], level_idx: int, max_states=50000,
+                   context: Optional[LevelContext] = None,
+                   checkpoint_file: Optional[str] = None,
+                   resume_from: Optional[str] = None):
+    ctx = get_level_context(level_data, context)
 
-    def get_walls(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char == '#'}
-
-    initial_player_pos = find_player(level_data)
+    initial_player_pos = ctx.player
     if initial_player_pos is None:
         print(f"UCS: Không tìm thấy người chơi ở Level {level_idx}")
         return None
 
-    initial_boxes = get_boxes(level_data)
-    goals = get_goals(level_data)
-    walls = get_walls(level_data)
+    initial_boxes = ctx.boxes
+    goals = ctx.goals
+    walls = ctx.walls
     initial_state = (initial_player_pos, initial_boxes)
 
     pq = [(0, [], initial_state)]
     heapq.heapify(pq)
 
     visited = {initial_state: 0}
+    incumbent = (len(initial_boxes - goals), [])
+
+    if resume_from is not None:
+        try:
+            checkpoint = load_checkpoint(resume_from, ctx, 'UCS')
+        except (OSError, ValueError) as e:
+            print(f"UCS: Không đọc được checkpoint {resume_from}: {e}")
+            return None
+        pq = [(cost, path, ctx.unpack_state(key)) for cost, _, key, path in checkpoint.open_list]
+        heapq.heapify(pq)
+        visited = {ctx.unpack_state(key): cost for key, cost in checkpoint.visited.items()}
+        incumbent = checkpoint.incumbent or incumbent
+        print(f"UCS: Tiếp tục từ checkpoint: {len(pq)} nút mở, {len(visited)} trạng thái đã duyệt.")
 
     print(f"UCS: Bắt đầu giải Level {level_idx}...")
     start_time = time.time()
@@ -55,6 +61,17 @@ def solve_with_ucs(level_data: List[List[str]], level_idx: int, max_states=50000
     while pq:
         if len(visited) > max_states:
             print(f"UCS: Đã vượt quá {max_states} trạng thái. Dừng lại.")
+            if checkpoint_file is not None:
+                checkpoint = SearchCheckpoint(
+                    'UCS',
+                    [(cost, cost, ctx.pack_state(*state), p) for cost, p, state in pq],
+                    {ctx.pack_state(*state): cost for state, cost in visited.items()},
+                    incumbent)
+                try:
+                    save_checkpoint(checkpoint_file, ctx, checkpoint)
+                    print(f"UCS: Đã lưu checkpoint vào {checkpoint_file}")
+                except OSError as e:
+                    print(f"UCS: Không lưu được checkpoint: {e}")
             return None
 
         current_cost, path, current_state = heapq.heappop(pq)
@@ -63,6 +80,10 @@ def solve_with_ucs(level_data: List[List[str]], level_idx: int, max_states=50000
         if current_cost > visited[current_state]:
             continue
 
+        boxes_off_goal = len(current_boxes - goals)
+        if boxes_off_goal < incumbent[0]:
+            incumbent = (boxes_off_goal, path)
+
         if goals.issubset(current_boxes):
             elapsed_time = time.time() - start_time
             print(f"UCS: Tìm thấy lời giải sau {elapsed_time:.10f} giây.")
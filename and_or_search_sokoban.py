@@ -1,6 +1,11 @@
 import time
 import heapq
-from typing import List, Tuple, Optional, Set, FrozenSet
+from collections import deque
+from typing import List, Tuple, Optional, Set, FrozenSet, Dict
+
+from goal_ordering import goal_ranks
+from level_context import LevelContext, get_level_context
+from partially_observable_sokoban import observation_tables, packed_state_heuristic
 
 
 def save_and_or_solution(level_idx: int, path: Optional[List[int]], elapsed_time: float):
@@ -17,83 +22,97 @@ def save_and_or_solution(level_idx: int, path: Optional[List[int]], elapsed_time
         pass
 
 
-def solve_with_and_or_search(level_data: List[List[str]], level_idx: int, timeout: float = 10.0) -> Optional[List[int]]:
-    def find_player(g: List[List[str]]) -> Optional[Tuple[int, int]]:
-        for y, row in enumerate(g):
-            for x, c in enumerate(row):
-                if c in ['@', '+']:
-                    return (x, y)
-        return None
-
-    def get_goals(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, c in enumerate(row) if c in ['.', '+', '*']}
-
-    def get_boxes(g: List[List[str]]) -> FrozenSet[Tuple[int, int]]:
-        return frozenset((x, y) for y, row in enumerate(g) for x, c in enumerate(row) if c in ['$', '*'])
-
-    def get_walls(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, c in enumerate(row) if c == '#'}
+def solve_with_and_or_search(level_data: List[List[str]], level_idx: int, timeout: float = 10.0,
+                             context: Optional[LevelContext] = None,
+                             use_goal_order: bool = True) -> Optional[List[int]]:
+    ctx = get_level_context(level_data, context)
+    # Thứ tự lấp goal tính trước cho level: goal ở góc/ngõ cụt được lấp trước.
+    goal_rank = goal_ranks(ctx) if use_goal_order else None
 
     directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
     action_map = {(-1, 0): 0, (1, 0): 1, (0, -1): 2, (0, 1): 3}
 
     start_time = time.time()
-    walls = get_walls(level_data)
-    goals = list(get_goals(level_data))
-    boxes = list(get_boxes(level_data))
-    player = find_player(level_data)
+    walls = ctx.walls
+    goals = list(ctx.goals)
+    boxes = list(ctx.boxes)
+    player = ctx.player
     if player is None:
         return None
 
+    # (thùng đang đẩy, tập thùng, vị trí người chơi) -> (cây BFS, bitmask các phía của thùng
+    # người chơi tới được). BFS dừng sớm khi đã tới đủ các phía cần thiết.
+    reach_cache = {}
+
+    def push_sides(b, bset, start):
+        key = (b, bset, start)
+        cached = reach_cache.get(key)
+        if cached is not None:
+            return cached
+        targets = {}
+        for i, d in enumerate(directions):
+            side = (b[0] - d[0], b[1] - d[1])
+            dest = (b[0] + d[0], b[1] + d[1])
+            if side not in walls and side not in bset and dest not in walls and dest not in bset:
+                targets[side] = i
+        parents = {start: None}
+        sides = 1 << targets[start] if start in targets else 0
+        remaining = len(targets) - (start in targets)
+        queue = deque([start])
+        while queue and remaining:
+            pos = queue.popleft()
+            for d in directions:
+                nxt = (pos[0] + d[0], pos[1] + d[1])
+                if nxt in parents or nxt in walls or nxt in bset:
+                    continue
+                parents[nxt] = pos
+                queue.append(nxt)
+                if nxt in targets:
+                    sides |= 1 << targets[nxt]
+                    remaining -= 1
+        if len(reach_cache) >= 100_000:
+            reach_cache.clear()
+        cached = reach_cache[key] = (parents, sides)
+        return cached
+
+    def walk_path(parents, goal):
+        path = [goal]
+        while parents[path[-1]] is not None:
+            path.append(parents[path[-1]])
+        path.reverse()
+        return path
+
     def box_push_bfs(box, goal, boxes_set, player_pos):
-        from collections import deque
-        visited = set()
-        queue = deque()
-        queue.append((box, tuple(sorted(boxes_set)), player_pos, []))
-        visited.add((box, tuple(sorted(boxes_set)), player_pos))
+        bset = frozenset(boxes_set)
+        visited = {(box, bset, player_pos)}
+        # Chỉ thùng box được đẩy nên tương lai của một trạng thái chỉ phụ thuộc vào các phía
+        # của thùng mà người chơi tới được: (thùng, tập thùng, phía) là khoá chuẩn hoá.
+        expanded = set()
+        queue = deque([(box, bset, player_pos, [])])
+        pops = 0
         while queue:
-            if time.time() - start_time > timeout:
+            pops += 1
+            if pops & 255 == 0 and time.time() - start_time > timeout:
                 return None
             b, bset, ppos, moves = queue.popleft()
             if b == goal:
                 return moves
-            for d in directions:
-                px, py = b[0] - d[0], b[1] - d[1]
-                if (px, py) in walls or (px, py) in bset:
-                    continue
-                nx, ny = b[0] + d[0], b[1] + d[1]
-                if (nx, ny) in walls or (nx, ny) in bset:
+            parents, sides = push_sides(b, bset, ppos)
+            norm = (b, bset, sides)
+            if norm in expanded:
+                continue
+            expanded.add(norm)
+            for i, d in enumerate(directions):
+                if not sides >> i & 1:
                     continue
-                path = player_bfs(ppos, (px, py), set(bset))
-                if path is None:
-                    continue
-                new_bset = set(bset)
-                new_bset.remove(b)
-                new_bset.add((nx, ny))
-                state = ((nx, ny), tuple(sorted(new_bset)), (b[0], b[1]))
+                dest = (b[0] + d[0], b[1] + d[1])
+                new_bset = bset - {b} | {dest}
+                state = (dest, new_bset, b)
                 if state in visited:
                     continue
                 visited.add(state)
-                queue.append(((nx, ny), tuple(sorted(new_bset)), (b[0], b[1]), moves + [(d, path)]))
-        return None
-
-    def player_bfs(start, goal, boxes_set):
-        from collections import deque
-        queue = deque()
-        queue.append((start, [start]))
-        visited = set([start])
-        while queue:
-            if time.time() - start_time > timeout:
-                return None
-            pos, path = queue.popleft()
-            if pos == goal:
-                return path
-            for d in directions:
-                nx, ny = pos[0] + d[0], pos[1] + d[1]
-                if (nx, ny) in walls or (nx, ny) in boxes_set or (nx, ny) in visited:
-                    continue
-                visited.add((nx, ny))
-                queue.append(((nx, ny), path + [(nx, ny)]))
+                push_from = (b[0] - d[0], b[1] - d[1])
+                queue.append((dest, new_bset, b, moves + [(d, walk_path(parents, push_from))]))
         return None
 
     def is_dead_end(box, boxes_set):
@@ -106,62 +125,244 @@ def solve_with_and_or_search(level_data: List[List[str]], level_idx: int, timeou
             if (n1 in walls or n1 in boxes_set) and (n2 in walls or n2 in boxes_set):
                 return True
         return False
-    actions: List[int] = []
-    cur_boxes = set(boxes)
-    cur_player = player
+    goal_set = set(goals)
+    # Trạng thái (tập thùng, người chơi) đã biết là không lấp hết goal được.
+    failed = set()
 
-    if len(cur_boxes) == 0:
-        save_and_or_solution(level_idx, actions, 0.0)
-        return actions
-
-    while not set(goals).issubset(cur_boxes):
+    def fill_goals(cur_boxes, cur_player):
+        # Lấp lần lượt từng goal; mỗi bước lấp thêm một goal nên độ sâu đệ quy <= số goal.
+        if goal_set.issubset(cur_boxes):
+            return []
         if time.time() - start_time > timeout:
             return None
+        key = (frozenset(cur_boxes), cur_player)
+        if key in failed:
+            return None
 
         unsolved = [b for b in cur_boxes if b not in goals]
-        if not unsolved:
-            break
+        if goal_rank is not None:
+            open_goals = sorted((g for g in goals if g not in cur_boxes), key=goal_rank.get)
+            attempts = [(box, goal) for goal in open_goals
+                        for box in sorted(unsolved, key=lambda b: abs(b[0]-goal[0]) + abs(b[1]-goal[1]))]
+        else:
+            unsolved.sort(key=lambda b: abs(b[0]-cur_player[0]) + abs(b[1]-cur_player[1]))
+            attempts = []
+            for box in unsolved:
+                candidate_goals = [g for g in goals if g not in cur_boxes]
+                candidate_goals.sort(key=lambda g: abs(g[0]-box[0]) + abs(g[1]-box[1]))
+                attempts.extend((box, goal) for goal in candidate_goals)
 
-        unsolved.sort(key=lambda b: abs(b[0]-cur_player[0]) + abs(b[1]-cur_player[1]))
+        for box, goal in attempts:
+            if is_dead_end(box, cur_boxes):
+                continue
+            push_plan = box_push_bfs(box, goal, cur_boxes, cur_player)
+            if push_plan is None:
+                continue
 
-        progress_made = False
-        for box in unsolved:
-            candidate_goals = [g for g in goals if g not in cur_boxes]
-            candidate_goals.sort(key=lambda g: abs(g[0]-box[0]) + abs(g[1]-box[1]))
-            for goal in candidate_goals:
-                if is_dead_end(box, cur_boxes):
-                    continue
-                push_plan = box_push_bfs(box, goal, cur_boxes, cur_player)
-                if push_plan is None:
-                    continue
-
-                cur_box = box
-                for d, path in push_plan:
-                    for j in range(len(path)-1):
-                        dx = path[j+1][0] - path[j][0]
-                        dy = path[j+1][1] - path[j][1]
-                        actions.append(action_map[(dx, dy)])
-                    actions.append(action_map[d])
-                    prev_box = cur_box
-                    new_box = (prev_box[0] + d[0], prev_box[1] + d[1])
-                    if prev_box in cur_boxes:
-                        cur_boxes.remove(prev_box)
-                    cur_boxes.add(new_box)
-                    cur_player = prev_box
-                    cur_box = new_box
-
-                    if is_dead_end(new_box, cur_boxes):
-                        progress_made = False
-                        break
-                else:
-                    progress_made = True
+            new_actions = []
+            new_boxes = set(cur_boxes)
+            new_player = cur_player
+            cur_box = box
+            for d, path in push_plan:
+                for j in range(len(path)-1):
+                    dx = path[j+1][0] - path[j][0]
+                    dy = path[j+1][1] - path[j][1]
+                    new_actions.append(action_map[(dx, dy)])
+                new_actions.append(action_map[d])
+                new_box = (cur_box[0] + d[0], cur_box[1] + d[1])
+                new_boxes.discard(cur_box)
+                new_boxes.add(new_box)
+                new_player = cur_box
+                cur_box = new_box
+                if is_dead_end(new_box, new_boxes):
                     break
-            if progress_made:
-                break
+            else:
+                rest = fill_goals(new_boxes, new_player)
+                if rest is not None:
+                    return new_actions + rest
+            if time.time() - start_time > timeout:
+                return None
 
-        if not progress_made:
-            return None
+        failed.add(key)
+        return None
+
+    if len(boxes) == 0:
+        save_and_or_solution(level_idx, [], 0.0)
+        return []
+
+    actions = fill_goals(set(boxes), player)
+    if actions is None:
+        return None
 
     elapsed = time.time() - start_time
     save_and_or_solution(level_idx, actions, elapsed)
     return actions
+
+
+class PlanNode:
+    """Một nút của kế hoạch có điều kiện: thực hiện action rồi rẽ nhánh theo quan sát.
+
+    action là None ở nút đích. Các nút được dùng chung giữa các nhánh (DAG) khi cùng belief.
+    """
+
+    __slots__ = ('action', 'branches')
+
+    def __init__(self, action: Optional[int], branches: Optional[Dict[int, 'PlanNode']] = None):
+        self.action = action
+        self.branches = branches or {}
+
+
+class ContingentPlan:
+    """Kế hoạch AND-OR: roots ánh xạ quan sát ban đầu -> nút kế hoạch."""
+
+    def __init__(self, ctx: LevelContext, roots: Dict[int, PlanNode], num_nodes: int):
+        self.ctx = ctx
+        self.roots = roots
+        self.num_nodes = num_nodes
+        self.observe = ObservationModel(ctx)
+
+    def start(self, player: Tuple[int, int], boxes) -> PlanNode:
+        return self.roots[self.observe(self.ctx.pack_state(player, boxes))]
+
+    def actions_for(self, player: Tuple[int, int], boxes) -> List[int]:
+        # Thực thi kế hoạch trên một trạng thái thật cụ thể, trả về chuỗi bước đi tuyến tính.
+        ctx = self.ctx
+        key = ctx.pack_state(player, boxes)
+        node = self.roots[self.observe(key)]
+        actions = []
+        while node.action is not None:
+            moved = ctx.apply_action(key, node.action)
+            key = key if moved is None else moved
+            actions.append(node.action)
+            node = node.branches[self.observe(key)]
+        return actions
+
+
+class ObservationModel:
+    """Quan sát 3x3 quanh người chơi của một trạng thái đóng gói (xem observation_tables)."""
+
+    def __init__(self, ctx: LevelContext):
+        self.player_mask, self.player_bits = ctx.player_mask, ctx.player_bits
+        self.wall_masks, self.box_probes = observation_tables(ctx)
+
+    def __call__(self, key: int) -> int:
+        player = key & self.player_mask
+        boxes = key >> self.player_bits
+        obs = self.wall_masks[player]
+        for bit, cell in self.box_probes[player]:
+            if boxes >> cell & 1:
+                obs |= bit
+        return obs
+
+    def split(self, states) -> Dict[int, FrozenSet[int]]:
+        groups: Dict[int, Set[int]] = {}
+        for key in states:
+            groups.setdefault(self(key), set()).add(key)
+        return {obs: frozenset(group) for obs, group in groups.items()}
+
+
+def solve_with_contingent_and_or_search(level_data: List[List[str]], level_idx: int,
+                                        possible_start_states: Optional[List[Tuple[Tuple[int, int], FrozenSet[Tuple[int, int]]]]] = None,
+                                        max_depth: int = 60, timeout: float = 10.0,
+                                        context: Optional[LevelContext] = None) -> Optional[ContingentPlan]:
+    """Tìm kiếm AND-OR trên belief: nút OR chọn action, nút AND rẽ nhánh theo mọi quan sát có thể.
+
+    Dùng iterative deepening theo độ sâu kế hoạch. Belief đã giải được nhớ lại thành PlanNode
+    dùng chung (kế hoạch là một DAG); belief thất bại được nhớ cùng ngân sách độ sâu đã thử,
+    trừ khi thất bại do cắt chu trình (phụ thuộc vào đường đi hiện tại).
+    """
+    ctx = get_level_context(level_data, context)
+
+    if possible_start_states is None:
+        if ctx.player is None:
+            return None
+        possible_start_states = [ctx.initial_state()]
+
+    start_time = time.time()
+    observe = ObservationModel(ctx)
+    memo: Dict[int, int] = {}
+    solved: Dict[FrozenSet[int], PlanNode] = {}
+    failed: Dict[FrozenSet[int], int] = {}
+    on_path: Set[FrozenSet[int]] = set()
+    cycle_cutoffs = [0]
+    timed_out = [False]
+
+    def belief_h(belief: FrozenSet[int]) -> int:
+        return max(packed_state_heuristic(ctx, key, memo) for key in belief)
+
+    def or_search(belief: FrozenSet[int], depth_left: int) -> Optional[PlanNode]:
+        if all(ctx.is_solved_key(k) for k in belief):
+            return PlanNode(None)
+        node = solved.get(belief)
+        if node is not None:
+            return node
+        if belief in on_path:
+            cycle_cutoffs[0] += 1
+            return None
+        # h là cận dưới số bước (xem packed_state_heuristic) nên cắt tỉa kiểu IDA*.
+        if depth_left <= 0 or belief_h(belief) > depth_left or failed.get(belief, -1) >= depth_left:
+            return None
+        if time.time() - start_time > timeout:
+            timed_out[0] = True
+            return None
+
+        outcomes = []
+        for action in range(4):
+            nxt = set()
+            for key in belief:
+                moved = ctx.apply_action(key, action)
+                nxt.add(key if moved is None else moved)
+            if any(ctx.has_dead_box(k) for k in nxt):
+                continue
+            branches = observe.split(nxt)
+            if len(branches) == 1 and belief in branches.values():
+                continue
+            outcomes.append((max(belief_h(b) for b in branches.values()), action, branches))
+        outcomes.sort(key=lambda item: (item[0], item[1]))
+
+        cutoffs_before = cycle_cutoffs[0]
+        on_path.add(belief)
+        try:
+            for _, action, branches in outcomes:
+                children = and_search(branches, depth_left - 1)
+                if children is not None:
+                    node = PlanNode(action, children)
+                    solved[belief] = node
+                    return node
+        finally:
+            on_path.discard(belief)
+
+        if cycle_cutoffs[0] == cutoffs_before and not timed_out[0]:
+            failed[belief] = max(failed.get(belief, -1), depth_left)
+        return None
+
+    def and_search(branches: Dict[int, FrozenSet[int]], depth_left: int) -> Optional[Dict[int, PlanNode]]:
+        children = {}
+        for obs, child in sorted(branches.items(), key=lambda item: belief_h(item[1])):
+            node = or_search(child, depth_left)
+            if node is None:
+                return None
+            children[obs] = node
+        return children
+
+    start_states = {ctx.pack_state(p, b) for p, b in possible_start_states}
+    if any(ctx.has_dead_box(k) for k in start_states):
+        print(f"And-Or contingent: Level {level_idx} có thùng ở dead square.")
+        return None
+    root_branches = observe.split(start_states)
+
+    print(f"And-Or contingent: Bắt đầu giải Level {level_idx}...")
+    lower = max(belief_h(b) for b in root_branches.values())
+    for depth in range(max(1, lower), max_depth + 1):
+        roots = and_search(root_branches, depth)
+        if roots is not None:
+            elapsed = time.time() - start_time
+            plan = ContingentPlan(ctx, roots, len(solved))
+            print(f"And-Or contingent: Tìm thấy kế hoạch ({plan.num_nodes} nút) sau {elapsed:.2f} giây.")
+            return plan
+        if timed_out[0]:
+            print(f"And-Or contingent: Đã hết thời gian ({timeout}s).")
+            return None
+
+    print(f"And-Or contingent: Không tìm thấy kế hoạch cho Level {level_idx} trong độ sâu {max_depth}.")
+    return None
@@ -1,8 +1,11 @@
 import time
-import sys
 from typing import List, Tuple, Optional, Set, FrozenSet
 
-sys.setrecursionlimit(10000)
+from box_goal_csp import get_box_goal_csp
+from iterative_dfs import conflict_backjump, depth_first_search, sokoban_successors
+from level_context import LevelContext, get_level_context, UNREACHABLE
+from transposition_table import DepthFirstMemo
+
 
 def save_backtracking_solution(level_idx, path, elapsed_time):
     if path is None:
@@ -15,76 +18,59 @@ def save_backtracking_solution(level_idx, path, elapsed_time):
         f.write(f"Path Backtracking: {path}\n\n")
     print(f"Backtracking: Đã lưu lời giải cho Level {level_idx} vào solutions.txt")
 
-def solve_with_backtracking(level_data: List[List[str]], level_idx: int, max_depth=250):
-    def find_player(g: List[List[str]]) -> Optional[Tuple[int, int]]:
-        for y, row in enumerate(g):
-            for x, char in enumerate(row):
-                if char in ['@', '+']: return (x, y)
-        return None
-
-    def get_goals(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['.', '+', '*']}
-
-    def get_boxes(g: List[List[str]]) -> FrozenSet[Tuple[int, int]]:
-        return frozenset(sorted([(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['$', '*']]))
-
-    def get_walls(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char == '#'}
-
-    initial_player_pos = find_player(level_data)
+def solve_with_backtracking(level_data: List[List[str]], level_idx: int, max_depth=250,
+                            context: Optional[LevelContext] = None,
+                            tt_capacity: int = 1 << 18,
+                            move_ordering: bool = False,
+                            backjumping: bool = True):
+    """Backtracking giới hạn độ sâu max_depth, bảng chuyển vị tt_capacity mục.
+
+    move_ordering (mặc định tắt): thử trước các bước làm tổng khoảng cách đẩy của thùng nhỏ
+    nhất; tắt thì giữ thứ tự action gốc như bản cũ.
+    backjumping (mặc định bật): khi một nút thất bại vì một tập thùng bế tắc vĩnh viễn, nhảy
+    thẳng về nút đã đẩy thùng gần nhất trong tập đó; chỉ cắt các cây con chắc chắn chết.
+    """
+    ctx = get_level_context(level_data, context)
+
+    initial_player_pos = ctx.player
     if initial_player_pos is None:
         print(f"Backtracking: Không tìm thấy người chơi ở Level {level_idx}")
         return None
 
-    initial_boxes = get_boxes(level_data)
-    goals = get_goals(level_data)
-    walls = get_walls(level_data)
-
-    visited = set()
-    solution_path = []
+    initial_boxes = ctx.boxes
+    goals = ctx.goals
+    walls = ctx.walls
 
+    visited = DepthFirstMemo(tt_capacity)
     print(f"Backtracking: Bắt đầu giải Level {level_idx} (max_depth={max_depth})...")
     start_time = time.time()
 
-    directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-
-    def _backtrack(current_player_pos, current_boxes_pos, current_depth):
-        if goals.issubset(current_boxes_pos):
-            return True
-
-        if current_depth >= max_depth:
-            return False
-
-        current_state = (current_player_pos, current_boxes_pos)
-        if current_state in visited:
-            return False
-        visited.add(current_state)
-
-        for action, (dx, dy) in enumerate(directions):
-            next_player_pos = (current_player_pos[0] + dx, current_player_pos[1] + dy)
-
-            if next_player_pos in walls:
-                continue
-
-            new_boxes_pos = current_boxes_pos
-            if next_player_pos in current_boxes_pos:
-                next_box_pos = (next_player_pos[0] + dx, next_player_pos[1] + dy)
-
-                if next_box_pos in walls or next_box_pos in current_boxes_pos:
-                    continue
-
-                box_list = list(current_boxes_pos)
-                box_list.remove(next_player_pos)
-                box_list.append(next_box_pos)
-                new_boxes_pos = frozenset(sorted(box_list))
-
-            if _backtrack(next_player_pos, new_boxes_pos, current_depth + 1):
-                solution_path.insert(0, action)
-                return True
-
-        return False
-
-    if _backtrack(initial_player_pos, initial_boxes, 0):
+    successors = sokoban_successors(walls)
+
+    # Tổng khoảng cách đẩy của các thùng; thùng trên ô chết xếp sau cùng.
+    push_h_cache = {}
+
+    def push_h(boxes):
+        h = push_h_cache.get(boxes)
+        if h is None:
+            distances = [ctx.push_distance(b) for b in boxes]
+            h = sum(distances) if UNREACHABLE not in distances else 1 << 20
+            if len(push_h_cache) >= 100_000:
+                push_h_cache.clear()
+            push_h_cache[boxes] = h
+        return h
+
+    # sorted ổn định: các bước đi không đẩy thùng giữ thứ tự action gốc.
+    def by_push_distance(children):
+        return sorted(children, key=lambda child: push_h(child[1][1]))
+
+    # Bảng chuyển vị mở rộng lại trạng thái khi gặp nó ở độ sâu nông hơn; không có backjumping
+    # thì các cây con bế tắc bị duyệt lại nhiều lần và chậm hơn hàng trăm lần.
+    backjump = conflict_backjump(get_box_goal_csp(ctx).conflict_set) if backjumping else None
+    solution_path = depth_first_search((initial_player_pos, initial_boxes), successors,
+                                       lambda state: goals.issubset(state[1]), max_depth, memo=visited,
+                                       order=by_push_distance if move_ordering else None, backjump=backjump)
+    if solution_path is not None:
         elapsed_time = time.time() - start_time
         print(f"Backtracking: Tìm thấy lời giải sau {elapsed_time:.2f} giây.")
         print(f"  - Số bước đi: {len(solution_path)}")
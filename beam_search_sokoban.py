@@ -1,7 +1,11 @@
+import os
 import time
 import heapq
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Tuple, Optional, Set, FrozenSet
 
+from level_context import LevelContext, get_level_context
+
 
 def save_beam_search_solution(level_idx, path,elapsed_time):
     if path is None:
@@ -26,51 +30,69 @@ def heuristic_manhattan_distance(boxes: FrozenSet[Tuple[int, int]], goals: Set[T
 
     return total_distance
 
-def solve_with_beam_search(level_data: List[List[str]], level_idx: int, beam_width=3, max_iterations=500):
-    grid = [list(row) for row in level_data]
+def box_cost_table(ctx: LevelContext):
+    # Khoảng cách Manhattan tới goal gần nhất cho mọi ô; h của một trạng thái là tổng trên các thùng.
+    if not ctx.goals:
+        return {pos: 0 for pos in ctx.cells}
+    goal_list = list(ctx.goals)
+    return {pos: min(abs(pos[0] - g[0]) + abs(pos[1] - g[1]) for g in goal_list) for pos in ctx.cells}
 
-    def find_player(g: List[List[str]]) -> Optional[Tuple[int, int]]:
-        for y, row in enumerate(g):
-            for x, char in enumerate(row):
-                if char in ['@', '+']:
-                    return (x, y)
-        return None
+DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
+def expand_state(state, h: int, walls, box_cost) -> List[Tuple[int, Tuple, int]]:
+    # Các bước đi hợp lệ từ state: (action, trạng thái mới, h mới).
+    current_player_pos, current_boxes = state
+    out = []
+    for action, (dx, dy) in enumerate(DIRECTIONS):
+        next_player_pos = (current_player_pos[0] + dx, current_player_pos[1] + dy)
+
+        if next_player_pos in walls:
+            continue
+
+        new_boxes = current_boxes
+        new_h = h
+        if next_player_pos in current_boxes:
+            next_box_pos = (next_player_pos[0] + dx, next_player_pos[1] + dy)
+            if next_box_pos in walls or next_box_pos in current_boxes:
+                continue
 
-    def get_goals(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['.', '+', '*']}
+            box_list = list(current_boxes)
+            box_list.remove(next_player_pos)
+            box_list.append(next_box_pos)
+            new_boxes = frozenset(sorted(box_list))
+            new_h += box_cost.get(next_box_pos, 0) - box_cost.get(next_player_pos, 0)
 
-    def get_boxes(g: List[List[str]]) -> FrozenSet[Tuple[int, int]]:
-        boxes = [(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['$', '*']]
-        return frozenset(sorted(boxes))
+        out.append((action, (next_player_pos, new_boxes), new_h))
+    return out
 
-    def get_walls(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char == '#'}
+def solve_with_beam_search(level_data: List[List[str]], level_idx: int, beam_width=3, max_iterations=500,
+                           context: Optional[LevelContext] = None):
+    ctx = get_level_context(level_data, context)
 
-    player_pos = find_player(grid)
+    player_pos = ctx.player
     if player_pos is None:
         print(f"Beam Search: Không tìm thấy người chơi ở Level {level_idx}")
         return None
 
-    initial_boxes = get_boxes(grid)
-    goals = get_goals(grid)
-    walls = get_walls(grid)
+    initial_boxes = ctx.boxes
+    goals = ctx.goals
+    walls = ctx.walls
     initial_state = (player_pos, initial_boxes)
+    box_cost = box_cost_table(ctx)
 
-    beam = [([], initial_state)]
+    # Mỗi phần tử beam: (h, path, state). h được cập nhật tăng dần: đi bộ giữ nguyên,
+    # đẩy thùng chỉ cộng chênh lệch của thùng vừa di chuyển.
+    beam = [(heuristic_manhattan_distance(initial_boxes, goals), [], initial_state)]
     visited = {initial_state}
 
     print(f"Beam Search: Bắt đầu giải Level {level_idx} (Beam Width = {beam_width})...")
     start_time = time.time()
 
-    directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-
     for iteration in range(max_iterations):
         successors = []
 
-        for path, current_state in beam:
-            current_player_pos, current_boxes = current_state
-
-            if goals.issubset(current_boxes):
+        for beam_idx, (current_h, path, current_state) in enumerate(beam):
+            if goals.issubset(current_state[1]):
                 elapsed_time = time.time() - start_time
                 print(f"Beam Search: Tìm thấy lời giải sau {elapsed_time:.2f} giây.")
                 print(f"  - Số bước đi: {len(path)}")
@@ -78,39 +100,244 @@ def solve_with_beam_search(level_data: List[List[str]], level_idx: int, beam_wid
                 save_beam_search_solution(level_idx, path,elapsed_time)
                 return path
 
-            for action, (dx, dy) in enumerate(directions):
-                next_player_pos = (current_player_pos[0] + dx, current_player_pos[1] + dy)
+            for action, new_state, new_h in expand_state(current_state, current_h, walls, box_cost):
+                if new_state not in visited:
+                    visited.add(new_state)
+                    # Chỉ dựng path cho các trạng thái được chọn vào beam mới.
+                    successors.append((new_h, beam_idx, action, new_state))
 
-                if next_player_pos in walls:
-                    continue
+        if not successors:
+            print(f"Beam Search: Không còn trạng thái kế tiếp để mở rộng ở vòng lặp {iteration + 1}.")
+            break
+
+        selected = heapq.nsmallest(beam_width, successors, key=lambda item: item[0])
+        beam = [(h, beam[beam_idx][1] + [action], state) for h, beam_idx, action, state in selected]
+
+    print(f"Beam Search: Không tìm thấy lời giải cho Level {level_idx} trong giới hạn {max_iterations} vòng lặp.")
+    return None
 
-                new_boxes = current_boxes
-                if next_player_pos in current_boxes:
-                    next_box_pos = (next_player_pos[0] + dx, next_player_pos[1] + dy)
-                    if next_box_pos in walls or next_box_pos in current_boxes:
-                        continue
 
-                    box_list = list(current_boxes)
-                    box_list.remove(next_player_pos)
-                    box_list.append(next_box_pos)
-                    new_boxes = frozenset(sorted(box_list))
 
-                new_state = (next_player_pos, new_boxes)
+def beam_pass(initial_state, initial_h: int, goals, walls, box_cost, beam_width: int, max_iterations: int,
+              expansions: Optional[dict] = None, expansion_limit: int = 1_000_000,
+              bound: Optional[int] = None, deadline: Optional[float] = None):
+    """Một lượt beam search với visited riêng của lượt.
 
+    expansions là cache state -> kết quả expand_state dùng chung giữa các lượt. Trạng thái có
+    g + h >= bound bị bỏ qua vì không thể cho lời giải ngắn hơn (h đếm số lần đẩy tối thiểu).
+    Trả về (path hoặc None, complete): complete=True nghĩa là beam chưa từng bị cắt bớt,
+    tức lượt này đã duyệt hết không gian trong giới hạn bound.
+    """
+    beam = [(initial_h, [], initial_state)]
+    visited = {initial_state}
+    complete = True
+
+    for iteration in range(max_iterations):
+        if deadline is not None and time.time() > deadline:
+            return None, False
+        successors = []
+
+        for beam_idx, (current_h, path, current_state) in enumerate(beam):
+            if goals.issubset(current_state[1]):
+                return path, complete
+
+            moves = expansions.get(current_state) if expansions is not None else None
+            if moves is None:
+                moves = expand_state(current_state, current_h, walls, box_cost)
+                if expansions is not None and len(expansions) < expansion_limit:
+                    expansions[current_state] = moves
+
+            g = len(path) + 1
+            for action, new_state, new_h in moves:
+                if bound is not None and g + new_h >= bound:
+                    continue
                 if new_state not in visited:
                     visited.add(new_state)
-                    new_path = path + [action]
-                    successors.append((new_path, new_state))
+                    successors.append((new_h, beam_idx, action, new_state))
 
         if not successors:
-            print(f"Beam Search: Không còn trạng thái kế tiếp để mở rộng ở vòng lặp {iteration + 1}.")
+            return None, complete
+        if len(successors) > beam_width:
+            complete = False
+
+        selected = heapq.nsmallest(beam_width, successors, key=lambda item: item[0])
+        beam = [(h, beam[beam_idx][1] + [action], state) for h, beam_idx, action, state in selected]
+
+    return None, False
+
+
+def solve_with_anytime_beam_search(level_data: List[List[str]], level_idx: int,
+                                   initial_width: int = 3, growth: int = 2, max_width: int = 1 << 16,
+                                   max_iterations: int = 500, max_time: float = 10.0,
+                                   context: Optional[LevelContext] = None):
+    """Beam search anytime: chạy lại với beam rộng dần theo cấp số nhân cho tới khi hết thời gian.
+
+    Lời giải đầu tiên được giữ làm incumbent, các lượt sau chỉ tìm lời giải ngắn hơn. Kết quả
+    expand và giá trị h được cache dùng lại giữa các lượt. Dừng sớm nếu một lượt không
+    phải cắt beam (lời giải hiện tại đã tối ưu).
+    """
+    ctx = get_level_context(level_data, context)
+
+    if ctx.player is None:
+        print(f"Beam Search anytime: Không tìm thấy người chơi ở Level {level_idx}")
+        return None
+
+    goals = ctx.goals
+    initial_state = (ctx.player, ctx.boxes)
+    box_cost = box_cost_table(ctx)
+    initial_h = heuristic_manhattan_distance(ctx.boxes, goals)
+    expansions = {}
+
+    print(f"Beam Search anytime: Bắt đầu giải Level {level_idx}...")
+    start_time = time.time()
+    deadline = start_time + max_time
+    best_path = None
+    width = max(1, initial_width)
+
+    while width <= max_width and time.time() < deadline:
+        bound = len(best_path) if best_path is not None else None
+        path, complete = beam_pass(initial_state, initial_h, goals, ctx.walls, box_cost, width,
+                                   max_iterations, expansions, bound=bound, deadline=deadline)
+        if path is not None and (best_path is None or len(path) < len(best_path)):
+            best_path = path
+            print(f"  - Beam Width = {width}: lời giải {len(path)} bước sau {time.time() - start_time:.2f} giây")
+        if complete:
             break
+        width *= max(2, growth)
 
-        beam = heapq.nsmallest(
-            beam_width,
-            successors,
-            key=lambda item: heuristic_manhattan_distance(item[1][1], goals)
-        )
+    if best_path is None:
+        print(f"Beam Search anytime: Không tìm thấy lời giải cho Level {level_idx}.")
+        return None
 
-    print(f"Beam Search: Không tìm thấy lời giải cho Level {level_idx} trong giới hạn {max_iterations} vòng lặp.")
+    elapsed_time = time.time() - start_time
+    save_beam_search_solution(level_idx, best_path, elapsed_time)
+    return best_path
+
+
+
+def expand_chunk(chunk, k: int, walls, goals, box_cost, exclude=frozenset()):
+    """Mở rộng một phần của beam: chunk là các (beam_idx, h, state).
+
+    Trả về (lời giải hoặc None, top-k successor) với successor là (h, beam_idx, action, state),
+    đã loại trùng trong chunk và bỏ các trạng thái trong exclude. Lời giải là (beam_idx, action)
+    nếu có successor đạt goal.
+    """
+    seen = set()
+    successors = []
+    for beam_idx, h, state in chunk:
+        for action, new_state, new_h in expand_state(state, h, walls, box_cost):
+            if new_state in seen or new_state in exclude:
+                continue
+            seen.add(new_state)
+            if goals.issubset(new_state[1]):
+                return (beam_idx, action), []
+            successors.append((new_h, beam_idx, action, new_state))
+    return None, heapq.nsmallest(k, successors, key=lambda item: item[0])
+
+
+_worker_level = None
+
+
+def _init_worker(walls, goals, box_cost):
+    global _worker_level
+    _worker_level = (walls, goals, box_cost)
+
+
+def _expand_chunk_worker(chunk, k: int, parent_states):
+    # Bước đi lùi quay về chính chunk hoặc trạng thái cha của nó; chỉ cha được gửi qua IPC.
+    exclude = set(parent_states)
+    exclude.update(state for _, _, state in chunk)
+    return expand_chunk(chunk, k, *_worker_level, exclude)
+
+
+def solve_with_parallel_beam_search(level_data: List[List[str]], level_idx: int, beam_width=1000,
+                                    max_iterations=500, num_workers: Optional[int] = None,
+                                    min_parallel_width: int = 256,
+                                    context: Optional[LevelContext] = None):
+    """Beam search cho beam rộng: mỗi tầng được chia cho các process, mỗi process mở rộng
+    và chấm điểm phần của mình rồi trả về top-k; process chính trộn k-đường theo h và
+    loại các trạng thái đã thăm. Tầng nhỏ hơn min_parallel_width được mở rộng tại chỗ.
+
+    Worker không có visited toàn cục: mỗi worker chỉ loại các trạng thái trong chunk của nó
+    và trạng thái cha của chunk (nơi phần lớn bước đi lùi quay về), nên dữ liệu gửi đi tỉ lệ
+    với beam_width chứ không nhân với số process. Process chính lọc visited khi trộn; vì
+    top-k được chọn trước khi lọc, beam mới có thể ít hơn beam_width so với bản tuần tự.
+    """
+    ctx = get_level_context(level_data, context)
+
+    if ctx.player is None:
+        print(f"Beam Search song song: Không tìm thấy người chơi ở Level {level_idx}")
+        return None
+
+    goals, walls = ctx.goals, ctx.walls
+    box_cost = box_cost_table(ctx)
+    initial_state = (ctx.player, ctx.boxes)
+    num_workers = num_workers or os.cpu_count() or 1
+
+    print(f"Beam Search song song: Bắt đầu giải Level {level_idx} (Beam Width = {beam_width}, {num_workers} process)...")
+    start_time = time.time()
+
+    def finish(layer: int, beam_idx: int, action: Optional[int]) -> List[int]:
+        # Dò ngược theo con trỏ cha của từng tầng.
+        path = [] if action is None else [action]
+        for d in range(layer, 0, -1):
+            beam_idx, action = parents[d][beam_idx]
+            path.append(action)
+        path.reverse()
+        elapsed_time = time.time() - start_time
+        print(f"Beam Search song song: Tìm thấy lời giải sau {elapsed_time:.2f} giây.")
+        print(f"  - Số bước đi: {len(path)}")
+        print(f"  - Số trạng thái đã duyệt: {len(visited)}")
+        save_beam_search_solution(level_idx, path, elapsed_time)
+        return path
+
+    beam = [(heuristic_manhattan_distance(ctx.boxes, goals), initial_state)]
+    previous_states = []
+    parents = [[]]
+    visited = {initial_state}
+    if goals.issubset(ctx.boxes):
+        return finish(0, 0, None)
+
+    pool = ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker,
+                               initargs=(walls, goals, box_cost)) if num_workers > 1 else None
+    try:
+        for iteration in range(max_iterations):
+            entries = [(i, h, state) for i, (h, state) in enumerate(beam)]
+            if pool is not None and len(entries) >= min_parallel_width:
+                size = (len(entries) + num_workers - 1) // num_workers
+                chunks = [entries[i:i + size] for i in range(0, len(entries), size)]
+                links = parents[-1]
+                chunk_parents = [list({previous_states[links[i][0]] for i, _, _ in chunk}) if links else []
+                                 for chunk in chunks]
+                results = list(pool.map(_expand_chunk_worker, chunks, [beam_width] * len(chunks),
+                                        chunk_parents))
+            else:
+                results = [expand_chunk(entries, beam_width, walls, goals, box_cost, visited)]
+
+            for solution, _ in results:
+                if solution is not None:
+                    return finish(iteration, *solution)
+
+            layer = []
+            parent_links = []
+            for h, beam_idx, action, state in heapq.merge(*[top for _, top in results], key=lambda item: item[0]):
+                if state in visited:
+                    continue
+                visited.add(state)
+                layer.append((h, state))
+                parent_links.append((beam_idx, action))
+                if len(layer) >= beam_width:
+                    break
+
+            if not layer:
+                print(f"Beam Search song song: Không còn trạng thái kế tiếp để mở rộng ở vòng lặp {iteration + 1}.")
+                break
+            previous_states = [state for _, state in beam]
+            beam = layer
+            parents.append(parent_links)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    print(f"Beam Search song song: Không tìm thấy lời giải cho Level {level_idx} trong giới hạn {max_iterations} vòng lặp.")
     return None
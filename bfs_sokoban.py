@@ -2,6 +2,14 @@ import time
 from collections import deque
 from typing import List, Tuple, Optional
 
+from level_context import LevelContext, get_level_context
+from search_checkpoint import SearchCheckpoint, save_checkpoint, load_checkpoint
+from external_bfs import ExternalBFS
+from state_ranking import StateRanker, BitmapVisited, ParentMoveArray, previous_key
+
+# Số rank tối đa cho BFS bitmap: mỗi rank tốn 1 bit visited + 4 bit mã bước đi cha (~160 MB).
+MAX_RANKED_STATES = 1 << 28
+
 def save_bfs_solution(level_idx, path, elapsed_time):
     if path is None:
         return
@@ -13,42 +21,141 @@ def save_bfs_solution(level_idx, path, elapsed_time):
         f.write(f"Path BFS: {path}\n\n")
     print(f"BFS: Đã lưu lời giải cho Level {level_idx} vào solutions.txt")
 
-def solve_with_bfs(level_data, level_idx, max_states=50000):
-    grid = [list(row) for row in level_data]
+def solve_with_external_bfs(ctx: LevelContext, level_idx, max_states=None, buffer_states=1_000_000, work_dir=None):
+    width = ctx.state_bytes
 
-    def find_player(g: List[List[str]]) -> Optional[Tuple[int, int]]:
-        for y, row in enumerate(g):
-            for x, c in enumerate(row):
-                if c in ['@', '+']:
-                    return (x, y)
+    def successors(rec: bytes):
+        key = int.from_bytes(rec, 'big')
+        for action in range(4):
+            nxt = ctx.apply_action(key, action)
+            if nxt is not None and not ctx.has_dead_box(nxt):
+                yield action, nxt.to_bytes(width, 'big')
+
+    def is_goal(rec: bytes) -> bool:
+        return ctx.is_solved_key(int.from_bytes(rec, 'big'))
+
+    print(f"BFS (external): Bắt đầu giải Level {level_idx} (buffer={buffer_states} trạng thái)...")
+    searcher = ExternalBFS(successors, is_goal, buffer_records=buffer_states, work_dir=work_dir)
+    start = ctx.pack_state(ctx.player, ctx.boxes).to_bytes(width, 'big')
+    path = searcher.search(start, max_records=max_states)
+    print(f"BFS (external): Đã duyệt {sum(searcher.layer_sizes)} trạng thái qua {len(searcher.layer_sizes)} tầng.")
+    return path
+
+def solve_with_ranked_bfs(ctx: LevelContext, level_idx, max_states=None):
+    # BFS dùng bitmap visited (1 bit/trạng thái) và mảng mã bước đi cha 4 bit đánh theo rank.
+    ranker = StateRanker(ctx)
+    if ranker.size > MAX_RANKED_STATES:
+        print(f"BFS (bitmap): Level {level_idx} có {ranker.size} rank, vượt quá {MAX_RANKED_STATES}.")
+        return None
+    start = ctx.pack_state(ctx.player, ctx.boxes)
+    start_rank = ranker.rank_key(start)
+    if start_rank is None:
+        print(f"BFS (bitmap): Level {level_idx} có thùng nằm ở ô chết.")
         return None
 
-    def get_goals(g: List[List[str]]):
-        goals = set()
-        for y, row in enumerate(g):
-            for x, c in enumerate(row):
-                if c in ['.', '+', '*']:
-                    goals.add((x, y))
-        return goals
-
-    def get_boxes(g: List[List[str]]):
-        boxes = []
-        for y, row in enumerate(g):
-            for x, c in enumerate(row):
-                if c in ['$', '*']:
-                    boxes.append((x, y))
-        return tuple(sorted(boxes))
-
-    player = find_player(grid)
+    print(f"BFS (bitmap): Bắt đầu giải Level {level_idx} ({ranker.size} trạng thái có thể xếp hạng)...")
+    visited = BitmapVisited(ranker.size)
+    parents = ParentMoveArray(ranker.size)
+    visited.add(start_rank)
+    parents.set(start_rank, ParentMoveArray.ROOT)
+    count = 1
+    frontier = [start]
+
+    while frontier:
+        next_frontier = []
+        for key in frontier:
+            if ctx.is_solved_key(key):
+                return _ranked_path(ctx, ranker, parents, key)
+            for action in range(4):
+                nxt = ctx.apply_action(key, action)
+                if nxt is None:
+                    continue
+                rank = ranker.rank_key(nxt)
+                if rank is None or not visited.add(rank):
+                    continue
+                pushed = (nxt ^ key) >> ctx.player_bits != 0
+                parents.set(rank, action | (pushed << 2))
+                next_frontier.append(nxt)
+        count += len(next_frontier)
+        if max_states is not None and count > max_states:
+            print(f"BFS (bitmap): Đã vượt quá {max_states} trạng thái. Dừng lại.")
+            return None
+        frontier = next_frontier
+    return None
+
+def _ranked_path(ctx: LevelContext, ranker: StateRanker, parents: ParentMoveArray, key: int):
+    path = []
+    code = parents.get(ranker.rank_key(key))
+    while code != ParentMoveArray.ROOT:
+        path.append(code & 3)
+        key = previous_key(ctx, key, code)
+        code = parents.get(ranker.rank_key(key))
+    path.reverse()
+    return path
+
+def solve_with_bfs(level_data, level_idx, max_states: Optional[int] = None, context: Optional[LevelContext] = None,
+                   checkpoint_file: Optional[str] = None, resume_from: Optional[str] = None,
+                   external_memory: bool = False, buffer_states: int = 1_000_000,
+                   work_dir: Optional[str] = None, bitmap_visited: bool = False):
+    grid = [list(row) for row in level_data]
+
+    ctx = get_level_context(level_data, context)
+
+    player = ctx.player
     if player is None:
         print(f"BFS: No player found on level {level_idx}")
         return None
 
-    goals = get_goals(grid)
-    initial_state = {'player': player, 'boxes': get_boxes(grid)}
+    if bitmap_visited and external_memory:
+        print("BFS: Không thể dùng bitmap_visited cùng external_memory.")
+        return None
+
+    if bitmap_visited and StateRanker(ctx).size > MAX_RANKED_STATES:
+        print(f"BFS: Level {level_idx} quá lớn cho bitmap visited, dùng BFS thường.")
+        bitmap_visited = False
+
+    # Giới hạn mặc định 50000 trạng thái chỉ dành cho các chế độ giữ trạng thái trong RAM;
+    # external_memory mặc định không giới hạn.
+    if max_states is None and (bitmap_visited or not external_memory):
+        max_states = 50000
+
+    if external_memory or bitmap_visited:
+        start_time = time.time()
+        if bitmap_visited:
+            path = solve_with_ranked_bfs(ctx, level_idx, max_states)
+        else:
+            path = solve_with_external_bfs(ctx, level_idx, max_states, buffer_states, work_dir)
+        if path is None:
+            print("BFS: Không tìm thấy lời giải.")
+            return None
+        elapsed_time = time.time() - start_time
+        print(f"BFS: Tìm thấy lời giải ngắn nhất sau {elapsed_time:.10f} giây.")
+        save_bfs_solution(level_idx, path, elapsed_time)
+        return path
+
+    goals = ctx.goals
+    initial_state = {'player': player, 'boxes': tuple(sorted(ctx.boxes))}
 
     queue = deque([(initial_state, [])])
     visited = set([(tuple(initial_state['player']), initial_state['boxes'])])
+    incumbent = (sum(b not in goals for b in initial_state['boxes']), [])
+
+    if resume_from is not None:
+        try:
+            checkpoint = load_checkpoint(resume_from, ctx, 'BFS')
+        except (OSError, ValueError) as e:
+            print(f"BFS: Không đọc được checkpoint {resume_from}: {e}")
+            return None
+        queue = deque()
+        for _, _, key, path in checkpoint.open_list:
+            p, b = ctx.unpack_state(key)
+            queue.append(({'player': p, 'boxes': tuple(sorted(b))}, path))
+        visited = set()
+        for key in checkpoint.visited:
+            p, b = ctx.unpack_state(key)
+            visited.add((p, tuple(sorted(b))))
+        incumbent = checkpoint.incumbent or incumbent
+        print(f"BFS: Tiếp tục từ checkpoint: {len(queue)} nút mở, {len(visited)} trạng thái đã duyệt.")
 
     print(f"BFS: Bắt đầu giải Level {level_idx}...")
     start_time = time.time()
@@ -80,10 +187,25 @@ def solve_with_bfs(level_data, level_idx, max_states=50000):
     while queue:
         if len(visited) > max_states:
             print(f"BFS: Đã vượt quá {max_states} trạng thái. Dừng lại.")
+            if checkpoint_file is not None:
+                checkpoint = SearchCheckpoint(
+                    'BFS',
+                    [(0, len(p), ctx.pack_state(st['player'], st['boxes']), p) for st, p in queue],
+                    {ctx.pack_state(player_pos, boxes): 0 for player_pos, boxes in visited},
+                    incumbent)
+                try:
+                    save_checkpoint(checkpoint_file, ctx, checkpoint)
+                    print(f"BFS: Đã lưu checkpoint vào {checkpoint_file}")
+                except OSError as e:
+                    print(f"BFS: Không lưu được checkpoint: {e}")
             return None
 
         current_state, path = queue.popleft()
 
+        boxes_off_goal = sum(b not in goals for b in current_state['boxes'])
+        if boxes_off_goal < incumbent[0]:
+            incumbent = (boxes_off_goal, path)
+
         if set(current_state['boxes']) <= goals and len(goals) > 0:
             elapsed_time = time.time() - start_time
             print(f"BFS: Tìm thấy lời giải ngắn nhất sau {elapsed_time:.10f} giây.")
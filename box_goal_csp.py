@@ -0,0 +1,213 @@
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+from level_context import LevelContext, UNREACHABLE
+
+Pos = Tuple[int, int]
+Domains = Dict[Pos, FrozenSet[Pos]]
+
+
+class BoxGoalCSP:
+    """Bài toán CSP gán goal cho thùng: mỗi thùng là một biến, miền là các goal nó còn đẩy tới được.
+
+    Miền một ngôi lấy từ bảng khoảng cách đẩy (ô chết có miền rỗng). Ràng buộc hai ngôi:
+    hai thùng khác goal, và ràng buộc hành lang cụt: khi người chơi không đứng sâu hơn các
+    thùng trong một hành lang cụt rộng 1 ô, các thùng đó chỉ còn bị đẩy sâu thêm nên không
+    thể vượt qua nhau; goal của thùng nằm sâu hơn phải sâu hơn.
+    """
+
+    def __init__(self, ctx: LevelContext, cache_size: int = 100_000):
+        self.ctx = ctx
+        self.cache_size = cache_size
+        self.distinct = len(ctx.boxes) <= len(ctx.goals)
+        self._ac_cache: Dict[Tuple[FrozenSet[Pos], Optional[Tuple[int, int]]], Optional[Domains]] = {}
+        self._conflict_cache: Dict[FrozenSet[Pos], Optional[FrozenSet[Pos]]] = {}
+        self.revisions = 0
+        self.wipeouts = 0
+
+        # corridor[ô] = (mã hành lang cụt, độ sâu tính từ đầu cụt)
+        self.corridor: Dict[Pos, Tuple[int, int]] = {}
+        cell_index = ctx.cell_index
+        segment = 0
+        for dx, dy in [(1, 0), (0, 1)]:
+            for cell in ctx.cells:
+                prev = (cell[0] - dx, cell[1] - dy)
+                if not self._in_corridor(cell, dx, dy) or (prev in cell_index and self._in_corridor(prev, dx, dy)):
+                    continue
+                run = [cell]
+                nxt = (cell[0] + dx, cell[1] + dy)
+                while nxt in cell_index and self._in_corridor(nxt, dx, dy):
+                    run.append(nxt)
+                    nxt = (nxt[0] + dx, nxt[1] + dy)
+                start_closed = prev not in cell_index
+                end_closed = nxt not in cell_index
+                if len(run) < 2 or start_closed == end_closed:
+                    continue
+                if end_closed:
+                    run.reverse()
+                for depth, pos in enumerate(run):
+                    self.corridor[pos] = (segment, depth)
+                segment += 1
+
+    def _in_corridor(self, cell: Pos, dx: int, dy: int) -> bool:
+        # Hai bên vuông góc với hướng (dx, dy) đều là tường.
+        walls = self.ctx.walls
+        return (cell[0] + dy, cell[1] + dx) in walls and (cell[0] - dy, cell[1] - dx) in walls
+
+    def unary_domain(self, box: Pos) -> FrozenSet[Pos]:
+        idx = self.ctx.cell_index.get(box)
+        if idx is None:
+            return frozenset()
+        return frozenset(g for g, dist in self.ctx.goal_distances.items() if dist[idx] != UNREACHABLE)
+
+    def consistent(self, box_a: Pos, goal_a: Pos, box_b: Pos, goal_b: Pos,
+                   player_spot: Optional[Tuple[int, int]] = None) -> bool:
+        # player_spot = corridor.get(vị trí người chơi).
+        if self.distinct and goal_a == goal_b:
+            return False
+        corridor = self.corridor
+        ca = corridor.get(box_a)
+        cb = corridor.get(box_b)
+        if ca is None or cb is None or ca[0] != cb[0]:
+            return True
+        if player_spot is not None and player_spot[0] == ca[0] and player_spot[1] < max(ca[1], cb[1]):
+            return True
+        ga = corridor.get(goal_a)
+        gb = corridor.get(goal_b)
+        if ga is None or gb is None or ga[0] != ca[0] or gb[0] != ca[0]:
+            return False
+        return (ca[1] < cb[1]) == (ga[1] < gb[1])
+
+    def _revise(self, domains: Domains, xi: Pos, xj: Pos, player_spot=None) -> bool:
+        self.revisions += 1
+        dj = domains[xj]
+        kept = frozenset(a for a in domains[xi] if any(self.consistent(xi, a, xj, b, player_spot) for b in dj))
+        if len(kept) == len(domains[xi]):
+            return False
+        domains[xi] = kept
+        return True
+
+    def _has_matching(self, domains: Domains) -> bool:
+        # Mọi thùng được gán goal khác nhau (ghép cặp đầy đủ, thuật toán Kuhn).
+        owner: Dict[Pos, Pos] = {}
+
+        def assign(box, seen):
+            for g in domains[box]:
+                if g in seen:
+                    continue
+                seen.add(g)
+                if g not in owner or assign(owner[g], seen):
+                    owner[g] = box
+                    return True
+            return False
+
+        return all(assign(box, set()) for box in sorted(domains, key=lambda b: len(domains[b])))
+
+    def forward_check(self, boxes: Iterable[Pos], moved: Pos, player: Optional[Pos] = None) -> Optional[Domains]:
+        """Miền một ngôi, rồi lọc miền các thùng khác theo thùng vừa bị đẩy. None nếu có miền rỗng."""
+        domains = {b: self.unary_domain(b) for b in boxes}
+        if not domains.get(moved):
+            self.wipeouts += 1
+            return None
+        player_spot = self.corridor.get(player)
+        for other in domains:
+            if other != moved and self._revise(domains, other, moved, player_spot) and not domains[other]:
+                self.wipeouts += 1
+                return None
+        return domains
+
+    def arc_consistent(self, boxes: FrozenSet[Pos], player: Optional[Pos] = None) -> Optional[Domains]:
+        """AC-3 trên toàn bộ các cặp thùng. None nếu có miền rỗng hoặc không gán được goal riêng."""
+        player_spot = self.corridor.get(player)
+        key = (boxes, player_spot)
+        if key in self._ac_cache:
+            return self._ac_cache[key]
+        domains = {b: self.unary_domain(b) for b in boxes}
+        result: Optional[Domains] = domains
+        if not all(domains.values()):
+            result = None
+        else:
+            queue = deque((xi, xj) for xi in domains for xj in domains if xi != xj)
+            while queue:
+                xi, xj = queue.popleft()
+                if self._revise(domains, xi, xj, player_spot):
+                    if not domains[xi]:
+                        result = None
+                        break
+                    queue.extend((xk, xi) for xk in domains if xk != xi and xk != xj)
+            if result is not None and self.distinct and not self._has_matching(domains):
+                result = None
+        if result is None:
+            self.wipeouts += 1
+        if len(self._ac_cache) >= self.cache_size:
+            self._ac_cache.clear()
+        self._ac_cache[key] = result
+        return result
+
+    def conflict_set(self, boxes: FrozenSet[Pos]) -> Optional[FrozenSet[Pos]]:
+        """Các thùng tạo bế tắc vĩnh viễn, không phụ thuộc vị trí người chơi; None nếu không có.
+
+        Một thùng trên ô chết, hoặc một tập thùng (vi phạm điều kiện Hall) mà hợp các miền
+        một ngôi có ít goal hơn số thùng. Đẩy thùng chỉ làm miền một ngôi nhỏ đi nên các bế
+        tắc này không bao giờ được gỡ.
+        """
+        if boxes in self._conflict_cache:
+            return self._conflict_cache[boxes]
+        domains = {b: self.unary_domain(b) for b in boxes}
+        result = None
+        for b in sorted(boxes):
+            if not domains[b]:
+                result = frozenset([b])
+                break
+        if result is None and self.distinct:
+            owner: Dict[Pos, Pos] = {}
+
+            def assign(box, seen, tree):
+                tree.add(box)
+                for g in domains[box]:
+                    if g in seen:
+                        continue
+                    seen.add(g)
+                    if g not in owner or assign(owner[g], seen, tree):
+                        owner[g] = box
+                        return True
+                return False
+
+            for b in sorted(boxes, key=lambda b: (len(domains[b]), b)):
+                tree = set()
+                if not assign(b, set(), tree):
+                    # Cây xen kẽ của lần ghép thất bại: các thùng trong đó chỉ có các goal đã thăm.
+                    result = frozenset(tree)
+                    break
+        if len(self._conflict_cache) >= self.cache_size:
+            self._conflict_cache.clear()
+        self._conflict_cache[boxes] = result
+        return result
+
+    def push_score(self, domains: Domains, box: Pos, dest: Pos) -> int:
+        """Thay đổi khoảng cách đẩy nhỏ nhất tới miền của thùng: âm là đẩy lại gần goal."""
+        ctx = self.ctx
+        i, j = ctx.cell_index[box], ctx.cell_index[dest]
+        goal_distances = ctx.goal_distances
+        before = min(goal_distances[g][i] for g in domains[dest])
+        after = min(goal_distances[g][j] for g in domains[dest])
+        return after - before
+
+    def most_constrained(self, domains: Domains) -> Optional[Pos]:
+        # Thùng chưa nằm trên goal có miền nhỏ nhất (MRV).
+        free = [b for b in domains if b not in self.ctx.goals]
+        if not free:
+            return None
+        return min(free, key=lambda b: (len(domains[b]), b))
+
+
+_csp_cache: Dict[bytes, BoxGoalCSP] = {}
+
+
+def get_box_goal_csp(ctx: LevelContext) -> BoxGoalCSP:
+    csp = _csp_cache.get(ctx.level_key)
+    if csp is None:
+        if len(_csp_cache) >= 64:
+            _csp_cache.clear()
+        csp = _csp_cache[ctx.level_key] = BoxGoalCSP(ctx)
+    return csp
@@ -0,0 +1,192 @@
+import heapq
+import os
+import shutil
+import struct
+import tempfile
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+_LEN = struct.Struct('<I')
+
+
+def _write_records(filename: str, records: Iterable[bytes]) -> int:
+    count = 0
+    with open(filename, 'wb', buffering=1 << 20) as f:
+        for rec in records:
+            f.write(_LEN.pack(len(rec)))
+            f.write(rec)
+            count += 1
+    return count
+
+
+def _read_records(filename: str) -> Iterator[bytes]:
+    with open(filename, 'rb', buffering=1 << 20) as f:
+        while True:
+            head = f.read(4)
+            if not head:
+                return
+            (length,) = _LEN.unpack(head)
+            yield f.read(length)
+
+
+def _unique(records: Iterable[bytes]) -> Iterator[bytes]:
+    last = None
+    for rec in records:
+        if rec != last:
+            yield rec
+            last = rec
+
+
+def _difference(records: Iterable[bytes], seen: Iterable[bytes]) -> Iterator[bytes]:
+    # Cả hai luồng đều đã sắp xếp: trộn tuần tự, bỏ các bản ghi đã có trong seen.
+    seen_iter = iter(seen)
+    current = next(seen_iter, None)
+    for rec in records:
+        while current is not None and current < rec:
+            current = next(seen_iter, None)
+        if current != rec:
+            yield rec
+
+
+class ExternalBFS:
+    """BFS theo từng tầng độ sâu, lưu trạng thái trên đĩa thay vì trong RAM.
+
+    Mỗi tầng được sinh ra thành các run file đã sắp xếp (tối đa buffer_records bản ghi
+    trong bộ nhớ), sau đó trộn k-đường để loại trùng trong tầng và loại các trạng thái
+    đã xuất hiện ở những tầng trước. Bản ghi là bytes tuỳ ý; successors(rec) trả về
+    các cặp (action, rec_mới).
+
+    Mặc định mọi tầng trước được gộp sẵn thành một run "visited" đã sắp xếp, ghi lại sau
+    mỗi tầng, nên mỗi lần trộn chỉ mở một file. dedupe_layers = k thì chỉ so với k tầng gần nhất.
+    Khi một tầng có nhiều hơn max_open_runs run file, chúng được trộn nhiều lượt, mỗi lượt
+    tối đa max_open_runs file, nên số file mở cùng lúc (và bộ đệm đọc) luôn bị chặn.
+    """
+
+    def __init__(self, successors: Callable[[bytes], Iterable[Tuple[int, bytes]]],
+                 is_goal: Callable[[bytes], bool],
+                 buffer_records: int = 1_000_000,
+                 work_dir: Optional[str] = None,
+                 dedupe_layers: Optional[int] = None,
+                 max_open_runs: int = 64):
+        self.successors = successors
+        self.is_goal = is_goal
+        self.buffer_records = max(1, buffer_records)
+        self.work_dir = work_dir
+        self.dedupe_layers = dedupe_layers
+        self.max_open_runs = max(2, max_open_runs)
+        self.layer_sizes: List[int] = []
+        self.budget_exceeded = False
+
+    def _layer_file(self, tmp: str, depth: int) -> str:
+        return os.path.join(tmp, f"layer_{depth:05d}.bin")
+
+    def _expand_layer(self, tmp: str, depth: int) -> List[str]:
+        runs = []
+        buffer = []
+
+        def flush():
+            buffer.sort()
+            run_name = os.path.join(tmp, f"run_{depth:05d}_{len(runs):05d}.bin")
+            _write_records(run_name, _unique(buffer))
+            runs.append(run_name)
+            buffer.clear()
+
+        for rec in _read_records(self._layer_file(tmp, depth)):
+            for _, nxt in self.successors(rec):
+                buffer.append(nxt)
+                if len(buffer) >= self.buffer_records:
+                    flush()
+        if buffer:
+            flush()
+        return runs
+
+    def _reduce_runs(self, tmp: str, depth: int, runs: List[str]) -> List[str]:
+        # Trộn từng nhóm max_open_runs run thành một run mới cho tới khi còn đủ ít run.
+        fan_in = self.max_open_runs
+        generation = 0
+        while len(runs) > fan_in:
+            reduced = []
+            for i in range(0, len(runs), fan_in):
+                group = runs[i:i + fan_in]
+                if len(group) == 1:
+                    reduced.append(group[0])
+                    continue
+                run_name = os.path.join(tmp, f"run_{depth:05d}_m{generation:03d}_{len(reduced):05d}.bin")
+                _write_records(run_name, _unique(heapq.merge(*[_read_records(r) for r in group])))
+                for r in group:
+                    os.remove(r)
+                reduced.append(run_name)
+            runs = reduced
+            generation += 1
+        return runs
+
+    def _visited_file(self, tmp: str) -> str:
+        return os.path.join(tmp, "visited.bin")
+
+    def _merge_layer(self, tmp: str, depth: int, runs: List[str]) -> int:
+        runs = self._reduce_runs(tmp, depth, runs)
+        merged = _unique(heapq.merge(*[_read_records(r) for r in runs]))
+        if self.dedupe_layers is None:
+            seen = _read_records(self._visited_file(tmp))
+        else:
+            first = max(0, depth + 1 - self.dedupe_layers)
+            seen = heapq.merge(*[_read_records(self._layer_file(tmp, d)) for d in range(first, depth + 1)])
+        layer_file = self._layer_file(tmp, depth + 1)
+        count = _write_records(layer_file, _difference(merged, seen))
+        for r in runs:
+            os.remove(r)
+        if self.dedupe_layers is None:
+            # Tầng mới không giao với visited nên trộn hai run đã sắp xếp là đủ.
+            visited = self._visited_file(tmp)
+            _write_records(visited + '.tmp', heapq.merge(_read_records(visited), _read_records(layer_file)))
+            os.replace(visited + '.tmp', visited)
+        return count
+
+    def _find_goal(self, tmp: str, depth: int) -> Optional[bytes]:
+        for rec in _read_records(self._layer_file(tmp, depth)):
+            if self.is_goal(rec):
+                return rec
+        return None
+
+    def _reconstruct(self, tmp: str, depth: int, target: bytes) -> List[int]:
+        # Dò ngược: ở mỗi tầng tìm một trạng thái có bước đi dẫn tới target.
+        path = []
+        for d in range(depth - 1, -1, -1):
+            for rec in _read_records(self._layer_file(tmp, d)):
+                action = next((a for a, nxt in self.successors(rec) if nxt == target), None)
+                if action is not None:
+                    path.append(action)
+                    target = rec
+                    break
+        path.reverse()
+        return path
+
+    def search(self, start: bytes, max_depth: Optional[int] = None,
+               max_records: Optional[int] = None,
+               deadline: Optional[float] = None) -> Optional[List[int]]:
+        # None khi hết trạng thái hoặc chạm giới hạn; budget_exceeded phân biệt hai trường hợp.
+        self.budget_exceeded = False
+        tmp = tempfile.mkdtemp(prefix='sokoban_bfs_', dir=self.work_dir)
+        try:
+            _write_records(self._layer_file(tmp, 0), [start])
+            if self.dedupe_layers is None:
+                _write_records(self._visited_file(tmp), [start])
+            self.layer_sizes = [1]
+            depth = 0
+            while True:
+                goal = self._find_goal(tmp, depth)
+                if goal is not None:
+                    return self._reconstruct(tmp, depth, goal)
+                if ((max_depth is not None and depth >= max_depth)
+                        or (max_records is not None and sum(self.layer_sizes) > max_records)
+                        or (deadline is not None and time.time() > deadline)):
+                    self.budget_exceeded = True
+                    return None
+                runs = self._expand_layer(tmp, depth)
+                count = self._merge_layer(tmp, depth, runs)
+                if count == 0:
+                    return None
+                self.layer_sizes.append(count)
+                depth += 1
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
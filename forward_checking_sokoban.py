@@ -1,8 +1,11 @@
 import time
-import sys
 from typing import List, Tuple, Optional, Set, FrozenSet
 
-sys.setrecursionlimit(10000)
+from box_goal_csp import get_box_goal_csp
+from iterative_dfs import conflict_backjump, depth_first_search, sokoban_moves
+from level_context import LevelContext, get_level_context
+from transposition_table import DepthFirstMemo
+
 
 def save_fc_solution(level_idx, path,elapsed_time):
     if path is None:
@@ -29,74 +32,71 @@ def is_deadlock(boxes_pos: FrozenSet[Tuple[int, int]], walls: Set[Tuple[int, int
                 return True
     return False
 
-def solve_with_forward_checking(level_data: List[List[str]], level_idx: int, max_depth=250):
-    def find_player(g: List[List[str]]) -> Optional[Tuple[int, int]]:
-        for y, row in enumerate(g):
-            for x, char in enumerate(row):
-                if char in ['@', '+']: return (x, y)
+def solve_with_forward_checking(level_data: List[List[str]], level_idx: int, max_depth=250,
+                                context: Optional[LevelContext] = None,
+                                tt_capacity: int = 1 << 18,
+                                move_ordering: bool = False,
+                                backjumping: bool = True):
+    """Forward checking giới hạn độ sâu max_depth, bảng chuyển vị tt_capacity mục.
+
+    move_ordering (mặc định tắt): thử trước các nước đẩy thùng lại gần miền goal của nó, rồi
+    đi về phía thùng có miền nhỏ nhất; tắt thì giữ thứ tự action gốc như bản cũ.
+    backjumping (mặc định bật): khi một nút thất bại vì một tập thùng bế tắc vĩnh viễn, nhảy
+    thẳng về nút đã đẩy thùng gần nhất trong tập đó; chỉ cắt các cây con chắc chắn chết.
+    """
+    ctx = get_level_context(level_data, context)
+
+    initial_player_pos = ctx.player
+    if initial_player_pos is None:
+        print(f"Forward Checking: Không tìm thấy người chơi ở Level {level_idx}")
         return None
 
-    def get_goals(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['.', '+', '*']}
-
-    def get_boxes(g: List[List[str]]) -> FrozenSet[Tuple[int, int]]:
-        return frozenset(sorted([(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['$', '*']]))
-
-    def get_walls(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char == '#'}
-
-    initial_player_pos = find_player(level_data)
-    initial_boxes = get_boxes(level_data)
-    goals = get_goals(level_data)
-    walls = get_walls(level_data)
-    visited = set()
-    solution_path = []
+    initial_boxes = ctx.boxes
+    goals = ctx.goals
+    walls = ctx.walls
+    visited = DepthFirstMemo(tt_capacity)
+    csp = get_box_goal_csp(ctx)
 
     print(f"Forward Checking: Bắt đầu giải Level {level_idx}...")
     start_time = time.time()
-    directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-
-    def _backtrack_with_fc(current_player_pos, current_boxes_pos, current_depth):
-        if goals.issubset(current_boxes_pos):
-            return True
-        if current_depth >= max_depth:
-            return False
-
-        current_state = (current_player_pos, current_boxes_pos)
-        if current_state in visited:
-            return False
-        visited.add(current_state)
-
-        for action, (dx, dy) in enumerate(directions):
-            next_player_pos = (current_player_pos[0] + dx, current_player_pos[1] + dy)
-
-            if next_player_pos in walls:
-                continue
-
-            new_boxes_pos = current_boxes_pos
-            is_push = False
 
-            if next_player_pos in current_boxes_pos:
-                is_push = True
-                next_box_pos = (next_player_pos[0] + dx, next_player_pos[1] + dy)
-                if next_box_pos in walls or next_box_pos in current_boxes_pos:
+    def manhattan(a, b):
+        return 0 if b is None else abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+    # Trạng thái tìm kiếm: (người chơi, tập thùng, miền goal của từng thùng, độ ưu tiên).
+    def successors(state, depth):
+        player, boxes, domains, _ = state
+        target = csp.most_constrained(domains)
+        children = []
+        for action, next_player_pos, new_boxes_pos, next_box_pos in sokoban_moves(player, boxes, walls):
+            if next_box_pos is not None:
+                if is_deadlock(new_boxes_pos, walls, goals):
                     continue
-
-                box_list = list(current_boxes_pos)
-                box_list.remove(next_player_pos)
-                box_list.append(next_box_pos)
-                new_boxes_pos = frozenset(sorted(box_list))
-
-            if is_push and is_deadlock(new_boxes_pos, walls, goals):
-                continue
-
-            if _backtrack_with_fc(next_player_pos, new_boxes_pos, current_depth + 1):
-                solution_path.insert(0, action)
-                return True
-
-        return False
-
-    if _backtrack_with_fc(initial_player_pos, initial_boxes, 0):
+                new_domains = csp.forward_check(new_boxes_pos, next_box_pos, next_player_pos)
+                if new_domains is None:
+                    continue
+                score = csp.push_score(new_domains, next_player_pos, next_box_pos)
+                priority = (0 if score < 0 else 2, score, action)
+            else:
+                new_domains = domains
+                priority = (1, manhattan(next_player_pos, target), action)
+            children.append((action, (next_player_pos, new_boxes_pos, new_domains, priority)))
+        return children
+
+    # Thứ tự thử: đẩy thùng lại gần miền goal của nó, đi về phía thùng có miền nhỏ nhất, đẩy ra xa.
+    def by_priority(children):
+        return sorted(children, key=lambda child: child[1][3])
+
+    root_domains = {b: csp.unary_domain(b) for b in initial_boxes}
+    if not all(root_domains.values()):
+        print(f"Forward Checking: Level {level_idx} có thùng không còn goal nào đẩy tới được.")
+        return None
+    backjump = conflict_backjump(csp.conflict_set) if backjumping else None
+    solution_path = depth_first_search((initial_player_pos, initial_boxes, root_domains, None), successors,
+                                       lambda state: goals.issubset(state[1]), max_depth, memo=visited,
+                                       key=lambda state: (state[0], state[1]),
+                                       order=by_priority if move_ordering else None, backjump=backjump)
+    if solution_path is not None:
         elapsed_time = time.time() - start_time
         print(f"Forward Checking: Tìm thấy lời giải sau {elapsed_time:.2f} giây.")
         print(f"  - Số bước đi: {len(solution_path)}")
@@ -1,7 +1,17 @@
+import os
 import time
 import random
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from typing import List, Tuple, Optional, Set, FrozenSet
 
+from level_context import LevelContext, get_level_context, UNREACHABLE
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 def save_ga_solution(level_idx, path,elapsed_time):
     if path is None:
         return
@@ -13,10 +23,323 @@ def save_ga_solution(level_idx, path,elapsed_time):
         f.write(f"Path Genetic: {path}\n\n")
     print(f"GA: Đã lưu lời giải cho Level {level_idx} vào solutions.txt")
 
+def boxes_fitness(boxes_pos: FrozenSet[Tuple[int, int]], goals: FrozenSet[Tuple[int, int]]) -> float:
+    if goals.issubset(boxes_pos):
+        return 10000.0
+
+    boxes_on_goal = len(boxes_pos.intersection(goals))
+
+    total_dist = 0
+    for box in boxes_pos:
+        total_dist += min(abs(box[0] - g[0]) + abs(box[1] - g[1]) for g in goals)
+
+    fitness = (boxes_on_goal * 100) + (1.0 / (1.0 + total_dist))
+    return fitness
+
+
+def advance_genes(ctx: LevelContext, genes, start: int, stop: int, key: int, solved: int) -> Tuple[int, int]:
+    # Mô phỏng genes[start:stop] trên trạng thái đóng gói, tương đương ctx.apply_action nhưng nhanh hơn.
+    # solved là độ dài tiền tố ngắn nhất đã giải xong level, -1 nếu chưa.
+    neighbours, bits = ctx.neighbours, ctx.player_bits
+    goal_mask = ctx.goal_mask >> bits
+    player, boxes = key & ctx.player_mask, key >> bits
+    for i in range(start, stop):
+        action = genes[i]
+        nxt = neighbours[player][action]
+        if nxt == UNREACHABLE:
+            continue
+        if boxes >> nxt & 1:
+            dest = neighbours[nxt][action]
+            if dest == UNREACHABLE or boxes >> dest & 1:
+                continue
+            boxes ^= (1 << nxt) | (1 << dest)
+            if solved < 0 and boxes & goal_mask == goal_mask:
+                solved = i + 1
+        player = nxt
+    return (boxes << bits) | player, solved
+
+
+def chromosome_fitness(ctx: LevelContext, chromosome: List[int]) -> float:
+    key = ctx.pack_state(ctx.player, ctx.boxes)
+    key, _ = advance_genes(ctx, chromosome, 0, len(chromosome), key, -1)
+    return boxes_fitness(ctx.unpack_state(key)[1], ctx.goals)
+
+
+class PrefixStateCache:
+    """Cache LRU trạng thái sau mỗi interval gen đầu của nhiễm sắc thể.
+
+    Con sinh ra từ lai ghép một điểm và đột biến thường chung tiền tố dài với cha mẹ,
+    nên mô phỏng được tiếp tục từ tiền tố dài nhất đã có trong cache thay vì từ đầu.
+    Giá trị lưu là (trạng thái đóng gói, độ dài tiền tố ngắn nhất đã giải xong hoặc -1).
+    """
+
+    def __init__(self, ctx: LevelContext, interval: int = 10, capacity: int = 100_000):
+        self.ctx = ctx
+        self.interval = max(1, interval)
+        self.capacity = capacity
+        self.entries: "OrderedDict[bytes, Tuple[int, int]]" = OrderedDict()
+        self.start_key = ctx.pack_state(ctx.player, ctx.boxes)
+        self.start_solved = 0 if ctx.is_solved_key(self.start_key) else -1
+        self.hits = 0
+        self.misses = 0
+
+    def simulate(self, chromosome: List[int]) -> Tuple[int, int]:
+        ctx, entries, interval = self.ctx, self.entries, self.interval
+        genes = bytes(chromosome)
+        key, solved, pos = self.start_key, self.start_solved, 0
+
+        # Tìm nhị phân tiền tố dài nhất trong cache: tiền tố của một mục đã lưu thường cũng có mặt.
+        low, high = 1, len(genes) // interval
+        while low <= high:
+            mid = (low + high) // 2
+            cached = entries.get(genes[:mid * interval])
+            if cached is None:
+                high = mid - 1
+            else:
+                key, solved = cached
+                pos = mid * interval
+                low = mid + 1
+        if pos:
+            entries.move_to_end(genes[:pos])
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        for stop in range(pos + interval, len(genes) + interval, interval):
+            stop = min(stop, len(genes))
+            key, solved = advance_genes(ctx, genes, pos, stop, key, solved)
+            if stop % interval == 0:
+                entries[genes[:stop]] = (key, solved)
+                if len(entries) > self.capacity:
+                    entries.popitem(last=False)
+            pos = stop
+        return key, solved
+
+    def fitness(self, chromosome: List[int]) -> float:
+        key, _ = self.simulate(chromosome)
+        return boxes_fitness(self.ctx.unpack_state(key)[1], self.ctx.goals)
+
+    def trim(self, chromosome: List[int]) -> List[int]:
+        _, solved = self.simulate(chromosome)
+        return chromosome if solved < 0 else chromosome[:solved]
+
+
+class BatchSimulator:
+    """Mô phỏng cả quần thể cùng lúc bằng numpy, mỗi lần tiến một gen cho mọi nhiễm sắc thể.
+
+    Trạng thái là mảng ô người chơi (P,) và lưới chiếm chỗ của thùng (P, num_cells + 1);
+    cột cuối là ô "tường" giả để mọi hướng đi ra ngoài đều trỏ vào đó.
+    """
+
+    def __init__(self, ctx: LevelContext):
+        wall = ctx.num_cells
+        self.wall = wall
+        nb = np.array(ctx.neighbours, dtype=np.int64).reshape(ctx.num_cells, 4)
+        nb[nb == UNREACHABLE] = wall
+        self.neighbours = np.vstack([nb, np.full((1, 4), wall, dtype=np.int64)])
+        self.player = ctx.cell_index[ctx.player]
+        self.boxes = np.zeros(ctx.num_cells + 1, dtype=bool)
+        for b in ctx.boxes:
+            self.boxes[ctx.cell_index[b]] = True
+        self.goal_cells = np.array(sorted(ctx.goal_indices), dtype=np.int64)
+        self.manhattan = np.array(
+            [min(abs(x - g[0]) + abs(y - g[1]) for g in ctx.goals) for x, y in ctx.cells] + [0],
+            dtype=np.int64)
+
+    def simulate(self, population):
+        # Chuyển vị một lần để mỗi gen là một hàng liên tục trong bộ nhớ.
+        genes = np.ascontiguousarray(np.asarray(population, dtype=np.int8).T)
+        length, size = genes.shape
+        stride = self.wall + 1
+        # Chỉ số phẳng: neighbours[ô * 4 + action], boxes[hàng * stride + ô].
+        nb = self.neighbours.ravel()
+        wall = self.wall
+        offsets = np.arange(size, dtype=np.int64) * stride
+        player = np.full(size, self.player, dtype=np.int64)
+        boxes = np.tile(self.boxes, size)
+
+        for g in range(length):
+            action = genes[g]
+            nxt = nb[player * 4 + action]
+            hit = boxes[offsets + nxt]
+            dest = nb[nxt * 4 + action]
+            move = (nxt != wall) & ~(hit & ((dest == wall) | boxes[offsets + dest]))
+            push = np.flatnonzero(move & hit)
+            if push.size:
+                boxes[offsets[push] + nxt[push]] = False
+                boxes[offsets[push] + dest[push]] = True
+            player = np.where(move, nxt, player)
+        return player, boxes.reshape(size, stride)
+
+    def fitness(self, population):
+        _, boxes = self.simulate(population)
+        on_goal = boxes[:, self.goal_cells]
+        boxes_on_goal = on_goal.sum(axis=1)
+        total_dist = boxes.astype(np.int64) @ self.manhattan
+        fitness = boxes_on_goal * 100 + 1.0 / (1.0 + total_dist)
+        fitness[on_goal.all(axis=1)] = 10000.0
+        return fitness
+
+
+def evolve_population(population, fitness, mutation_rate: float, rng, tournament_size: int = 5):
+    """Một thế hệ GA trên mảng (P, L): giữ cá thể tốt nhất, chọn lọc giải đấu,
+    lai ghép một điểm và đột biến, cùng quy tắc với phiên bản dùng list."""
+    size, length = population.shape
+    num_children = size - 1
+    num_pairs = (num_children + 1) // 2
+
+    # Mỗi giải đấu chọn tournament_size cá thể khác nhau (không hoàn lại) như random.sample:
+    # lấy k khoá ngẫu nhiên nhỏ nhất của mỗi hàng.
+    k = min(tournament_size, size)
+    keys = rng.random((2 * num_pairs, size))
+    contenders = np.argpartition(keys, k - 1, axis=1)[:, :k]
+    winners = contenders[np.arange(2 * num_pairs), np.argmax(fitness[contenders], axis=1)]
+    parent1, parent2 = population[winners[:num_pairs]], population[winners[num_pairs:]]
+
+    points = rng.integers(1, length, size=(num_pairs, 1)) if length > 1 else np.ones((num_pairs, 1), dtype=np.int64)
+    head = np.arange(length) < points
+    children = np.empty((2 * num_pairs, length), dtype=population.dtype)
+    children[0::2] = np.where(head, parent1, parent2)
+    children[1::2] = np.where(head, parent2, parent1)
+    children = children[:num_children]
+
+    mutate = rng.random(children.shape) < mutation_rate
+    children[mutate] = rng.integers(0, 4, size=int(mutate.sum()), dtype=population.dtype)
+    return np.vstack([population[np.argmax(fitness)][None, :], children])
+
+
+class PushDecoder:
+    """Giải mã nhiễm sắc thể dạng macro đẩy: gen = chỉ_số_thùng * 4 + hướng.
+
+    Mỗi gen được thực hiện bằng cách đi tới ô phía sau thùng (BFS trên vùng người chơi
+    đi được) rồi đẩy. Gen không hợp lệ được sửa thành nước đẩy hợp lệ kế tiếp theo
+    thứ tự vòng (gen + 1, gen + 2, ...) và ghi ngược vào nhiễm sắc thể.
+    """
+
+    def __init__(self, ctx: LevelContext):
+        self.ctx = ctx
+        self.num_boxes = len(ctx.boxes)
+        self.gene_values = max(1, self.num_boxes) * 4
+        self.start_player = ctx.cell_index[ctx.player]
+        self.start_boxes = [ctx.cell_index[b] for b in sorted(ctx.boxes)]
+
+    def _reach(self, player: int, occupied: Set[int]):
+        neighbours = self.ctx.neighbours
+        parents = {player: None}
+        q = deque([player])
+        while q:
+            cell = q.popleft()
+            for action in range(4):
+                nxt = neighbours[cell][action]
+                if nxt == UNREACHABLE or nxt in parents or nxt in occupied:
+                    continue
+                parents[nxt] = (cell, action)
+                q.append(nxt)
+        return parents
+
+    def _legal(self, gene: int, boxes: List[int], occupied: Set[int], reach) -> bool:
+        neighbours = self.ctx.neighbours
+        box_idx, direction = divmod(gene, 4)
+        box = boxes[box_idx]
+        dest = neighbours[box][direction]
+        push_from = neighbours[box][direction ^ 1]
+        return (dest != UNREACHABLE and dest not in occupied and dest not in self.ctx.dead_indices
+                and push_from in reach)
+
+    def decode(self, chromosome: List[int]) -> Tuple[List[int], FrozenSet[Tuple[int, int]]]:
+        # Trả về (chuỗi bước đi, vị trí thùng cuối); dừng sớm khi đã giải xong hoặc không còn nước đẩy.
+        ctx = self.ctx
+        goals = ctx.goal_indices
+        player = self.start_player
+        boxes = list(self.start_boxes)
+        occupied = set(boxes)
+        actions: List[int] = []
+
+        for g in range(len(chromosome)):
+            if not boxes or goals <= occupied:
+                break
+            reach = self._reach(player, occupied)
+            gene = chromosome[g] % self.gene_values
+            for k in range(self.gene_values):
+                candidate = (gene + k) % self.gene_values
+                if self._legal(candidate, boxes, occupied, reach):
+                    break
+            else:
+                break
+            chromosome[g] = candidate
+
+            box_idx, direction = divmod(candidate, 4)
+            box = boxes[box_idx]
+            walk = []
+            cell = ctx.neighbours[box][direction ^ 1]
+            while reach[cell] is not None:
+                cell, action = reach[cell]
+                walk.append(action)
+            actions.extend(reversed(walk))
+            actions.append(direction)
+
+            dest = ctx.neighbours[box][direction]
+            occupied.remove(box)
+            occupied.add(dest)
+            boxes[box_idx] = dest
+            player = box
+
+        return actions, frozenset(ctx.cells[c] for c in occupied)
+
+
+def tournament_selection(population_with_fitness: List[Tuple[List[int], float]], rng=random,
+                         tournament_size: int = 5) -> List[int]:
+    best_in_tournament = max(rng.sample(population_with_fitness, tournament_size), key=lambda item: item[1])
+    return best_in_tournament[0]
+
+
+def one_point_crossover(parent1: List[int], parent2: List[int], rng=random) -> Tuple[List[int], List[int]]:
+    point = rng.randint(1, len(parent1) - 1)
+    child1 = parent1[:point] + parent2[point:]
+    child2 = parent2[:point] + parent1[point:]
+    return child1, child2
+
+
+def mutate(chromosome: List[int], mutation_rate: float, rng=random, gene_values: int = 4) -> List[int]:
+    for i in range(len(chromosome)):
+        if rng.random() < mutation_rate:
+            chromosome[i] = rng.randint(0, gene_values - 1)
+    return chromosome
+
+
+def next_generation(population_with_fitness: List[Tuple[List[int], float]], population_size: int,
+                    mutation_rate: float, rng=random, gene_values: int = 4) -> List[List[int]]:
+    # population_with_fitness đã sắp xếp giảm dần; cá thể tốt nhất được giữ nguyên.
+    new_population = [population_with_fitness[0][0]]
+
+    while len(new_population) < population_size:
+        parent1 = tournament_selection(population_with_fitness, rng)
+        parent2 = tournament_selection(population_with_fitness, rng)
+        child1, child2 = one_point_crossover(parent1, parent2, rng)
+        new_population.append(mutate(child1, mutation_rate, rng, gene_values))
+        if len(new_population) < population_size:
+            new_population.append(mutate(child2, mutation_rate, rng, gene_values))
+
+    return new_population
+
+
 def solve_with_genetic_algorithm(level_data: List[List[str]], level_idx: int,
                                  population_size=100, num_generations=50,
-                                 chromosome_length=150, mutation_rate=0.05):
+                                 chromosome_length=None, mutation_rate=0.05,
+                                 encoding: str = 'moves',
+                                 use_numpy: bool = True,
+                                 prefix_interval: int = 0,
+                                 prefix_cache_size: int = 100_000,
+                                 context: Optional[LevelContext] = None):
+    """GA trên chuỗi nước đi (encoding='moves') hoặc nước đẩy (encoding='pushes').
+
+    use_numpy đánh giá cả quần thể theo lô bằng numpy. prefix_interval > 0 bật cache tiền tố
+    cho bản mô phỏng từng cá thể và vì vậy chọn nhánh đó thay cho nhánh numpy (cache không
+    dùng được khi đánh giá theo lô).
+    """
     def trim_solution(chromosome: List[int]) -> List[int]:
+        if cache is not None:
+            return cache.trim(chromosome)
         player_pos, boxes_pos = initial_player_pos, initial_boxes
 
         if goals.issubset(boxes_pos):
@@ -42,28 +365,20 @@ def solve_with_genetic_algorithm(level_data: List[List[str]], level_idx: int,
 
         return chromosome
 
-    def find_player(g: List[List[str]]) -> Optional[Tuple[int, int]]:
-        for y, row in enumerate(g):
-            for x, char in enumerate(row):
-                if char in ['@', '+']: return (x, y)
-        return None
-
-    def get_goals(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['.', '+', '*']}
-
-    def get_boxes(g: List[List[str]]) -> FrozenSet[Tuple[int, int]]:
-        return frozenset(sorted([(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['$', '*']]))
-
-    def get_walls(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char == '#'}
+    ctx = get_level_context(level_data, context)
 
-    initial_player_pos = find_player(level_data)
-    initial_boxes = get_boxes(level_data)
-    goals = get_goals(level_data)
-    walls = get_walls(level_data)
+    initial_player_pos = ctx.player
+    initial_boxes = ctx.boxes
+    goals = ctx.goals
+    walls = ctx.walls
     directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    # prefix_interval > 0 bật cache tiền tố (có lợi khi mutation_rate thấp) và dùng nhánh mô phỏng
+    # từng cá thể; 0 thì mô phỏng lại từ đầu mỗi lần hoặc đánh giá theo lô bằng numpy.
+    cache = PrefixStateCache(ctx, prefix_interval, prefix_cache_size) if prefix_interval > 0 and ctx.player is not None else None
 
     def calculate_fitness(chromosome: List[int]) -> float:
+        if cache is not None:
+            return cache.fitness(chromosome)
         player_pos, boxes_pos = initial_player_pos, initial_boxes
 
         for action in chromosome:
@@ -81,37 +396,57 @@ def solve_with_genetic_algorithm(level_data: List[List[str]], level_idx: int,
 
             player_pos = next_player_pos
 
-        if goals.issubset(boxes_pos):
-            return 10000.0
+        return boxes_fitness(boxes_pos, goals)
 
-        boxes_on_goal = len(boxes_pos.intersection(goals))
+    print(f"GA: Bắt đầu giải Level {level_idx}...")
+    start_time = time.time()
 
-        total_dist = 0
-        for box in boxes_pos:
-            total_dist += min(abs(box[0] - g[0]) + abs(box[1] - g[1]) for g in goals)
+    def finish(best_solution: List[int]) -> List[int]:
+        trimmed_solution = trim_solution(best_solution)
+        elapsed_time = time.time() - start_time
+        print(f"GA: Tìm thấy lời giải sau {elapsed_time:.2f} giây.")
+        save_ga_solution(level_idx, trimmed_solution,elapsed_time)
+        return trimmed_solution
+
+    if encoding == 'pushes':
+        # Mỗi gen là một nước đẩy (thùng, hướng) nên nhiễm sắc thể ngắn hơn nhiều.
+        chromosome_length = chromosome_length or 40
+        decoder = PushDecoder(ctx)
+        population = [[random.randrange(decoder.gene_values) for _ in range(chromosome_length)]
+                      for _ in range(population_size)]
+
+        for generation in range(num_generations):
+            population_with_fitness = []
+            for chromo in population:
+                actions, boxes_pos = decoder.decode(chromo)
+                fitness = boxes_fitness(boxes_pos, goals)
+                if fitness >= 10000.0:
+                    return finish(actions)
+                population_with_fitness.append((chromo, fitness))
+            population_with_fitness.sort(key=lambda item: item[1], reverse=True)
+            population = next_generation(population_with_fitness, population_size, mutation_rate,
+                                         gene_values=decoder.gene_values)
+
+        print(f"GA: Không tìm thấy lời giải cho Level {level_idx} trong giới hạn.")
+        return None
 
-        fitness = (boxes_on_goal * 100) + (1.0 / (1.0 + total_dist))
-        return fitness
+    chromosome_length = chromosome_length or 150
 
-    def selection(population_with_fitness: List[Tuple[List[int], float]]) -> List[int]:
-        tournament_size = 5
-        best_in_tournament = max(random.sample(population_with_fitness, tournament_size), key=lambda item: item[1])
-        return best_in_tournament[0]
-
-    def crossover(parent1: List[int], parent2: List[int]) -> Tuple[List[int], List[int]]:
-        point = random.randint(1, len(parent1) - 1)
-        child1 = parent1[:point] + parent2[point:]
-        child2 = parent2[:point] + parent1[point:]
-        return child1, child2
-
-    def mutation(chromosome: List[int]) -> List[int]:
-        for i in range(len(chromosome)):
-            if random.random() < mutation_rate:
-                chromosome[i] = random.randint(0, 3)
-        return chromosome
+    if cache is None and use_numpy and np is not None and goals and population_size > 1:
+        # Cả quần thể là một mảng numpy, đánh giá và tiến hoá theo lô.
+        batch = BatchSimulator(ctx)
+        rng = np.random.default_rng(random.getrandbits(64))
+        population = rng.integers(0, 4, size=(population_size, chromosome_length), dtype=np.int8)
 
-    print(f"GA: Bắt đầu giải Level {level_idx}...")
-    start_time = time.time()
+        for generation in range(num_generations):
+            fitness = batch.fitness(population)
+            best = int(np.argmax(fitness))
+            if fitness[best] >= 10000.0:
+                return finish(population[best].tolist())
+            population = evolve_population(population, fitness, mutation_rate, rng)
+
+        print(f"GA: Không tìm thấy lời giải cho Level {level_idx} trong giới hạn.")
+        return None
 
     population = [[random.randint(0, 3) for _ in range(chromosome_length)] for _ in range(population_size)]
 
@@ -122,25 +457,123 @@ def solve_with_genetic_algorithm(level_data: List[List[str]], level_idx: int,
         best_fitness = population_with_fitness[0][1]
 
         if best_fitness >= 10000.0:
-            best_solution = population_with_fitness[0][0]
-            trimmed_solution = trim_solution(best_solution)
-            elapsed_time = time.time() - start_time
-            print(f"GA: Tìm thấy lời giải sau {elapsed_time:.2f} giây.")
-            save_ga_solution(level_idx, trimmed_solution,elapsed_time)
-            return trimmed_solution
+            return finish(population_with_fitness[0][0])
 
-        new_population = [population_with_fitness[0][0]]
+        population = next_generation(population_with_fitness, population_size, mutation_rate)
 
-        while len(new_population) < population_size:
-            parent1 = selection(population_with_fitness)
-            parent2 = selection(population_with_fitness)
-            child1, child2 = crossover(parent1, parent2)
-            new_population.append(mutation(child1))
-            if len(new_population) < population_size:
-                new_population.append(mutation(child2))
+    print(f"GA: Không tìm thấy lời giải cho Level {level_idx} trong giới hạn.")
+    return None
 
-        population = new_population
 
-    print(f"GA: Không tìm thấy lời giải cho Level {level_idx} trong giới hạn.")
+class Island:
+    """Một quần thể con trong mô hình đảo; chỉ chứa list và random.Random nên gửi được qua process."""
+
+    def __init__(self, population: List[List[int]], rng: random.Random):
+        self.population = population
+        self.rng = rng
+        self.scored: Optional[List[Tuple[List[int], float]]] = None
+        self.generations = 0
+
+    def evaluate(self, ctx: LevelContext):
+        if self.scored is None:
+            self.scored = [(chromo, chromosome_fitness(ctx, chromo)) for chromo in self.population]
+            self.scored.sort(key=lambda item: item[1], reverse=True)
+        return self.scored
+
+    @property
+    def best(self) -> Tuple[List[int], float]:
+        return self.scored[0]
+
+    def evolve(self, ctx: LevelContext, generations: int, mutation_rate: float):
+        for _ in range(generations):
+            scored = self.evaluate(ctx)
+            if scored[0][1] >= 10000.0:
+                return
+            self.population = next_generation(scored, len(self.population), mutation_rate, self.rng)
+            self.scored = None
+            self.generations += 1
+        self.evaluate(ctx)
+
+    def receive(self, migrants: List[Tuple[List[int], float]]):
+        # Dân nhập cư thay thế những cá thể kém nhất.
+        scored = self.scored[:len(self.scored) - len(migrants)] + [(list(c), f) for c, f in migrants]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        self.scored = scored
+        self.population = [c for c, _ in scored]
+
+
+_worker_ctx: Optional[LevelContext] = None
+
+
+def _init_worker(ctx: LevelContext):
+    global _worker_ctx
+    _worker_ctx = ctx
+
+
+def _evolve_island(island: Island, generations: int, mutation_rate: float) -> Island:
+    island.evolve(_worker_ctx, generations, mutation_rate)
+    return island
+
+
+def solve_with_island_genetic_algorithm(level_data: List[List[str]], level_idx: int,
+                                        num_islands: Optional[int] = None,
+                                        island_population: int = 100, num_generations=50,
+                                        chromosome_length=150, mutation_rate=0.05,
+                                        migration_interval: int = 5, num_migrants: int = 2,
+                                        seed: Optional[int] = None,
+                                        context: Optional[LevelContext] = None):
+    """GA mô hình đảo: mỗi đảo là một quần thể con tiến hoá trong process riêng.
+
+    Cứ migration_interval thế hệ, num_migrants cá thể tốt nhất của mỗi đảo di cư sang
+    đảo kế tiếp theo vòng tròn. Dừng ngay khi có đảo đạt fitness 10000.0.
+    """
+    ctx = get_level_context(level_data, context)
+    if ctx.player is None or not ctx.goals:
+        print(f"GA đảo: Level {level_idx} không hợp lệ.")
+        return None
+
+    num_islands = num_islands or os.cpu_count() or 1
+    num_migrants = min(num_migrants, island_population - 1)
+    master_rng = random.Random(seed)
+    islands = []
+    for _ in range(num_islands):
+        rng = random.Random(master_rng.getrandbits(64))
+        population = [[rng.randint(0, 3) for _ in range(chromosome_length)] for _ in range(island_population)]
+        islands.append(Island(population, rng))
+
+    print(f"GA đảo: Bắt đầu giải Level {level_idx} với {num_islands} đảo...")
+    start_time = time.time()
+
+    def finish(best_solution: List[int]) -> List[int]:
+        key = ctx.pack_state(ctx.player, ctx.boxes)
+        _, solved = advance_genes(ctx, best_solution, 0, len(best_solution), key, -1)
+        trimmed_solution = best_solution if solved < 0 else best_solution[:solved]
+        elapsed_time = time.time() - start_time
+        print(f"GA đảo: Tìm thấy lời giải sau {elapsed_time:.2f} giây.")
+        save_ga_solution(level_idx, trimmed_solution, elapsed_time)
+        return trimmed_solution
+
+    pool = ProcessPoolExecutor(max_workers=num_islands, initializer=_init_worker, initargs=(ctx,))
+    try:
+        done = 0
+        while done < num_generations:
+            generations = min(max(1, migration_interval), num_generations - done)
+            futures = {pool.submit(_evolve_island, island, generations, mutation_rate): i
+                       for i, island in enumerate(islands)}
+            for fut in as_completed(futures):
+                island = fut.result()
+                islands[futures[fut]] = island
+                if island.best[1] >= 10000.0:
+                    return finish(island.best[0])
+            done += generations
+
+            if num_migrants > 0 and num_islands > 1:
+                emigrants = [island.scored[:num_migrants] for island in islands]
+                for i, island in enumerate(islands):
+                    island.receive(emigrants[i - 1])
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    print(f"GA đảo: Không tìm thấy lời giải cho Level {level_idx} trong giới hạn.")
     return None
 
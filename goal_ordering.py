@@ -0,0 +1,77 @@
+from collections import deque
+from typing import Dict, List, Set, Tuple
+
+from level_context import LevelContext, DIRECTIONS
+
+
+def _player_region(ctx: LevelContext, blocked: Set[Tuple[int, int]]) -> Set[Tuple[int, int]]:
+    # Vùng người chơi đi được từ vị trí ban đầu khi các goal trong blocked đã có thùng
+    # (thùng ban đầu bị bỏ qua vì chúng sẽ được đẩy đi).
+    if ctx.player is None:
+        return set()
+    region = {ctx.player}
+    queue = deque([ctx.player])
+    while queue:
+        x, y = queue.popleft()
+        for dx, dy in DIRECTIONS:
+            nxt = (x + dx, y + dy)
+            if nxt in region or nxt in ctx.walls or nxt in blocked or nxt not in ctx.cell_index:
+                continue
+            region.add(nxt)
+            queue.append(nxt)
+    return region
+
+
+def _entries(ctx: LevelContext, goal: Tuple[int, int], filled: Set[Tuple[int, int]]) -> int:
+    # Số hướng có thể đẩy thùng vào goal khi các goal trong filled đã được lấp.
+    region = _player_region(ctx, filled)
+    count = 0
+    for dx, dy in DIRECTIONS:
+        box_from = (goal[0] - dx, goal[1] - dy)
+        player_from = (box_from[0] - dx, box_from[1] - dy)
+        if box_from in filled or box_from not in ctx.cell_index or box_from in ctx.dead_squares:
+            continue
+        if player_from in filled or player_from not in region:
+            continue
+        count += 1
+    return count
+
+
+def compute_goal_order(ctx: LevelContext) -> List[Tuple[int, int]]:
+    """Thứ tự lấp goal an toàn, tính ngược từ cấu hình mọi goal đều có thùng.
+
+    Ở mỗi bước, goal vẫn còn đẩy thùng vào được khi mọi goal khác đã lấp sẽ là goal lấp
+    cuối cùng; bỏ nó ra và lặp lại. Goal ở góc, ở ngõ cụt bị các goal khác chặn nên được
+    bỏ ra muộn, tức là phải lấp trước. Các goal không xếp được (mọi thứ tự đều chặn nhau)
+    được đặt lên đầu.
+    """
+    filled = set(ctx.goals)
+    last_first: List[Tuple[int, int]] = []
+    while filled:
+        best = None
+        best_entries = 0
+        for goal in sorted(filled):
+            entries = _entries(ctx, goal, filled - {goal})
+            if entries > best_entries:
+                best, best_entries = goal, entries
+        if best is None:
+            break
+        last_first.append(best)
+        filled.remove(best)
+    return sorted(filled) + last_first[::-1]
+
+
+_order_cache: Dict[bytes, List[Tuple[int, int]]] = {}
+
+
+def get_goal_order(ctx: LevelContext) -> List[Tuple[int, int]]:
+    order = _order_cache.get(ctx.level_key)
+    if order is None:
+        if len(_order_cache) >= 64:
+            _order_cache.clear()
+        order = _order_cache[ctx.level_key] = compute_goal_order(ctx)
+    return order
+
+
+def goal_ranks(ctx: LevelContext) -> Dict[Tuple[int, int], int]:
+    return {g: i for i, g in enumerate(get_goal_order(ctx))}
@@ -2,6 +2,8 @@ import time
 import heapq
 from typing import List, Tuple, Optional, Set, FrozenSet
 
+from level_context import LevelContext, get_level_context
+
 
 def save_greedy_solution(level_idx, path,elapsed_time):
     if path is None:
@@ -27,34 +29,18 @@ def heuristic_manhattan_distance(boxes: FrozenSet[Tuple[int, int]], goals: Set[T
 
     return total_distance
 
-def solve_with_greedy(level_data: List[List[str]], level_idx: int, max_states=50000):
-    grid = [list(row) for row in level_data]
-
-    def find_player(g: List[List[str]]) -> Optional[Tuple[int, int]]:
-        for y, row in enumerate(g):
-            for x, char in enumerate(row):
-                if char in ['@', '+']:
-                    return (x, y)
-        return None
-
-    def get_goals(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['.', '+', '*']}
-
-    def get_boxes(g: List[List[str]]) -> FrozenSet[Tuple[int, int]]:
-        boxes = [(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['$', '*']]
-        return frozenset(sorted(boxes))
-
-    def get_walls(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char == '#'}
+def solve_with_greedy(level_data: List[List[str]], level_idx: int, max_states=50000,
+                      context: Optional[LevelContext] = None):
+    ctx = get_level_context(level_data, context)
 
-    player_pos = find_player(grid)
+    player_pos = ctx.player
     if player_pos is None:
         print(f"Greedy: Không tìm thấy người chơi ở Level {level_idx}")
         return None
 
-    initial_boxes = get_boxes(grid)
-    goals = get_goals(grid)
-    walls = get_walls(grid)
+    initial_boxes = ctx.boxes
+    goals = ctx.goals
+    walls = ctx.walls
     initial_state = (player_pos, initial_boxes)
 
     pq = [(heuristic_manhattan_distance(initial_boxes, goals), [], initial_state)]
@@ -0,0 +1,165 @@
+from array import array
+from typing import Any, Callable, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from transposition_table import DepthFirstMemo
+
+DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
+Successors = Sequence[Tuple[int, Any]]
+
+
+def depth_first_search(root: Any,
+                       successors: Callable[[Any, int], Successors],
+                       is_goal: Callable[[Any], bool],
+                       max_depth: int,
+                       memo: Optional[DepthFirstMemo] = None,
+                       key: Optional[Callable[[Any], Hashable]] = None,
+                       prune: Optional[Callable[[Any, int], bool]] = None,
+                       order: Optional[Callable[[Successors], Successors]] = None,
+                       backjump: Optional[Callable[[List[Any]], Optional[int]]] = None) -> Optional[List[int]]:
+    """DFS lặp với stack tường minh, thay cho đệ quy Python.
+
+    successors(state, depth) trả về các cặp (action, con). Trạng thái được kiểm tra đích
+    trước, rồi mới xét giới hạn độ sâu (độ sâu >= max_depth thì cắt) và memo.
+    prune(con, độ_sâu_con) bỏ qua con ngay lúc sinh; order sắp xếp lại danh sách con.
+    key(state) là khoá đưa vào memo (mặc định chính là state). Đường đi được giữ trong
+    một mảng action, thêm/bớt O(1) mỗi bước.
+
+    backjump(states) được gọi khi một nút thất bại, states là các trạng thái trên đường đi
+    hiện tại. Nếu trả về độ sâu t, mọi nút sâu hơn t bị bỏ (đánh dấu EXHAUSTED trong memo)
+    và tìm kiếm tiếp tục với con kế tiếp của nút ở độ sâu t; t = -1 là dừng hẳn.
+    """
+    if key is None:
+        key = _identity
+
+    if is_goal(root):
+        return []
+    if max_depth <= 0:
+        if memo is not None:
+            memo.cutoff()
+        return None
+    token = memo.enter(key(root), 0) if memo is not None else True
+    if token is None:
+        return None
+
+    # Stack tường minh: mỗi mức giữ trạng thái, token của memo và iterator trên các con.
+    path = array('b')
+    states = [root]
+    tokens = [token]
+    children = successors(root, 0)
+    pending = [iter(order(children) if order is not None else children)]
+    depth = 0
+    enter = memo.enter if memo is not None else None
+
+    while pending:
+        nxt = next(pending[-1], None)
+        if nxt is None:
+            if backjump is not None:
+                target = backjump(states)
+                if target is not None and target < depth - 1:
+                    while depth > target:
+                        pending.pop()
+                        state = states.pop()
+                        token = tokens.pop()
+                        if memo is not None:
+                            memo.abandon(key(state), token)
+                        if depth:
+                            path.pop()
+                        depth -= 1
+                    continue
+            pending.pop()
+            state = states.pop()
+            token = tokens.pop()
+            if memo is not None:
+                memo.leave(key(state), depth, token)
+            if depth:
+                path.pop()
+            depth -= 1
+            continue
+
+        action, child = nxt
+        child_depth = depth + 1
+        if prune is not None and prune(child, child_depth):
+            continue
+        if is_goal(child):
+            path.append(action)
+            return path.tolist()
+        if child_depth >= max_depth:
+            if memo is not None:
+                memo.cutoff()
+            continue
+        if enter is not None:
+            token = enter(key(child), child_depth)
+            if token is None:
+                continue
+
+        path.append(action)
+        states.append(child)
+        tokens.append(token)
+        children = successors(child, child_depth)
+        pending.append(iter(order(children) if order is not None else children))
+        depth = child_depth
+
+    return None
+
+
+def _identity(state):
+    return state
+
+
+def sokoban_moves(player, boxes, walls):
+    """Các bước đi hợp lệ: (action, vị trí người chơi mới, tập thùng mới, ô thùng bị đẩy tới hoặc None)."""
+    moves = []
+    for action, (dx, dy) in enumerate(DIRECTIONS):
+        next_player = (player[0] + dx, player[1] + dy)
+        if next_player in walls:
+            continue
+        if next_player in boxes:
+            next_box = (next_player[0] + dx, next_player[1] + dy)
+            if next_box in walls or next_box in boxes:
+                continue
+            moves.append((action, next_player, boxes - {next_player} | {next_box}, next_box))
+        else:
+            moves.append((action, next_player, boxes, None))
+    return moves
+
+
+def sokoban_successors(walls):
+    """Hàm successors cho trạng thái (người chơi, tập thùng) không kèm thông tin gì thêm."""
+    def successors(state, depth):
+        player, boxes = state
+        children = []
+        for action, (dx, dy) in enumerate(DIRECTIONS):
+            next_player = (player[0] + dx, player[1] + dy)
+            if next_player in walls:
+                continue
+            if next_player in boxes:
+                next_box = (next_player[0] + dx, next_player[1] + dy)
+                if next_box in walls or next_box in boxes:
+                    continue
+                children.append((action, (next_player, boxes - {next_player} | {next_box})))
+            else:
+                children.append((action, (next_player, boxes)))
+        return children
+    return successors
+
+
+def conflict_backjump(conflict_set: Callable[[Any], Optional[Iterable[Tuple[int, int]]]]):
+    """Hook backjump cho trạng thái (người chơi, tập thùng, ...).
+
+    conflict_set(tập thùng) trả về các thùng gây bế tắc vĩnh viễn (không phụ thuộc người
+    chơi), hoặc None. Nút đích của cú nhảy là nút đã đẩy thùng gần nhất trong số đó vào chỗ:
+    mọi trạng thái sâu hơn đều còn nguyên các thùng này nên cũng bế tắc.
+    """
+    def backjump(states):
+        culprits = conflict_set(states[-1][1])
+        if culprits is None:
+            return None
+        target = -1
+        for box in culprits:
+            j = len(states) - 1
+            while j > 0 and box in states[j - 1][1]:
+                j -= 1
+            target = max(target, j - 1)
+        return target
+    return backjump
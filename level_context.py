@@ -0,0 +1,162 @@
+import hashlib
+from collections import OrderedDict, deque
+from typing import List, Tuple, Optional, Dict, FrozenSet
+
+DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+UNREACHABLE = -1
+
+
+class LevelContext:
+    """Dữ liệu tiền xử lý của một level, dựng một lần và dùng chung cho mọi solver.
+
+    Chỉ chứa tuple/dict/frozenset nên có thể pickle để gửi sang process khác.
+    """
+
+    def __init__(self, level_data: List[List[str]]):
+        self.height = len(level_data)
+        self.width = max((len(row) for row in level_data), default=0)
+
+        player = None
+        walls = set()
+        goals = set()
+        boxes = []
+        for y, row in enumerate(level_data):
+            for x, c in enumerate(row):
+                if c == '#':
+                    walls.add((x, y))
+                if c in ['.', '+', '*']:
+                    goals.add((x, y))
+                if c in ['$', '*']:
+                    boxes.append((x, y))
+                if c in ['@', '+'] and player is None:
+                    player = (x, y)
+
+        self.player: Optional[Tuple[int, int]] = player
+        self.walls: FrozenSet[Tuple[int, int]] = frozenset(walls)
+        self.goals: FrozenSet[Tuple[int, int]] = frozenset(goals)
+        self.boxes: FrozenSet[Tuple[int, int]] = frozenset(sorted(boxes))
+
+        # Đánh số các ô không phải tường nằm trong lưới.
+        cells = [(x, y) for y in range(self.height) for x in range(self.width)
+                 if (x, y) not in walls and x < len(level_data[y])]
+        self.cells: Tuple[Tuple[int, int], ...] = tuple(cells)
+        self.cell_index: Dict[Tuple[int, int], int] = {pos: i for i, pos in enumerate(cells)}
+        self.num_cells = len(cells)
+
+        # neighbours[i][action] = chỉ số ô kế bên theo hướng action, -1 nếu là tường/ngoài lưới.
+        self.neighbours: Tuple[Tuple[int, ...], ...] = tuple(
+            tuple(self.cell_index.get((x + dx, y + dy), UNREACHABLE) for dx, dy in DIRECTIONS)
+            for x, y in cells
+        )
+        self.goal_indices: FrozenSet[int] = frozenset(self.cell_index[g] for g in goals if g in self.cell_index)
+
+        self.goal_distances: Dict[Tuple[int, int], Tuple[int, ...]] = {
+            g: self._pull_distances(self.cell_index[g]) for g in goals if g in self.cell_index
+        }
+        self.box_distance: Tuple[int, ...] = tuple(
+            min((d[i] for d in self.goal_distances.values() if d[i] != UNREACHABLE), default=UNREACHABLE)
+            for i in range(self.num_cells)
+        )
+        self.dead_squares: FrozenSet[Tuple[int, int]] = frozenset(
+            cells[i] for i in range(self.num_cells) if self.box_distance[i] == UNREACHABLE
+        )
+        self.dead_indices: FrozenSet[int] = frozenset(self.cell_index[p] for p in self.dead_squares)
+
+        # Trạng thái đóng gói thành một số nguyên: bit thấp là ô người chơi, phần còn lại là bitmask thùng.
+        self.player_bits = max(1, (self.num_cells - 1).bit_length())
+        self.state_bytes = (self.player_bits + self.num_cells + 7) // 8
+        self.level_key = hashlib.sha1('\n'.join(''.join(row) for row in level_data).encode('utf-8')).digest()
+        self.player_mask = (1 << self.player_bits) - 1
+        self.goal_mask = 0
+        for g in self.goal_indices:
+            self.goal_mask |= 1 << (self.player_bits + g)
+        self.dead_mask = 0
+        for d in self.dead_indices:
+            self.dead_mask |= 1 << (self.player_bits + d)
+
+    def _pull_distances(self, goal_idx: int) -> Tuple[int, ...]:
+        # Số lần đẩy tối thiểu để đưa thùng từ mỗi ô tới goal (bỏ qua các thùng khác),
+        # tính bằng BFS "kéo" ngược từ goal.
+        dist = [UNREACHABLE] * self.num_cells
+        dist[goal_idx] = 0
+        queue = deque([goal_idx])
+        while queue:
+            box = queue.popleft()
+            for action in range(4):
+                prev_box = self.neighbours[box][action]
+                if prev_box == UNREACHABLE or dist[prev_box] != UNREACHABLE:
+                    continue
+                player_cell = self.neighbours[prev_box][action]
+                if player_cell == UNREACHABLE:
+                    continue
+                dist[prev_box] = dist[box] + 1
+                queue.append(prev_box)
+        return tuple(dist)
+
+    def initial_state(self) -> Tuple[Optional[Tuple[int, int]], FrozenSet[Tuple[int, int]]]:
+        return (self.player, self.boxes)
+
+    def is_solved(self, boxes) -> bool:
+        return self.goals.issubset(boxes)
+
+    def push_distance(self, box: Tuple[int, int]) -> int:
+        idx = self.cell_index.get(box)
+        if idx is None:
+            return UNREACHABLE
+        return self.box_distance[idx]
+
+    def pack_state(self, player: Tuple[int, int], boxes) -> int:
+        key = self.cell_index[player]
+        for b in boxes:
+            key |= 1 << (self.player_bits + self.cell_index[b])
+        return key
+
+    def apply_action(self, key: int, action: int) -> Optional[int]:
+        # Áp dụng một bước đi lên trạng thái đóng gói; None nếu bị tường/thùng chặn.
+        player = key & self.player_mask
+        nxt = self.neighbours[player][action]
+        if nxt == UNREACHABLE:
+            return None
+        boxes = key >> self.player_bits
+        if boxes >> nxt & 1:
+            dest = self.neighbours[nxt][action]
+            if dest == UNREACHABLE or boxes >> dest & 1:
+                return None
+            boxes ^= (1 << nxt) | (1 << dest)
+        return (boxes << self.player_bits) | nxt
+
+    def is_solved_key(self, key: int) -> bool:
+        return key & self.goal_mask == self.goal_mask
+
+    def has_dead_box(self, key: int) -> bool:
+        return key & self.dead_mask != 0
+
+    def unpack_state(self, key: int) -> Tuple[Tuple[int, int], FrozenSet[Tuple[int, int]]]:
+        player = self.cells[key & self.player_mask]
+        bits = key >> self.player_bits
+        boxes = []
+        while bits:
+            low = bits & -bits
+            boxes.append(self.cells[low.bit_length() - 1])
+            bits ^= low
+        return (player, frozenset(boxes))
+
+
+# Cache LRU các context gần nhất, bỏ level lâu không dùng nhất khi vượt quá _CONTEXT_CACHE_SIZE.
+_CONTEXT_CACHE_SIZE = 64
+_context_cache: "OrderedDict[Tuple[Tuple[str, ...], ...], LevelContext]" = OrderedDict()
+
+
+def get_level_context(level_data: List[List[str]], context: Optional[LevelContext] = None) -> LevelContext:
+    if context is not None:
+        return context
+    key = tuple(tuple(row) for row in level_data)
+    ctx = _context_cache.get(key)
+    if ctx is None:
+        ctx = LevelContext(level_data)
+        _context_cache[key] = ctx
+        if len(_context_cache) > _CONTEXT_CACHE_SIZE:
+            _context_cache.popitem(last=False)
+    else:
+        _context_cache.move_to_end(key)
+    return ctx
@@ -1,7 +1,10 @@
 import time
 import heapq
 from collections import deque
-from typing import List, Tuple, Optional, Set, FrozenSet
+from typing import List, Tuple, Optional, Set, FrozenSet, Dict, Union
+
+from level_context import LevelContext, get_level_context
+from start_uncertainty import StartUncertainty, packed_start_belief
 
 def save_partially_observable_solution(level_idx: int, path: Optional[List[int]], elapsed_time: float):
     if path is None:
@@ -17,86 +20,112 @@ def save_partially_observable_solution(level_idx: int, path: Optional[List[int]]
     except Exception:
         pass
 
-def get_goals(g: List[List[str]]) -> Set[Tuple[int, int]]:
-    return {(x, y) for y, row in enumerate(g) for x, c in enumerate(row) if c in ['.', '+', '*']}
-
-def get_walls(g: List[List[str]]) -> Set[Tuple[int, int]]:
-    return {(x, y) for y, row in enumerate(g) for x, c in enumerate(row) if c == '#'}
-
-def _precompute_deadlocks(walls: Set[Tuple[int, int]], goals: Set[Tuple[int, int]], level_data: List[List[str]]) -> Set[Tuple[int, int]]:
-    deadlocks = set()
-    height = len(level_data)
-    width = len(level_data[0]) if height > 0 else 0
-    for r in range(height):
-        for c in range(width):
-            pos = (c, r)
-            if pos in walls or pos in goals:
-                continue
-            if ((c - 1, r) in walls and (c, r - 1) in walls) or \
-               ((c + 1, r) in walls and (c, r - 1) in walls) or \
-               ((c - 1, r) in walls and (c, r + 1) in walls) or \
-               ((c + 1, r) in walls and (c, r + 1) in walls):
-                deadlocks.add(pos)
+# 8 ô xung quanh người chơi theo thứ tự quan sát 3x3 (bỏ ô giữa).
+OBSERVATION_OFFSETS = [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if (dx, dy) != (0, 0)]
+
+def observation_tables(ctx: LevelContext):
+    # wall_masks[ô] = bitmask tĩnh các ô tường xung quanh; box_probes[ô] = các (bit, ô kế bên)
+    # có thể chứa thùng. Quan sát của một trạng thái là wall_mask | (bit thùng << 8).
+    wall_masks = []
+    box_probes = []
+    for x, y in ctx.cells:
+        mask = 0
+        probes = []
+        for bit, (dx, dy) in enumerate(OBSERVATION_OFFSETS):
+            p = (x + dx, y + dy)
+            if p in ctx.walls:
+                mask |= 1 << bit
+            elif p in ctx.cell_index:
+                probes.append((1 << (bit + 8), ctx.cell_index[p]))
+        wall_masks.append(mask)
+        box_probes.append(tuple(probes))
+    return wall_masks, box_probes
+
+_heuristic_memo: Dict[bytes, Dict[int, int]] = {}
+_HEURISTIC_MEMO_CAPACITY = 1_000_000
+
+def _state_heuristic_memo(ctx: LevelContext) -> Dict[int, int]:
+    # Memo trạng thái đóng gói -> heuristic, dùng chung giữa các lần gọi trên cùng level.
+    memo = _heuristic_memo.get(ctx.level_key)
+    if memo is None:
+        if len(_heuristic_memo) >= 8:
+            _heuristic_memo.clear()
+        memo = _heuristic_memo[ctx.level_key] = {}
+    return memo
+
+_deadlock_cache: Dict[bytes, FrozenSet[Tuple[int, int]]] = {}
+
+def _precompute_deadlocks(ctx: LevelContext) -> FrozenSet[Tuple[int, int]]:
+    # Ô góc không phải goal; đây là tập deadlock của heuristic (khác ctx.dead_squares).
+    deadlocks = _deadlock_cache.get(ctx.level_key)
+    if deadlocks is None:
+        walls = ctx.walls
+        deadlocks = frozenset(
+            (c, r) for c, r in ctx.cells
+            if (c, r) not in ctx.goals and (
+                ((c - 1, r) in walls and (c, r - 1) in walls) or
+                ((c + 1, r) in walls and (c, r - 1) in walls) or
+                ((c - 1, r) in walls and (c, r + 1) in walls) or
+                ((c + 1, r) in walls and (c, r + 1) in walls))
+        )
+        if len(_deadlock_cache) >= 64:
+            _deadlock_cache.clear()
+        _deadlock_cache[ctx.level_key] = deadlocks
     return deadlocks
 
-def heuristic_for_belief_state(belief: FrozenSet[Tuple[Tuple[int, int], FrozenSet[Tuple[int, int]]]],
-                               goals: Set[Tuple[int, int]],
-                               deadlocks: Set[Tuple[int, int]]) -> int:
-    min_heuristic = float('inf')
-    
-    goal_list = list(goals)
-    if not goal_list:
-        return 0
-
-    for _, boxes_pos in belief:
-        current_h = 0
-        
-        for box in boxes_pos:
-            if box not in goals:
-                current_h += min(abs(box[0] - g[0]) + abs(box[1] - g[1]) for g in goal_list)
-
-        for box in boxes_pos:
-            if box not in goals and box in deadlocks:
-                current_h += 1000
-                break
-
-        if current_h < min_heuristic:
-            min_heuristic = current_h
-            
-    return min_heuristic if min_heuristic != float('inf') else 0
+def packed_state_heuristic(ctx: LevelContext, key: int, memo: Dict[int, int]) -> int:
+    # Heuristic của một trạng thái: tổng Manhattan của thùng chưa vào goal, cộng 1000 nếu
+    # có thùng kẹt ở ô góc (xem _precompute_deadlocks). h(belief) = min trên các trạng thái.
+    h = memo.get(key)
+    if h is not None:
+        return h
+    boxes = ctx.unpack_state(key)[1]
+    goals = ctx.goals
+    deadlocks = _precompute_deadlocks(ctx)
+    h = 0
+    for box in boxes:
+        if box not in goals:
+            h += min(abs(box[0] - g[0]) + abs(box[1] - g[1]) for g in goals)
+    for box in boxes:
+        if box not in goals and box in deadlocks:
+            h += 1000
+            break
+    if len(memo) >= _HEURISTIC_MEMO_CAPACITY:
+        memo.clear()
+    memo[key] = h
+    return h
 
 def solve_with_partially_observable_search_astar(level_data: List[List[str]], level_idx: int,
                                                  true_initial_state: Optional[Tuple[Tuple[int, int], FrozenSet[Tuple[int, int]]]] = None,
-                                                 possible_start_states: Optional[List[Tuple[Tuple[int, int], FrozenSet[Tuple[int, int]]]]] = None,
+                                                 possible_start_states: Union[StartUncertainty, List[Tuple[Tuple[int, int], FrozenSet[Tuple[int, int]]]], None] = None,
                                                  max_steps: int = 20000,
-                                                 max_time_s: float = 30.0) -> Optional[List[int]]:
+                                                 max_time_s: float = 30.0,
+                                                 context: Optional[LevelContext] = None) -> Optional[List[int]]:
     
     def make_default_states():
-        player = None
-        boxes = []
-        for y, row in enumerate(level_data):
-            for x, c in enumerate(row):
-                if c in ['@', '+']: player = (x, y)
-                if c in ['$', '*']: boxes.append((x, y))
-        if player is None: return None, None
-        state = (player, frozenset(boxes))
+        if ctx.player is None: return None, None
+        state = ctx.initial_state()
         return state, [state]
 
-    def observation(player_pos: Tuple[int, int], walls: Set[Tuple[int, int]], boxes: FrozenSet[Tuple[int, int]]):
-        obs = []
-        for dy in (-1, 0, 1):
-            for dx in (-1, 0, 1):
-                p = (player_pos[0] + dx, player_pos[1] + dy)
-                if p == player_pos: obs.append('@')
-                elif p in walls: obs.append('#')
-                elif p in boxes: obs.append('$')
-                else: obs.append(' ')
-        return tuple(obs)
-
-    goals = get_goals(level_data)
-    walls = get_walls(level_data)
-    deadlocks = _precompute_deadlocks(walls, goals, level_data)
-    directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    def observation(key: int) -> int:
+        player = key & player_mask
+        boxes = key >> player_bits
+        obs = wall_masks[player]
+        for bit, cell in box_probes[player]:
+            if boxes >> cell & 1:
+                obs |= bit
+        return obs
+
+    def belief_heuristic(belief: FrozenSet[int]) -> int:
+        if not goals:
+            return 0
+        return min(packed_state_heuristic(ctx, key, memo) for key in belief)
+
+    ctx = get_level_context(level_data, context)
+    goals = ctx.goals
+    player_mask, player_bits = ctx.player_mask, ctx.player_bits
+    wall_masks, box_probes = observation_tables(ctx)
+    memo = _state_heuristic_memo(ctx)
 
     if true_initial_state is None or possible_start_states is None:
         default_state, default_list = make_default_states()
@@ -106,9 +135,13 @@ def solve_with_partially_observable_search_astar(level_data: List[List[str]], le
         if possible_start_states is None:
             possible_start_states = default_list
 
-    start_belief = frozenset(possible_start_states)
-    
-    h_cost = heuristic_for_belief_state(start_belief, goals, deadlocks)
+    # Belief là frozenset các trạng thái đóng gói (xem LevelContext.pack_state).
+    start_belief = frozenset(packed_start_belief(ctx, possible_start_states))
+    if not start_belief:
+        print(f"Partially Observable A*: Tập trạng thái bắt đầu rỗng cho Level {level_idx}.")
+        return None
+
+    h_cost = belief_heuristic(start_belief)
     priority_queue = [(h_cost, 0, [], start_belief)] 
     
     visited = {start_belief: 0}
@@ -128,36 +161,20 @@ def solve_with_partially_observable_search_astar(level_data: List[List[str]], le
         if g_cost > visited[belief]:
             continue
 
-        if all(goals.issubset(b[1]) for b in belief):
+        if all(ctx.is_solved_key(k) for k in belief):
             elapsed = time.time() - start_time
             save_partially_observable_solution(level_idx, path, elapsed)
             return path
 
-        for action, (dx, dy) in enumerate(directions):
+        for action in range(4):
             successor_builder = set()
-            for player_pos, boxes_pos in belief:
-                next_player = (player_pos[0] + dx, player_pos[1] + dy)
-                
-                if next_player in walls:
-                    successor_builder.add((player_pos, boxes_pos))
-                    continue
-                
-                if next_player in boxes_pos:
-                    next_box = (next_player[0] + dx, next_player[1] + dy)
-                    if next_box in walls or next_box in boxes_pos:
-                        successor_builder.add((player_pos, boxes_pos))
-                    else:
-                        new_boxes = set(boxes_pos)
-                        new_boxes.remove(next_player)
-                        new_boxes.add(next_box)
-                        successor_builder.add((next_player, frozenset(new_boxes)))
-                else:
-                    successor_builder.add((next_player, boxes_pos))
-            
+            for key in belief:
+                moved = ctx.apply_action(key, action)
+                successor_builder.add(key if moved is None else moved)
+
             obs_groups = {}
             for st in successor_builder:
-                obs = observation(st[0], walls, st[1])
-                obs_groups.setdefault(obs, set()).add(st)
+                obs_groups.setdefault(observation(st), set()).add(st)
 
             for _, group in obs_groups.items():
                 new_belief = frozenset(group)
@@ -165,7 +182,7 @@ def solve_with_partially_observable_search_astar(level_data: List[List[str]], le
 
                 if new_belief not in visited or new_g_cost < visited[new_belief]:
                     visited[new_belief] = new_g_cost
-                    h_cost = heuristic_for_belief_state(new_belief, goals, deadlocks)
+                    h_cost = belief_heuristic(new_belief)
                     f_cost = new_g_cost + h_cost
                     new_path = path + [action]
                     heapq.heappush(priority_queue, (f_cost, new_g_cost, new_path, new_belief))
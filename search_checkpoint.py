@@ -0,0 +1,118 @@
+import os
+import struct
+import zlib
+from typing import List, Tuple, Optional, Dict
+
+from level_context import LevelContext
+
+MAGIC = b'SKCP'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sBB20sHIII')
+_ENTRY = struct.Struct('<II')
+
+
+class SearchCheckpoint:
+    """Ảnh chụp một lần tìm kiếm bị dừng vì hết ngân sách trạng thái.
+
+    open_list: các phần tử (priority, g_cost, packed_state, path)
+    visited: packed_state -> g_cost (BFS ghi 0)
+    incumbent: (điểm, đường đi) của trạng thái tốt nhất đã mở rộng, nếu có
+    """
+
+    def __init__(self, algorithm: str,
+                 open_list: List[Tuple[int, int, int, List[int]]],
+                 visited: Dict[int, int],
+                 incumbent: Optional[Tuple[int, List[int]]] = None):
+        self.algorithm = algorithm
+        self.open_list = open_list
+        self.visited = visited
+        self.incumbent = incumbent
+
+
+def _pack_path(path: List[int]) -> bytes:
+    out = bytearray((len(path) + 3) // 4)
+    for i, action in enumerate(path):
+        out[i >> 2] |= action << ((i & 3) * 2)
+    return struct.pack('<I', len(path)) + bytes(out)
+
+
+def _unpack_path(buf: memoryview, offset: int) -> Tuple[List[int], int]:
+    (length,) = struct.unpack_from('<I', buf, offset)
+    offset += 4
+    nbytes = (length + 3) // 4
+    data = buf[offset:offset + nbytes]
+    path = [(data[i >> 2] >> ((i & 3) * 2)) & 3 for i in range(length)]
+    return path, offset + nbytes
+
+
+def save_checkpoint(filename: str, ctx: LevelContext, checkpoint: SearchCheckpoint):
+    width = ctx.state_bytes
+    algorithm = checkpoint.algorithm.encode('utf-8')
+    body = bytearray()
+    body += algorithm
+    for priority, g_cost, key, path in checkpoint.open_list:
+        body += _ENTRY.pack(priority, g_cost)
+        body += key.to_bytes(width, 'little')
+        body += _pack_path(path)
+    for key, g_cost in checkpoint.visited.items():
+        body += key.to_bytes(width, 'little')
+        body += struct.pack('<I', g_cost)
+    if checkpoint.incumbent is not None:
+        score, path = checkpoint.incumbent
+        body += struct.pack('<I', score)
+        body += _pack_path(path)
+
+    header = _HEADER.pack(MAGIC, VERSION, width, ctx.level_key, len(algorithm),
+                          len(checkpoint.open_list), len(checkpoint.visited),
+                          int(checkpoint.incumbent is not None))
+    tmp_name = filename + '.tmp'
+    with open(tmp_name, 'wb') as f:
+        f.write(header)
+        f.write(zlib.compress(bytes(body), 6))
+    os.replace(tmp_name, filename)
+
+
+def load_checkpoint(filename: str, ctx: LevelContext, algorithm: str) -> SearchCheckpoint:
+    with open(filename, 'rb') as f:
+        raw = f.read()
+    if len(raw) < _HEADER.size:
+        raise ValueError(f"checkpoint {filename} bị cắt cụt")
+    magic, version, width, level_key, algo_len, open_count, visited_count, has_incumbent = _HEADER.unpack_from(raw)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{filename} không phải checkpoint hợp lệ")
+    if level_key != ctx.level_key or width != ctx.state_bytes:
+        raise ValueError(f"checkpoint {filename} thuộc về level khác")
+
+    try:
+        buf = memoryview(zlib.decompress(raw[_HEADER.size:]))
+    except zlib.error as e:
+        raise ValueError(f"checkpoint {filename} bị hỏng: {e}")
+    saved_algorithm = bytes(buf[:algo_len]).decode('utf-8')
+    if saved_algorithm != algorithm:
+        raise ValueError(f"checkpoint {filename} được tạo bởi {saved_algorithm}, không phải {algorithm}")
+    offset = algo_len
+
+    open_list = []
+    for _ in range(open_count):
+        priority, g_cost = _ENTRY.unpack_from(buf, offset)
+        offset += _ENTRY.size
+        key = int.from_bytes(buf[offset:offset + width], 'little')
+        offset += width
+        path, offset = _unpack_path(buf, offset)
+        open_list.append((priority, g_cost, key, path))
+
+    visited = {}
+    for _ in range(visited_count):
+        key = int.from_bytes(buf[offset:offset + width], 'little')
+        offset += width
+        (visited[key],) = struct.unpack_from('<I', buf, offset)
+        offset += 4
+
+    incumbent = None
+    if has_incumbent:
+        (score,) = struct.unpack_from('<I', buf, offset)
+        path, offset = _unpack_path(buf, offset + 4)
+        incumbent = (score, path)
+
+    return SearchCheckpoint(saved_algorithm, open_list, visited, incumbent)
@@ -1,9 +1,14 @@
+import os
 import time
 import math
 import random
-from typing import List, Tuple, Optional, Set, FrozenSet, Iterable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Tuple, Optional, Set, FrozenSet, Iterable, Union
 from collections import deque
 
+from level_context import LevelContext, get_level_context
+from start_uncertainty import StartUncertainty, first_start_state
+
 def save_sa_solution(level_idx, path, elapsed_time):
     if path is None:
         return
@@ -19,26 +24,17 @@ def save_sa_solution(level_idx, path, elapsed_time):
     print(f"SA: Đã lưu lời giải cho Level {level_idx} vào solutions.txt")
 
 
-def _find_player(level_data: List[List[str]]) -> Optional[Tuple[int, int]]:
-    for y, row in enumerate(level_data):
-        for x, c in enumerate(row):
-            if c in ['@', '+']:
-                return (x, y)
-    return None
-
-def _get_goals(level_data: List[List[str]]) -> Set[Tuple[int, int]]:
-    return {(x, y) for y, row in enumerate(level_data) for x, c in enumerate(row) if c in ['.', '+', '*']}
-
-def _get_boxes(level_data: List[List[str]]) -> FrozenSet[Tuple[int, int]]:
-    return frozenset((x, y) for y, row in enumerate(level_data) for x, c in enumerate(row) if c in ['$', '*'])
-
-def _get_walls(level_data: List[List[str]]) -> Set[Tuple[int, int]]:
-    return {(x, y) for y, row in enumerate(level_data) for x, c in enumerate(row) if c == '#'}
+_deadlock_cache: Dict[bytes, FrozenSet[Tuple[int, int]]] = {}
 
-def _precompute_deadlocks(walls: Set[Tuple[int, int]], goals: Set[Tuple[int, int]], level_data: List[List[str]]) -> Set[Tuple[int, int]]:
+def _precompute_deadlocks(ctx: LevelContext) -> FrozenSet[Tuple[int, int]]:
+    # Ô góc và ô sát một đoạn tường thẳng không có goal; giữ đúng định nghĩa deadlock của hàm
+    # năng lượng (khác ctx.dead_squares). Tính một lần cho mỗi level.
+    cached = _deadlock_cache.get(ctx.level_key)
+    if cached is not None:
+        return cached
+    walls, goals = ctx.walls, ctx.goals
+    height, width = ctx.height, ctx.width
     deadlocks = set()
-    height = len(level_data)
-    width = len(level_data[0]) if height > 0 else 0
 
     for r in range(height):
         for c in range(width):
@@ -84,7 +80,10 @@ def _precompute_deadlocks(walls: Set[Tuple[int, int]], goals: Set[Tuple[int, int
                     if is_stuck:
                         deadlocks.add(pos)
 
-    return deadlocks
+    if len(_deadlock_cache) >= 64:
+        _deadlock_cache.clear()
+    result = _deadlock_cache[ctx.level_key] = frozenset(deadlocks)
+    return result
 
 def energy_function(boxes: FrozenSet[Tuple[int, int]], goals: Set[Tuple[int, int]], deadlocks: Set[Tuple[int, int]]) -> int:
     if not goals:
@@ -104,63 +103,199 @@ def energy_function(boxes: FrozenSet[Tuple[int, int]], goals: Set[Tuple[int, int
     return total_manhattan_distance
 
 
-def solve_with_simulated_annealing(level_data: List[List[str]], level_idx: int,
-                                   possible_start_states: Optional[Iterable[Tuple[Tuple[int, int], FrozenSet[Tuple[int, int]]]]] = None,
-                                   true_initial_state: Optional[Tuple[Tuple[int, int], FrozenSet[Tuple[int, int]]]] = None,
-                                   initial_temp: Optional[float] = None,
-                                   cooling_rate: float = 0.995,
-                                   max_iterations: int = 50000,
-                                   max_time: float = 10.0,
-                                   restarts: int = 3) -> Optional[List[int]]:
+ACTION_MAP = {(-1, 0): 0, (1, 0): 1, (0, -1): 2, (0, 1): 3}
+DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
+
+def _player_reach(start, walls, boxes_set: FrozenSet[Tuple[int, int]]):
+    # Một lần BFS cho mỗi trạng thái: parent của mọi ô người chơi đi tới được.
+    parents = {start: None}
+    q = deque([start])
+    while q:
+        pos = q.popleft()
+        for dx, dy in DIRECTIONS:
+            nxt = (pos[0] + dx, pos[1] + dy)
+            if nxt in parents or nxt in walls or nxt in boxes_set:
+                continue
+            parents[nxt] = pos
+            q.append(nxt)
+    return parents
+
+
+def _walk_path(parents, goal):
+    path = [goal]
+    while parents[path[-1]] is not None:
+        path.append(parents[path[-1]])
+    path.reverse()
+    return path
+
+
+def _coords_to_actions(path_coords: List[Tuple[int, int]]):
+    out: List[int] = []
+    for i in range(len(path_coords) - 1):
+        dx = path_coords[i + 1][0] - path_coords[i][0]
+        dy = path_coords[i + 1][1] - path_coords[i][1]
+        out.append(ACTION_MAP[(dx, dy)])
+    return out
+
+
+class TabuList:
+    """Danh sách tabu theo hash của cấu hình thùng, giữ tối đa size cấu hình gần nhất.
+
+    Chỉ lưu hash nên hai cấu hình trùng hash cũng bị xem là tabu; chấp nhận được vì chỉ làm hẹp lân cận.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.order = deque()
+        self.members = set()
+
+    def add(self, boxes: FrozenSet[Tuple[int, int]]):
+        if self.size <= 0:
+            return
+        h = hash(boxes)
+        if h in self.members:
+            return
+        self.order.append(h)
+        self.members.add(h)
+        if len(self.order) > self.size:
+            self.members.discard(self.order.popleft())
+
+    def clear(self):
+        self.order.clear()
+        self.members.clear()
+
+    def __contains__(self, boxes: FrozenSet[Tuple[int, int]]) -> bool:
+        return hash(boxes) in self.members
+
+
+class AnnealChain:
+    """Một chuỗi ủ nhiệt: trạng thái hiện tại, nhiệt độ và trạng thái tốt nhất của chuỗi.
+
+    Chỉ chứa dữ liệu thuần (và random.Random) nên có thể gửi qua lại giữa các process.
+    """
+
+    def __init__(self, state, actions: List[int], energy: int, temp: float, rng=None,
+                 sample_size: Optional[int] = None, tabu_size: int = 0):
+        self.state = state
+        self.actions = list(actions)
+        self.energy = energy
+        self.temp = temp
+        self.best_state = state
+        self.best_actions = list(actions)
+        self.best_energy = energy
+        self.rng = rng if rng is not None else random
+        self.stuck = False
+        self.iterations = 0
+        # sample_size: chỉ tính năng lượng cho k nước đẩy ngẫu nhiên thay vì toàn bộ lân cận.
+        self.sample_size = sample_size
+        self.tabu = TabuList(tabu_size)
+        self.tabu.add(state[1])
+
+    def reset_to(self, state, actions: List[int], energy: int):
+        self.state = state
+        self.actions = list(actions)
+        self.energy = energy
+        self.stuck = False
+        self.tabu.clear()
+        self.tabu.add(state[1])
+        if energy < self.best_energy:
+            self.best_state, self.best_actions, self.best_energy = state, list(actions), energy
+
+    def run(self, ctx: LevelContext, cooling_rate: float, steps: int, deadline: float):
+        walls, goals, deadlocks = ctx.walls, ctx.goals, _precompute_deadlocks(ctx)
+        for _ in range(steps):
+            if self.energy == 0 or time.time() > deadline:
+                return
+
+            player_pos, boxes_pos = self.state
+            reach = _player_reach(player_pos, walls, boxes_pos)
+            pushes = []
+            for b in boxes_pos:
+                for dx, dy in DIRECTIONS:
+                    push_from = (b[0] - dx, b[1] - dy)
+                    dest = (b[0] + dx, b[1] + dy)
+                    if dest in walls or dest in boxes_pos or push_from not in reach:
+                        continue
+                    pushes.append((b, dest, push_from, (dx, dy)))
+
+            sampled = self.sample_size is not None and len(pushes) > self.sample_size
+            if sampled:
+                self.rng.shuffle(pushes)
+
+            candidates = []
+            for b, dest, push_from, push_dir in pushes:
+                # Chế độ lấy mẫu: dừng khi đã có đủ k ứng viên không thuộc tabu.
+                if sampled and len(candidates) >= self.sample_size:
+                    break
+                new_boxes = frozenset(boxes_pos - {b} | {dest})
+                if new_boxes in self.tabu:
+                    continue
+                next_state = (b, new_boxes)
+                ne = energy_function(new_boxes, goals, deadlocks)
+                candidates.append((push_from, push_dir, next_state, ne))
+
+            if not candidates:
+                self.stuck = True
+                return
+
+            # Chọn ngẫu nhiên trong 10 ứng viên năng lượng thấp nhất (cả khi lấy mẫu), không tham lam.
+            candidates.sort(key=lambda t: t[3])
+            topk = candidates[:min(10, len(candidates))]
+            push_from, push_dir, next_state, next_energy = self.rng.choice(topk)
+
+            delta = next_energy - self.energy
+            if delta < 0 or (self.temp > 1e-9 and self.rng.random() < math.exp(-delta / self.temp)):
+                self.state = next_state
+                self.energy = next_energy
+                self.actions.extend(_coords_to_actions(_walk_path(reach, push_from)))
+                self.actions.append(ACTION_MAP[push_dir])
+                self.tabu.add(next_state[1])
+
+                if self.energy < self.best_energy:
+                    self.best_energy = self.energy
+                    self.best_state = self.state
+                    self.best_actions = self.actions.copy()
+
+            self.temp *= cooling_rate
+            self.iterations += 1
 
-    walls = _get_walls(level_data)
-    goals = _get_goals(level_data)
-    deadlocks = _precompute_deadlocks(walls, goals, level_data)
 
+def _resolve_start_state(ctx: LevelContext, level_idx: int, possible_start_states, true_initial_state):
     if possible_start_states is None:
-        player = _find_player(level_data)
-        if player is None:
+        if ctx.player is None:
             print(f"SA: không tìm thấy người chơi cho Level {level_idx}")
             return None
-        boxes = _get_boxes(level_data)
-        possible_start_states = [(player, boxes)]
+        possible_start_states = [ctx.initial_state()]
 
-    possible_start_states = list(possible_start_states)
-    if not possible_start_states:
+    # Chỉ cần trạng thái đầu tiên, không sinh hết các tổ hợp của StartUncertainty.
+    start_state = first_start_state(ctx, possible_start_states)
+    if start_state is None:
         print(f"SA: không có trạng thái bắt đầu cho Level {level_idx}")
         return None
 
-    start_state = true_initial_state if true_initial_state is not None else possible_start_states[0]
-
-    action_map = {(-1, 0): 0, (1, 0): 1, (0, -1): 2, (0, 1): 3}
-    directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-
-    def player_bfs(start, goal, boxes_set: FrozenSet[Tuple[int, int]]):
-        if start == goal:
-            return [start]
-        q = deque([(start, [start])])
-        seen = {start}
-        while q:
-            pos, path = q.popleft()
-            for dx, dy in directions:
-                nxt = (pos[0] + dx, pos[1] + dy)
-                if nxt in seen or nxt in walls or nxt in boxes_set:
-                    continue
-                if nxt == goal:
-                    return path + [nxt]
-                seen.add(nxt)
-                q.append((nxt, path + [nxt]))
-        return None
+    return true_initial_state if true_initial_state is not None else start_state
 
-    def coords_to_actions(path_coords: List[Tuple[int, int]]):
-        out: List[int] = []
-        for i in range(len(path_coords) - 1):
-            dx = path_coords[i + 1][0] - path_coords[i][0]
-            dy = path_coords[i + 1][1] - path_coords[i][1]
-            out.append(action_map[(dx, dy)])
-        return out
 
-    calculate_energy = lambda boxes_pos: energy_function(boxes_pos, goals, deadlocks)
+def solve_with_simulated_annealing(level_data: List[List[str]], level_idx: int,
+                                   possible_start_states: Union[StartUncertainty, Iterable[Tuple[Tuple[int, int], FrozenSet[Tuple[int, int]]]], None] = None,
+                                   true_initial_state: Optional[Tuple[Tuple[int, int], FrozenSet[Tuple[int, int]]]] = None,
+                                   initial_temp: Optional[float] = None,
+                                   cooling_rate: float = 0.995,
+                                   max_iterations: int = 50000,
+                                   max_time: float = 10.0,
+                                   restarts: int = 3,
+                                   sample_size: Optional[int] = None,
+                                   tabu_size: int = 0,
+                                   context: Optional[LevelContext] = None) -> Optional[List[int]]:
+
+    ctx = get_level_context(level_data, context)
+    start_state = _resolve_start_state(ctx, level_idx, possible_start_states, true_initial_state)
+    if start_state is None:
+        return None
+
+    deadlocks = _precompute_deadlocks(ctx)
+    calculate_energy = lambda boxes_pos: energy_function(boxes_pos, ctx.goals, deadlocks)
 
     if initial_temp is None:
         initial_temp = max(1.0, calculate_energy(start_state[1]) * 2.0)
@@ -170,75 +305,125 @@ def solve_with_simulated_annealing(level_data: List[List[str]], level_idx: int,
     best_actions: List[int] = []
 
     global_start = time.time()
+    deadline = global_start + max_time
 
     for attempt in range(max(1, restarts)):
-        temp = initial_temp
-        current_state = best_state
-        current_energy = best_energy
-        current_actions = best_actions.copy() if current_energy == best_energy else []
+        chain = AnnealChain(best_state, best_actions, best_energy, initial_temp,
+                            sample_size=sample_size, tabu_size=tabu_size)
+        chain.run(ctx, cooling_rate, max_iterations, deadline)
+
+        if chain.best_energy < best_energy:
+            best_energy = chain.best_energy
+            best_state = chain.best_state
+            best_actions = chain.best_actions
+
+        if best_energy == 0:
+            break
+        if time.time() > deadline:
+            print(f"SA: Đã hết thời gian cho Level {level_idx}")
+            return None
 
-        for it in range(max_iterations):
-            if time.time() - global_start > max_time:
-                if best_energy == 0:
-                    elapsed = time.time() - global_start
-                    save_sa_solution(level_idx, best_actions, elapsed)
-                    return best_actions
-                print(f"SA: Đã hết thời gian cho Level {level_idx}")
-                return None
+    if best_energy == 0:
+        elapsed = time.time() - global_start
+        save_sa_solution(level_idx, best_actions, elapsed)
+        return best_actions
 
-            if current_energy == 0:
-                elapsed = time.time() - global_start
-                save_sa_solution(level_idx, current_actions, elapsed)
-                return current_actions
+    print(f"SA: Không tìm thấy lời giải cho Level {level_idx}. Năng lượng tốt nhất={best_energy}")
+    return None
 
-            player_pos, boxes_pos = current_state
-            candidates = []
 
-            for b in boxes_pos:
-                for dx, dy in directions:
-                    push_from = (b[0] - dx, b[1] - dy)
-                    dest = (b[0] + dx, b[1] + dy)
-                    if dest in walls or dest in boxes_pos:
-                        continue
+_worker_ctx: Optional[LevelContext] = None
 
-                    path_to_push = player_bfs(player_pos, push_from, boxes_pos)
-                    if path_to_push is None:
-                        continue
 
-                    new_boxes = set(boxes_pos)
-                    new_boxes.remove(b)
-                    new_boxes.add(dest)
+def _init_worker(ctx: LevelContext):
+    global _worker_ctx
+    _worker_ctx = ctx
 
-                    next_state = (b, frozenset(new_boxes))
-                    actions_seq = coords_to_actions(path_to_push) + [action_map[(dx, dy)]]
-                    ne = calculate_energy(next_state[1])
-                    candidates.append((actions_seq, next_state, ne))
 
-            if not candidates:
-                break
+def _run_chain(chain: AnnealChain, cooling_rate: float, steps: int, deadline: float) -> AnnealChain:
+    chain.run(_worker_ctx, cooling_rate, steps, deadline)
+    return chain
 
-            candidates.sort(key=lambda t: t[2])
-            topk = candidates[:min(10, len(candidates))]
-            actions_seq, next_state, next_energy = random.choice(topk)
 
-            delta = next_energy - current_energy
-            if delta < 0 or (temp > 1e-9 and random.random() < math.exp(-delta / temp)):
-                current_state = next_state
-                current_energy = next_energy
-                current_actions.extend(actions_seq)
+def _replica_exchange(chains: List[AnnealChain], rng: random.Random):
+    # Parallel tempering: hoán đổi nhiệt độ giữa hai chuỗi kề nhau theo tiêu chuẩn Metropolis.
+    order = sorted(range(len(chains)), key=lambda i: chains[i].temp)
+    for a, b in zip(order, order[1:]):
+        ca, cb = chains[a], chains[b]
+        if ca.temp <= 1e-9 or cb.temp <= 1e-9:
+            continue
+        exponent = (ca.energy - cb.energy) * (1.0 / ca.temp - 1.0 / cb.temp)
+        if exponent >= 0 or rng.random() < math.exp(exponent):
+            ca.temp, cb.temp = cb.temp, ca.temp
+
+
+def solve_with_parallel_simulated_annealing(level_data: List[List[str]], level_idx: int,
+                                            possible_start_states: Union[StartUncertainty, Iterable[Tuple[Tuple[int, int], FrozenSet[Tuple[int, int]]]], None] = None,
+                                            true_initial_state: Optional[Tuple[Tuple[int, int], FrozenSet[Tuple[int, int]]]] = None,
+                                            num_chains: Optional[int] = None,
+                                            initial_temp: Optional[float] = None,
+                                            cooling_rate: float = 0.995,
+                                            max_time: float = 10.0,
+                                            exchange_interval: int = 200,
+                                            replica_exchange: bool = True,
+                                            seed: Optional[int] = None,
+                                            sample_size: Optional[int] = None,
+                                            tabu_size: int = 0,
+                                            context: Optional[LevelContext] = None) -> Optional[List[int]]:
+    """N chuỗi SA độc lập chạy song song trên process pool.
+
+    Sau mỗi exchange_interval vòng lặp, các chuỗi gửi kết quả về: chuỗi tệ nhất (hoặc bị kẹt)
+    được đặt lại từ trạng thái tốt nhất chung, và nếu replica_exchange bật thì các chuỗi
+    kề nhau trên thang nhiệt độ được hoán đổi nhiệt độ. Dừng ngay khi có chuỗi đạt năng lượng 0.
+    """
+    ctx = get_level_context(level_data, context)
+    start_state = _resolve_start_state(ctx, level_idx, possible_start_states, true_initial_state)
+    if start_state is None:
+        return None
 
-                if current_energy < best_energy:
-                    best_energy = current_energy
-                    best_state = current_state
-                    best_actions = current_actions.copy()
+    num_chains = num_chains or os.cpu_count() or 1
+    start_energy = energy_function(start_state[1], ctx.goals, _precompute_deadlocks(ctx))
+    if initial_temp is None:
+        initial_temp = max(1.0, start_energy * 2.0)
 
-            temp *= cooling_rate
+    master_rng = random.Random(seed)
+    chains = []
+    for i in range(num_chains):
+        # Thang nhiệt độ hình học khi dùng replica exchange, cùng nhiệt độ nếu không.
+        temp = initial_temp * (0.5 ** i) if replica_exchange else initial_temp
+        chains.append(AnnealChain(start_state, [], start_energy, temp, random.Random(master_rng.getrandbits(64)),
+                                  sample_size=sample_size, tabu_size=tabu_size))
 
-    if best_energy == 0:
-        elapsed = time.time() - global_start
-        save_sa_solution(level_idx, best_actions, elapsed)
-        return best_actions
+    print(f"SA song song: Bắt đầu giải Level {level_idx} với {num_chains} chuỗi...")
+    global_start = time.time()
+    deadline = global_start + max_time
+    best = min(chains, key=lambda c: c.best_energy)
+    best_energy, best_state, best_actions = best.best_energy, best.best_state, best.best_actions
 
-    print(f"SA: Không tìm thấy lời giải cho Level {level_idx}. Năng lượng tốt nhất={best_energy}")
-    return None
+    pool = ProcessPoolExecutor(max_workers=num_chains, initializer=_init_worker, initargs=(ctx,))
+    try:
+        while time.time() < deadline:
+            futures = {pool.submit(_run_chain, chain, cooling_rate, exchange_interval, deadline): i
+                       for i, chain in enumerate(chains)}
+            for fut in as_completed(futures):
+                chain = fut.result()
+                chains[futures[fut]] = chain
+                if chain.best_energy < best_energy:
+                    best_energy, best_state, best_actions = chain.best_energy, chain.best_state, chain.best_actions
+                if best_energy == 0:
+                    elapsed = time.time() - global_start
+                    print(f"SA song song: Tìm thấy lời giải sau {elapsed:.2f} giây.")
+                    save_sa_solution(level_idx, best_actions, elapsed)
+                    return best_actions
 
+            worst = max(range(len(chains)), key=lambda i: chains[i].energy)
+            for i, chain in enumerate(chains):
+                if chain.stuck or i == worst:
+                    chain.reset_to(best_state, best_actions, best_energy)
+            if replica_exchange:
+                _replica_exchange(chains, master_rng)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    print(f"SA song song: Không tìm thấy lời giải cho Level {level_idx}. Năng lượng tốt nhất={best_energy}")
+    return None
@@ -6,6 +6,7 @@ import heapq
 from collections import deque
 import numpy as np
 import asyncio
+import functools
 import bfs_sokoban
 import ast
 import greedy_sokoban
@@ -22,6 +23,7 @@ import forward_checking_sokoban
 import arc_consistency_sokoban
 import and_or_search_sokoban
 import partially_observable_sokoban
+from level_context import LevelContext, get_level_context
 
 os.environ['SDL_VIDEO_CENTERED'] = '1'
 
@@ -523,44 +525,46 @@ class Game:
 
         self.draw()
 
-    async def run_algorithm(self,name):
+    async def run_algorithm(self,name, context=None):
         await self.flash_message(f'{name} start', duration=0.5, font_size=74)
         loop = asyncio.get_running_loop()
         level_copy = [row[:] for row in self.current_level]
+        if context is None:
+            context = get_level_context(level_copy)
         path = None
         try:
             print(f"{name}: Starting solver for level {self.level} (executor)")
             match name:
                 case 'BFS':
-                    path = await loop.run_in_executor(None, bfs_sokoban.solve_with_bfs, level_copy, self.level)
+                    path = await loop.run_in_executor(None, functools.partial(bfs_sokoban.solve_with_bfs, level_copy, self.level, context=context))
                 case 'DLS':
-                    path = await loop.run_in_executor(None, DLS_sokoban.solve_with_dls, level_copy, self.level)
+                    path = await loop.run_in_executor(None, functools.partial(DLS_sokoban.solve_with_dls, level_copy, self.level, context=context))
                 case 'IDS':
-                    path = await loop.run_in_executor(None, IDS_sokoban.solve_with_ids, level_copy, self.level)
+                    path = await loop.run_in_executor(None, functools.partial(IDS_sokoban.solve_with_ids, level_copy, self.level, context=context))
                 case 'UCS':
-                    path = await loop.run_in_executor(None, UCS_sokoban.solve_with_ucs, level_copy, self.level)
+                    path = await loop.run_in_executor(None, functools.partial(UCS_sokoban.solve_with_ucs, level_copy, self.level, context=context))
                 case 'Greedy':
-                    path = await loop.run_in_executor(None, greedy_sokoban.solve_with_greedy, level_copy, self.level)
+                    path = await loop.run_in_executor(None, functools.partial(greedy_sokoban.solve_with_greedy, level_copy, self.level, context=context))
                 case 'A*':
-                    path = await loop.run_in_executor(None, A_sokoban.solve_with_a_star, level_copy, self.level)
+                    path = await loop.run_in_executor(None, functools.partial(A_sokoban.solve_with_a_star, level_copy, self.level, context=context))
                 case 'SA':
-                    path = await loop.run_in_executor(None, simulated_annealing_sokoban.solve_with_simulated_annealing, level_copy, self.level)
+                    path = await loop.run_in_executor(None, functools.partial(simulated_annealing_sokoban.solve_with_simulated_annealing, level_copy, self.level, context=context))
                 case 'Beam':
-                    path = await loop.run_in_executor(None, beam_search_sokoban.solve_with_beam_search, level_copy, self.level)
+                    path = await loop.run_in_executor(None, functools.partial(beam_search_sokoban.solve_with_beam_search, level_copy, self.level, context=context))
                 case 'Genetic':
-                    path = await loop.run_in_executor(None, genetic_algorithms_sokoban.solve_with_genetic_algorithm, level_copy, self.level)
+                    path = await loop.run_in_executor(None, functools.partial(genetic_algorithms_sokoban.solve_with_genetic_algorithm, level_copy, self.level, context=context))
                 case 'And-Or':
-                    path = await loop.run_in_executor(None, and_or_search_sokoban.solve_with_and_or_search, level_copy, self.level)
+                    path = await loop.run_in_executor(None, functools.partial(and_or_search_sokoban.solve_with_and_or_search, level_copy, self.level, context=context))
                 case 'Unobservable':
-                    path = await loop.run_in_executor(None, unobservable_sokoban.solve_with_unobservable_search, level_copy, self.level)
+                    path = await loop.run_in_executor(None, functools.partial(unobservable_sokoban.solve_with_unobservable_search, level_copy, self.level, context=context))
                 case 'Partially Observable':
-                    path = await loop.run_in_executor(None, partially_observable_sokoban.solve_with_partially_observable_search_astar, level_copy, self.level)
+                    path = await loop.run_in_executor(None, functools.partial(partially_observable_sokoban.solve_with_partially_observable_search_astar, level_copy, self.level, context=context))
                 case 'Backtracking':
-                    path = await loop.run_in_executor(None, backtracking_sokoban.solve_with_backtracking, level_copy, self.level)
+                    path = await loop.run_in_executor(None, functools.partial(backtracking_sokoban.solve_with_backtracking, level_copy, self.level, context=context))
                 case 'Forward Checking':
-                    path = await loop.run_in_executor(None, forward_checking_sokoban.solve_with_forward_checking, level_copy, self.level)
+                    path = await loop.run_in_executor(None, functools.partial(forward_checking_sokoban.solve_with_forward_checking, level_copy, self.level, context=context))
                 case 'Arc Consistency':
-                    path = await loop.run_in_executor(None, arc_consistency_sokoban.solve_with_arc_consistency, level_copy, self.level)
+                    path = await loop.run_in_executor(None, functools.partial(arc_consistency_sokoban.solve_with_arc_consistency, level_copy, self.level, context=context))
             print(f"{name}: Solver returned: {path}")
         except Exception as e:
             print(f"Error running {name} in executor: {e}")
@@ -608,77 +612,78 @@ class Game:
     async def run_all_algorithms(self):
         name = ""
         self.reset_level()
+        context = LevelContext([row[:] for row in self.current_level])
         name = "BFS"
-        await self.run_algorithm(name)
+        await self.run_algorithm(name, context)
         await asyncio.sleep(1)
 
         self.reset_level()
         name = "DLS"
-        await self.run_algorithm(name)
+        await self.run_algorithm(name, context)
         await asyncio.sleep(1)
 
         self.reset_level()
         name = "IDS"
-        await self.run_algorithm(name)
+        await self.run_algorithm(name, context)
         await asyncio.sleep(1)
 
         self.reset_level()
         name = "UCS"
-        await self.run_algorithm(name)
+        await self.run_algorithm(name, context)
 
         self.reset_level()
         name = "Greedy"
-        await self.run_algorithm(name)
+        await self.run_algorithm(name, context)
         await asyncio.sleep(1)
 
         self.reset_level()
         name = "A*"
-        await self.run_algorithm(name)
+        await self.run_algorithm(name, context)
         await asyncio.sleep(1)
 
         self.reset_level()
         name = "SA"
-        await self.run_algorithm(name)
+        await self.run_algorithm(name, context)
         await asyncio.sleep(1)
 
         self.reset_level()
         name = "Beam"
-        await self.run_algorithm(name)
+        await self.run_algorithm(name, context)
         await asyncio.sleep(1)
 
         self.reset_level()
         name = "Genetic"
-        await self.run_algorithm(name)
+        await self.run_algorithm(name, context)
         await asyncio.sleep(1)
 
         self.reset_level()
         name = "And-Or"
-        await self.run_algorithm(name)
+        await self.run_algorithm(name, context)
         await asyncio.sleep(1)
 
         self.reset_level()
         name = "Unobservable"
-        await self.run_algorithm(name)
+        await self.run_algorithm(name, context)
         await asyncio.sleep(1)
 
         self.reset_level()
         name = "Partially Observable"
-        await self.run_algorithm(name)
+        await self.run_algorithm(name, context)
         await asyncio.sleep(1)
 
         self.reset_level()
         name = "Backtracking"
-        await self.run_algorithm(name)
+        await self.run_algorithm(name, context)
         await asyncio.sleep(1)
 
         self.reset_level()
         name = "Forward Checking"
-        await self.run_algorithm(name)
+        await self.run_algorithm(name, context)
         await asyncio.sleep(1)
 
         self.reset_level()
         name = "Arc Consistency"
-        await self.run_algorithm(name)
+        await self.run_algorithm(name, context)
         await asyncio.sleep(1)
 
     async def run(self):
@@ -0,0 +1,123 @@
+from collections import deque
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, FrozenSet
+
+from level_context import LevelContext, DIRECTIONS
+
+Pos = Tuple[int, int]
+State = Tuple[Pos, FrozenSet[Pos]]
+
+
+def player_region(ctx: LevelContext, start: Optional[Pos] = None,
+                  boxes: Optional[Iterable[Pos]] = None) -> FrozenSet[Pos]:
+    """Các ô người chơi đi tới được từ start (mặc định vị trí ban đầu), thùng là vật cản."""
+    start = ctx.player if start is None else start
+    blocked = set(ctx.boxes if boxes is None else boxes)
+    if start is None or start not in ctx.cell_index:
+        return frozenset()
+    region = {start}
+    queue = deque([start])
+    while queue:
+        x, y = queue.popleft()
+        for dx, dy in DIRECTIONS:
+            nxt = (x + dx, y + dy)
+            if nxt in region or nxt not in ctx.cell_index or nxt in blocked:
+                continue
+            region.add(nxt)
+            queue.append(nxt)
+    return frozenset(region)
+
+
+class StartUncertainty:
+    """Mô tả gọn tập trạng thái bắt đầu có thể có, thay cho danh sách đầy đủ.
+
+    player_cells: người chơi có thể ở bất kỳ ô nào trong tập này (None: vị trí ban đầu).
+    box_cells: box_cells[i] là tập ô có thể của thùng i (None: các thùng ở vị trí ban đầu).
+    Các tổ hợp được sinh dần thành trạng thái đóng gói; thùng không phân biệt nên các
+    thùng có cùng tập ô được ép theo thứ tự ô tăng dần, chỉ khi các tập chồng lấn nhưng
+    khác nhau mới cần tập đã thấy để loại trùng.
+    """
+
+    def __init__(self, player_cells: Optional[Iterable[Pos]] = None,
+                 box_cells: Optional[Sequence[Iterable[Pos]]] = None):
+        self.player_cells = None if player_cells is None else frozenset(player_cells)
+        self.box_cells = None if box_cells is None else [frozenset(cells) for cells in box_cells]
+
+    @staticmethod
+    def _cell_indices(ctx: LevelContext, cells: Iterable[Pos], what: str) -> List[int]:
+        invalid = sorted(c for c in cells if c not in ctx.cell_index)
+        if invalid:
+            raise ValueError(f"{what}: các ô {invalid} không phải ô trống của level")
+        return sorted(ctx.cell_index[c] for c in cells)
+
+    def _box_candidates(self, ctx: LevelContext) -> List[List[int]]:
+        if self.box_cells is None:
+            return [[ctx.cell_index[b]] for b in sorted(ctx.boxes)]
+        if len(self.box_cells) != len(ctx.boxes):
+            raise ValueError(f"box_cells có {len(self.box_cells)} tập ô nhưng level có {len(ctx.boxes)} thùng")
+        return [self._cell_indices(ctx, cells, f"box_cells[{i}]") for i, cells in enumerate(self.box_cells)]
+
+    def packed_keys(self, ctx: LevelContext) -> Iterator[int]:
+        """Sinh lần lượt các trạng thái đóng gói khác nhau (xem LevelContext.pack_state).
+
+        ValueError nếu có ô không hợp lệ (tường, ngoài level) hoặc số tập ô khác số thùng.
+        """
+        if self.player_cells is None:
+            if ctx.player is None:
+                return
+            players = [ctx.cell_index[ctx.player]]
+        else:
+            players = self._cell_indices(ctx, self.player_cells, "player_cells")
+
+        candidates = self._box_candidates(ctx)
+        # Thùng có cùng tập ô đứng cạnh nhau để ràng buộc thứ tự chỉ cần so với thùng ngay trước.
+        candidates.sort()
+        same_as_prev = [i > 0 and candidates[i] == candidates[i - 1] for i in range(len(candidates))]
+        sets = [set(c) for c in candidates]
+        needs_dedupe = any(sets[i] != sets[j] and sets[i] & sets[j]
+                           for i in range(len(sets)) for j in range(i + 1, len(sets)))
+        seen = set() if needs_dedupe else None
+        shift = ctx.player_bits
+
+        def assign(i: int, used: int, last: int) -> Iterator[int]:
+            if i == len(candidates):
+                yield used
+                return
+            for cell in candidates[i]:
+                if same_as_prev[i] and cell <= last:
+                    continue
+                bit = 1 << cell
+                if used & bit:
+                    continue
+                yield from assign(i + 1, used | bit, cell)
+
+        for boxes in assign(0, 0, -1):
+            if seen is not None:
+                if boxes in seen:
+                    continue
+                seen.add(boxes)
+            for player in players:
+                if not boxes >> player & 1:
+                    yield (boxes << shift) | player
+
+    def states(self, ctx: LevelContext) -> Iterator[State]:
+        for key in self.packed_keys(ctx):
+            yield ctx.unpack_state(key)
+
+
+def packed_start_belief(ctx: LevelContext, possible_start_states) -> Tuple[int, ...]:
+    """Belief ban đầu dạng tuple đã sắp xếp các trạng thái đóng gói.
+
+    possible_start_states là StartUncertainty hoặc một iterable các cặp (người chơi, tập thùng).
+    Belief chính là tập mọi trạng thái bắt đầu nên hàm này luôn dựng đủ cả tập; chỉ các
+    solver cần một trạng thái (first_start_state) mới sinh lười được. packed_keys đã không
+    trùng nên chỉ cần sắp xếp, không tạo thêm tập trung gian.
+    """
+    if isinstance(possible_start_states, StartUncertainty):
+        return tuple(sorted(possible_start_states.packed_keys(ctx)))
+    return tuple(sorted({ctx.pack_state(p, b) for p, b in possible_start_states}))
+
+
+def first_start_state(ctx: LevelContext, possible_start_states) -> Optional[State]:
+    if isinstance(possible_start_states, StartUncertainty):
+        return next(possible_start_states.states(ctx), None)
+    return next(iter(possible_start_states), None)
@@ -0,0 +1,122 @@
+from math import comb
+from typing import List, Optional
+
+from level_context import LevelContext, UNREACHABLE
+
+
+class StateRanker:
+    """Đánh số hoàn hảo các trạng thái (vị trí thùng, ô người chơi) thành số nguyên liên tục.
+
+    Thùng chỉ được đặt trên các ô sống (không phải dead square) nên tập thùng được xếp
+    hạng bằng hệ số tổ hợp trên các ô sống; rank = rank_thùng * num_cells + ô_người_chơi.
+    """
+
+    def __init__(self, ctx: LevelContext, num_boxes: Optional[int] = None):
+        self.ctx = ctx
+        self.num_boxes = len(ctx.boxes) if num_boxes is None else num_boxes
+        self.live_cells: List[int] = [i for i in range(ctx.num_cells) if i not in ctx.dead_indices]
+        self.live_index: List[int] = [UNREACHABLE] * ctx.num_cells
+        for li, cell in enumerate(self.live_cells):
+            self.live_index[cell] = li
+        num_live = len(self.live_cells)
+        self.binom = [[comb(n, k) for k in range(self.num_boxes + 1)] for n in range(num_live + 1)]
+        self.num_box_configs = self.binom[num_live][self.num_boxes]
+        self.size = self.num_box_configs * ctx.num_cells
+
+    def rank_key(self, key: int) -> Optional[int]:
+        # None nếu trạng thái có thùng nằm trên dead square (không thể xếp hạng).
+        ctx = self.ctx
+        bits = key >> ctx.player_bits
+        box_rank = 0
+        i = 0
+        while bits:
+            low = bits & -bits
+            li = self.live_index[low.bit_length() - 1]
+            if li == UNREACHABLE:
+                return None
+            i += 1
+            box_rank += self.binom[li][i]
+            bits ^= low
+        return box_rank * ctx.num_cells + (key & ctx.player_mask)
+
+    def unrank_key(self, rank: int) -> int:
+        ctx = self.ctx
+        box_rank, player = divmod(rank, ctx.num_cells)
+        boxes = 0
+        li = len(self.live_cells) - 1
+        for i in range(self.num_boxes, 0, -1):
+            while self.binom[li][i] > box_rank:
+                li -= 1
+            box_rank -= self.binom[li][i]
+            boxes |= 1 << self.live_cells[li]
+            li -= 1
+        return (boxes << ctx.player_bits) | player
+
+    def rank(self, player, boxes) -> Optional[int]:
+        return self.rank_key(self.ctx.pack_state(player, boxes))
+
+    def unrank(self, rank: int):
+        return self.ctx.unpack_state(self.unrank_key(rank))
+
+
+class BitmapVisited:
+    """Tập visited dùng 1 bit cho mỗi rank."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.bits = bytearray((size + 7) // 8)
+
+    def add(self, rank: int) -> bool:
+        # Trả về True nếu rank chưa có trước đó.
+        byte, bit = rank >> 3, 1 << (rank & 7)
+        if self.bits[byte] & bit:
+            return False
+        self.bits[byte] |= bit
+        return True
+
+    def __contains__(self, rank: int) -> bool:
+        return bool(self.bits[rank >> 3] & (1 << (rank & 7)))
+
+    def __len__(self) -> int:
+        return int.from_bytes(self.bits, 'little').bit_count()
+
+
+class ParentMoveArray:
+    """Mảng 4 bit cho mỗi rank: bước đi dẫn tới trạng thái, để dò ngược đường đi chính xác.
+
+    Mã = action | (có đẩy thùng << 2); ROOT đánh dấu trạng thái bắt đầu, 15 là chưa biết.
+    """
+
+    ROOT = 8
+    UNKNOWN = 15
+
+    def __init__(self, size: int):
+        self.size = size
+        self.data = bytearray(b'\xff' * ((size + 1) // 2))
+
+    def get(self, rank: int) -> int:
+        byte = self.data[rank >> 1]
+        return byte >> 4 if rank & 1 else byte & 0x0F
+
+    def set(self, rank: int, value: int):
+        i = rank >> 1
+        if rank & 1:
+            self.data[i] = (self.data[i] & 0x0F) | (value << 4)
+        else:
+            self.data[i] = (self.data[i] & 0xF0) | value
+
+    def __contains__(self, rank: int) -> bool:
+        return self.get(rank) != self.UNKNOWN
+
+
+def previous_key(ctx: LevelContext, key: int, code: int) -> int:
+    # Trạng thái trước khi thực hiện bước đi có mã code (xem ParentMoveArray) để tới key.
+    action = code & 3
+    player = key & ctx.player_mask
+    boxes = key >> ctx.player_bits
+    prev = ctx.neighbours[player][action ^ 1]
+    if code & 4:
+        pushed = ctx.neighbours[player][action]
+        boxes ^= (1 << pushed) | (1 << player)
+    return (boxes << ctx.player_bits) | prev
+
@@ -0,0 +1,64 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from box_goal_csp import BoxGoalCSP
+from level_context import LevelContext
+
+# Hai goal: (1, 1) ở góc trên trái, (5, 3) ở góc dưới phải.
+ROOM = [
+    "#######",
+    "#.    #",
+    "#  @  #",
+    "#    .#",
+    "#######",
+]
+
+# Hành lang cụt rộng 1 ô (1..3, 1), đầu cụt ở x = 0, chứa cả hai goal.
+CORRIDOR = [
+    "########",
+    "#..    #",
+    "####   #",
+    "#   @  #",
+    "########",
+]
+
+
+def _csp(rows):
+    return BoxGoalCSP(LevelContext([list(r) for r in rows]))
+
+
+def test_arc_consistent_keeps_full_domains_in_open_room():
+    csp = _csp(ROOM)
+    boxes = frozenset({(2, 2), (3, 2)})
+    domains = csp.arc_consistent(boxes, (3, 3))
+    assert domains == {(2, 2): frozenset({(1, 1), (5, 3)}), (3, 2): frozenset({(1, 1), (5, 3)})}
+    assert csp.conflict_set(boxes) is None
+
+
+def test_dead_square_box_is_its_own_conflict():
+    csp = _csp(ROOM)
+    boxes = frozenset({(5, 1), (2, 2)})
+    assert csp.unary_domain((5, 1)) == frozenset()
+    assert csp.arc_consistent(boxes, (3, 2)) is None
+    assert csp.conflict_set(boxes) == frozenset({(5, 1)})
+
+
+def test_hall_violation_reports_both_boxes():
+    # Hai thùng sát tường trên chỉ đẩy dọc tường được, cùng tranh goal (1, 1).
+    csp = _csp(ROOM)
+    boxes = frozenset({(2, 1), (4, 1)})
+    assert csp.unary_domain((2, 1)) == frozenset({(1, 1)})
+    assert csp.arc_consistent(boxes, (3, 2)) is None
+    assert csp.conflict_set(boxes) == boxes
+
+
+def test_corridor_order_is_enforced_only_when_player_is_outside():
+    csp = _csp(CORRIDOR)
+    boxes = frozenset({(2, 1), (3, 1)})
+    assert csp.arc_consistent(boxes, (4, 3)) == {(2, 1): frozenset({(1, 1)}), (3, 1): frozenset({(2, 1)})}
+    # Người chơi đứng sâu hơn các thùng thì còn kéo/đẩy ra được, không ràng buộc thứ tự.
+    relaxed = csp.arc_consistent(boxes, (1, 1))
+    assert relaxed == {(2, 1): frozenset({(1, 1), (2, 1)}), (3, 1): frozenset({(1, 1), (2, 1)})}
+    assert csp.conflict_set(boxes) is None
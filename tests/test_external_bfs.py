@@ -0,0 +1,82 @@
+import io
+import os
+import sys
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import external_bfs
+from bfs_sokoban import solve_with_bfs, solve_with_external_bfs
+from level_context import LevelContext
+from unobservable_sokoban import solve_with_unobservable_search
+
+LEVEL = [
+    "########",
+    "#      #",
+    "# $ $  #",
+    "#  ##  #",
+    "# .  . #",
+    "#   @  #",
+    "########",
+]
+
+
+def _parse(rows):
+    width = max(len(r) for r in rows)
+    return [list(r.ljust(width, '#')) for r in rows]
+
+
+def test_external_bfs_matches_in_memory_bfs(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    level = _parse(LEVEL)
+    ctx = LevelContext(level)
+    with redirect_stdout(io.StringIO()):
+        expected = solve_with_bfs(level, 0, context=ctx)
+        path = solve_with_bfs(level, 0, context=ctx, external_memory=True, work_dir=str(tmp_path))
+    assert expected is not None and path is not None
+    assert len(path) == len(expected)
+
+
+def test_external_bfs_bounds_open_runs(monkeypatch, tmp_path):
+    # Bộ đệm nhỏ sinh rất nhiều run mỗi tầng; không bao giờ được đọc quá max_open_runs run cùng lúc.
+    opened = [0, 0]
+    read_records = external_bfs._read_records
+
+    def counting_read(filename):
+        opened[0] += 1
+        opened[1] = max(opened[1], opened[0])
+        try:
+            yield from read_records(filename)
+        finally:
+            opened[0] -= 1
+
+    monkeypatch.setattr(external_bfs, "_read_records", counting_read)
+    ctx = LevelContext(_parse(LEVEL))
+    width = ctx.state_bytes
+
+    def successors(rec):
+        key = int.from_bytes(rec, 'big')
+        for action in range(4):
+            nxt = ctx.apply_action(key, action)
+            if nxt is not None:
+                yield action, nxt.to_bytes(width, 'big')
+
+    searcher = external_bfs.ExternalBFS(successors, lambda rec: ctx.is_solved_key(int.from_bytes(rec, 'big')),
+                                        buffer_records=4, work_dir=str(tmp_path), max_open_runs=3)
+    path = searcher.search(ctx.pack_state(ctx.player, ctx.boxes).to_bytes(width, 'big'))
+    with redirect_stdout(io.StringIO()):
+        expected = solve_with_external_bfs(ctx, 0, work_dir=str(tmp_path))
+    assert path is not None and len(path) == len(expected)
+    # 3 run của tầng cộng với run visited.
+    assert opened[1] <= 4
+    assert not os.listdir(tmp_path)
+
+
+def test_external_unobservable_stops_at_budget(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    out = io.StringIO()
+    with redirect_stdout(out):
+        path = solve_with_unobservable_search(_parse(LEVEL), 0, external_memory=True,
+                                              max_nodes=5, work_dir=str(tmp_path))
+    assert path is None
+    assert "ngân sách" in out.getvalue()
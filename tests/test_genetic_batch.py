@@ -0,0 +1,46 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip("numpy")
+
+from genetic_algorithms_sokoban import BatchSimulator, chromosome_fitness, evolve_population
+from level_context import LevelContext
+
+LEVEL = [
+    "########",
+    "#      #",
+    "# $ $  #",
+    "#  ##  #",
+    "# .  . #",
+    "#   @  #",
+    "########",
+]
+
+
+def _parse(rows):
+    width = max(len(r) for r in rows)
+    return [list(r.ljust(width, '#')) for r in rows]
+
+
+def test_batch_fitness_matches_scalar_fitness():
+    ctx = LevelContext(_parse(LEVEL))
+    rng = random.Random(7)
+    population = [[rng.randrange(4) for _ in range(60)] for _ in range(200)]
+    batch = BatchSimulator(ctx).fitness(np.array(population, dtype=np.int8))
+    expected = [chromosome_fitness(ctx, chromo) for chromo in population]
+    assert np.allclose(batch, expected)
+
+
+def test_batch_tournament_samples_without_replacement():
+    # Giải đấu gồm cả quần thể: lấy không hoàn lại thì cá thể tốt nhất luôn thắng.
+    rng = np.random.default_rng(3)
+    population = np.repeat(np.arange(6, dtype=np.int8)[:, None], 8, axis=1)
+    fitness = np.array([1.0, 2.0, 9.0, 3.0, 0.5, 1.5])
+    for _ in range(20):
+        children = evolve_population(population, fitness, 0.0, rng, tournament_size=6)
+        assert (children == population[2]).all()
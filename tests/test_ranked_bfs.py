@@ -0,0 +1,110 @@
+import io
+import os
+import sys
+from collections import deque
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bfs_sokoban
+from bfs_sokoban import solve_with_ranked_bfs
+from level_context import LevelContext
+from state_ranking import StateRanker
+
+# Lời giải ngắn nhất dài hơn 15 bước: mảng 4 bit cũ lưu độ sâu theo modulo 15.
+DEEP_LEVEL = [
+    "#########",
+    "# #   # #",
+    "#    ####",
+    "# # $$ ##",
+    "# ## #  #",
+    "#      .#",
+    "#.  # @ #",
+    "# #     #",
+    "#########",
+]
+
+
+def _parse(rows):
+    width = max(len(r) for r in rows)
+    return [list(r.ljust(width, '#')) for r in rows]
+
+
+def _shortest_length(ctx):
+    start = ctx.pack_state(ctx.player, ctx.boxes)
+    seen = {start: 0}
+    queue = deque([start])
+    while queue:
+        key = queue.popleft()
+        if ctx.is_solved_key(key):
+            return seen[key]
+        for action in range(4):
+            nxt = ctx.apply_action(key, action)
+            if nxt is not None and nxt not in seen:
+                seen[nxt] = seen[key] + 1
+                queue.append(nxt)
+    return None
+
+
+def _replay(ctx, path):
+    key = ctx.pack_state(ctx.player, ctx.boxes)
+    for action in path:
+        nxt = ctx.apply_action(key, action)
+        assert nxt is not None, "bước đi bị chặn"
+        key = nxt
+    return ctx.is_solved_key(key)
+
+
+def test_ranked_bfs_path_deeper_than_nibble_range():
+    ctx = LevelContext(_parse(DEEP_LEVEL))
+    optimal = _shortest_length(ctx)
+    assert optimal is not None and optimal > 15
+    with redirect_stdout(io.StringIO()):
+        path = solve_with_ranked_bfs(ctx, 0)
+    assert path is not None
+    assert len(path) == optimal
+    assert _replay(ctx, path)
+
+
+def test_rank_unrank_round_trip():
+    ctx = LevelContext(_parse(DEEP_LEVEL))
+    ranker = StateRanker(ctx)
+    start = ctx.pack_state(ctx.player, ctx.boxes)
+    seen = {start}
+    queue = deque([start])
+    ranks = set()
+    while queue:
+        key = queue.popleft()
+        rank = ranker.rank_key(key)
+        if rank is not None:
+            assert 0 <= rank < ranker.size
+            assert ranker.unrank_key(rank) == key
+            ranks.add(rank)
+        for action in range(4):
+            nxt = ctx.apply_action(key, action)
+            if nxt is not None and nxt not in seen:
+                seen.add(nxt)
+                queue.append(nxt)
+    assert len(ranks) == sum(ranker.rank_key(k) is not None for k in seen)
+
+
+def test_bitmap_bfs_falls_back_when_rank_space_too_large(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(bfs_sokoban, "MAX_RANKED_STATES", 10)
+    level = _parse(DEEP_LEVEL)
+    ctx = LevelContext(level)
+    with redirect_stdout(io.StringIO()):
+        assert solve_with_ranked_bfs(ctx, 0) is None
+        path = bfs_sokoban.solve_with_bfs(level, 0, context=ctx, bitmap_visited=True)
+    assert path is not None
+    assert len(path) == _shortest_length(ctx)
+
+
+def test_bitmap_with_external_memory_is_rejected(tmp_path):
+    level = _parse(DEEP_LEVEL)
+    out = io.StringIO()
+    with redirect_stdout(out):
+        path = bfs_sokoban.solve_with_bfs(level, 0, context=LevelContext(level), bitmap_visited=True,
+                                          external_memory=True, work_dir=str(tmp_path))
+    assert path is None
+    assert "external_memory" in out.getvalue()
@@ -0,0 +1,82 @@
+import io
+import os
+import sys
+from contextlib import redirect_stdout
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from A_sokoban import solve_with_a_star
+from bfs_sokoban import solve_with_bfs
+from level_context import LevelContext
+from search_checkpoint import SearchCheckpoint, load_checkpoint, save_checkpoint
+
+LEVEL = [
+    "########",
+    "#      #",
+    "# $ $  #",
+    "#  ##  #",
+    "# .  . #",
+    "#   @  #",
+    "########",
+]
+
+OTHER_LEVEL = [
+    "######",
+    "#@$ .#",
+    "######",
+]
+
+
+def _parse(rows):
+    width = max(len(r) for r in rows)
+    return [list(r.ljust(width, '#')) for r in rows]
+
+
+def test_checkpoint_round_trip(tmp_path):
+    ctx = LevelContext(_parse(LEVEL))
+    start = ctx.pack_state(ctx.player, ctx.boxes)
+    nxt = ctx.apply_action(start, 0)
+    checkpoint = SearchCheckpoint('A*', [(7, 1, nxt, [0]), (9, 0, start, [])],
+                                  {start: 0, nxt: 1}, (2, [0, 3, 1, 2, 2]))
+    filename = str(tmp_path / "a.ckpt")
+    save_checkpoint(filename, ctx, checkpoint)
+    loaded = load_checkpoint(filename, ctx, 'A*')
+    assert loaded.algorithm == 'A*'
+    assert loaded.open_list == checkpoint.open_list
+    assert loaded.visited == checkpoint.visited
+    assert loaded.incumbent == checkpoint.incumbent
+
+
+def test_checkpoint_rejects_other_level_and_algorithm(tmp_path):
+    ctx = LevelContext(_parse(LEVEL))
+    start = ctx.pack_state(ctx.player, ctx.boxes)
+    filename = str(tmp_path / "bfs.ckpt")
+    save_checkpoint(filename, ctx, SearchCheckpoint('BFS', [(0, 0, start, [])], {start: 0}))
+    with pytest.raises(ValueError):
+        load_checkpoint(filename, LevelContext(_parse(OTHER_LEVEL)), 'BFS')
+    with pytest.raises(ValueError):
+        load_checkpoint(filename, ctx, 'A*')
+
+
+@pytest.mark.parametrize("solve", [solve_with_bfs, solve_with_a_star])
+def test_resume_reaches_same_solution(solve, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    level = _parse(LEVEL)
+    filename = str(tmp_path / "search.ckpt")
+    with redirect_stdout(io.StringIO()):
+        expected = solve(level, 0, max_states=100000)
+        assert solve(level, 0, max_states=50, checkpoint_file=filename) is None
+        resumed = solve(level, 0, max_states=100000, resume_from=filename)
+    assert os.path.exists(filename)
+    assert expected is not None and resumed is not None
+    assert len(resumed) == len(expected)
+
+
+def test_resume_from_other_level_returns_none(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    filename = str(tmp_path / "bfs.ckpt")
+    with redirect_stdout(io.StringIO()):
+        solve_with_bfs(_parse(LEVEL), 0, max_states=50, checkpoint_file=filename)
+        assert solve_with_bfs(_parse(OTHER_LEVEL), 1, resume_from=filename) is None
@@ -0,0 +1,107 @@
+import io
+import os
+import sys
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backtracking_sokoban import solve_with_backtracking
+from transposition_table import EXHAUSTED, DepthFirstMemo, TranspositionTable
+
+LEVEL = [
+    "########",
+    "#      #",
+    "# $ $  #",
+    "#  ##  #",
+    "# .  . #",
+    "#   @  #",
+    "########",
+]
+
+
+def _parse(rows):
+    width = max(len(r) for r in rows)
+    return [list(r.ljust(width, '#')) for r in rows]
+
+
+def _replay(level, path):
+    player = next((x, y) for y, row in enumerate(level) for x, c in enumerate(row) if c in '@+')
+    boxes = {(x, y) for y, row in enumerate(level) for x, c in enumerate(row) if c in '$*'}
+    goals = {(x, y) for y, row in enumerate(level) for x, c in enumerate(row) if c in '.+*'}
+    for action in path:
+        dx, dy = ((-1, 0), (1, 0), (0, -1), (0, 1))[action]
+        nxt = (player[0] + dx, player[1] + dy)
+        assert level[nxt[1]][nxt[0]] != '#'
+        if nxt in boxes:
+            dest = (nxt[0] + dx, nxt[1] + dy)
+            assert level[dest[1]][dest[0]] != '#' and dest not in boxes
+            boxes = boxes - {nxt} | {dest}
+        player = nxt
+    return goals <= boxes
+
+
+def test_replacement_keeps_shallowest_entry():
+    # Một bucket: ô 0 giữ mục nông nhất, ô 1 luôn bị ghi đè.
+    table = TranspositionTable(capacity=2)
+    table.store('a', 5)
+    table.store('b', 3)
+    assert table.probe('a') == 5 and table.probe('b') == 3
+    table.store('c', 7)
+    assert table.probe('a') is None
+    assert table.probe('b') == 3 and table.probe('c') == 7
+    assert table.evictions == 1
+    table.store('d', 1)
+    assert table.probe('d') == 1 and table.probe('b') == 3
+    assert table.probe('c') is None
+
+
+def test_should_expand_only_at_shallower_depth():
+    table = TranspositionTable(capacity=16)
+    assert table.should_expand('s', 4)
+    assert not table.should_expand('s', 4)
+    assert not table.should_expand('s', 6)
+    assert table.should_expand('s', 2)
+    assert table.probe('s') == 2
+
+
+def test_exhausted_state_is_never_expanded_again():
+    table = TranspositionTable(capacity=16)
+    table.store('s', 3)
+    table.mark_exhausted('s')
+    assert table.is_exhausted('s')
+    assert table.probe('s') == EXHAUSTED
+    assert not table.should_expand('s', 0)
+
+
+def test_memo_marks_exhausted_only_without_cutoffs():
+    memo = DepthFirstMemo(capacity=64)
+    token = memo.enter('leaf', 1)
+    memo.leave('leaf', 1, token)
+    assert memo.table.is_exhausted('leaf')
+    assert memo.enter('leaf', 0) is None
+
+    # Cây con chạm giới hạn độ sâu thì chỉ ghi độ sâu, sau này gặp nông hơn vẫn mở rộng lại.
+    token = memo.enter('cut', 2)
+    memo.cutoff()
+    memo.leave('cut', 2, token)
+    assert not memo.table.is_exhausted('cut')
+    assert memo.enter('cut', 1) is not None
+
+
+def test_memo_does_not_exhaust_states_depending_on_ancestors():
+    memo = DepthFirstMemo(capacity=64)
+    root = memo.enter('root', 0)
+    child = memo.enter('child', 1)
+    assert memo.enter('root', 2) is None  # chu trình về tổ tiên
+    memo.leave('child', 1, child)
+    assert not memo.table.is_exhausted('child')
+    memo.leave('root', 0, root)
+    assert memo.table.is_exhausted('root')
+
+
+def test_backtracking_with_tiny_table_still_solves(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    level = _parse(LEVEL)
+    with redirect_stdout(io.StringIO()):
+        path = solve_with_backtracking(level, 0, tt_capacity=64)
+    assert path is not None and _replay(level, path)
@@ -0,0 +1,54 @@
+import io
+import os
+import sys
+from contextlib import redirect_stdout
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from level_context import LevelContext
+from start_uncertainty import StartUncertainty
+from unobservable_sokoban import solve_with_unobservable_search
+
+LEVEL = [
+    "########",
+    "#      #",
+    "# $ $  #",
+    "#  ##  #",
+    "# .  . #",
+    "#   @  #",
+    "########",
+]
+
+
+def _parse(rows):
+    width = max(len(r) for r in rows)
+    return [list(r.ljust(width, '#')) for r in rows]
+
+
+def _solves_every_start(ctx, spec, path):
+    # Kế hoạch conformant: bước đi bị chặn thì giữ nguyên trạng thái.
+    for key in spec.packed_keys(ctx):
+        for action in path:
+            moved = ctx.apply_action(key, action)
+            key = key if moved is None else moved
+        if not ctx.is_solved_key(key):
+            return False
+    return True
+
+
+@pytest.mark.parametrize("search", ["bfs", "astar"])
+@pytest.mark.parametrize("cells", [[(4, 5), (5, 5)], [(1, 1), (6, 5)]])
+def test_dominance_keeps_plan_length(search, cells, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    level = _parse(LEVEL)
+    ctx = LevelContext(level)
+    spec = StartUncertainty(player_cells=cells)
+    with redirect_stdout(io.StringIO()):
+        pruned = solve_with_unobservable_search(level, 0, spec, context=ctx, dominance=True, search=search)
+        full = solve_with_unobservable_search(level, 0, spec, context=ctx, dominance=False, search=search)
+    assert pruned is not None and full is not None
+    assert len(pruned) == len(full)
+    assert _solves_every_start(ctx, spec, pruned)
+    assert _solves_every_start(ctx, spec, full)
@@ -0,0 +1,124 @@
+from array import array
+from typing import Hashable, Optional
+
+# Độ sâu đặc biệt: cây con đã được duyệt hết mà không chạm giới hạn độ sâu, không cần mở rộng lại.
+EXHAUSTED = -1
+
+
+class TranspositionTable:
+    """Bảng chuyển vị dung lượng cố định: trạng thái -> độ sâu nông nhất đã gặp.
+
+    Mỗi bucket có 2 ô: ô 0 ưu tiên độ sâu (giữ mục nông nhất, vì cây con bên dưới lớn nhất),
+    ô 1 luôn bị ghi đè. Bộ nhớ bị chặn bởi capacity, đổi lại một trạng thái đã bị đẩy ra
+    có thể được mở rộng lại.
+    """
+
+    def __init__(self, capacity: int = 1 << 18):
+        self.num_buckets = max(1, capacity // 2)
+        self.keys = [None] * (2 * self.num_buckets)
+        self.depths = array('i', [-1]) * (2 * self.num_buckets)
+        self.hits = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def _slot(self, key: Hashable) -> int:
+        return (hash(key) % self.num_buckets) * 2
+
+    def probe(self, key: Hashable) -> Optional[int]:
+        i = self._slot(key)
+        if self.keys[i] == key:
+            return self.depths[i]
+        if self.keys[i + 1] == key:
+            return self.depths[i + 1]
+        return None
+
+    def store(self, key: Hashable, depth: int):
+        i = self._slot(key)
+        keys, depths = self.keys, self.depths
+        self.stores += 1
+        if keys[i] == key:
+            depths[i] = min(depths[i], depth)
+            return
+        if keys[i + 1] == key:
+            depth = min(depths[i + 1], depth)
+            keys[i + 1] = None
+            depths[i + 1] = -1
+        if keys[i] is None:
+            keys[i], depths[i] = key, depth
+        elif depth <= depths[i]:
+            # Mục cũ ở ô ưu tiên bị hạ xuống ô luôn-ghi-đè.
+            if keys[i + 1] is not None:
+                self.evictions += 1
+            keys[i + 1], depths[i + 1] = keys[i], depths[i]
+            keys[i], depths[i] = key, depth
+        else:
+            if keys[i + 1] is not None:
+                self.evictions += 1
+            keys[i + 1], depths[i + 1] = key, depth
+
+    def should_expand(self, key: Hashable, depth: int) -> bool:
+        # False nếu trạng thái đã được gặp ở độ sâu nông hơn hoặc bằng; ngược lại ghi nhận và trả về True.
+        stored = self.probe(key)
+        if stored is not None and stored <= depth:
+            self.hits += 1
+            return False
+        self.store(key, depth)
+        return True
+
+    def mark_exhausted(self, key: Hashable):
+        self.store(key, EXHAUSTED)
+
+    def is_exhausted(self, key: Hashable) -> bool:
+        return self.probe(key) == EXHAUSTED
+
+    def __len__(self) -> int:
+        return sum(1 for k in self.keys if k is not None)
+
+
+class DepthFirstMemo:
+    """Bộ nhớ cho DFS giới hạn độ sâu, dựa trên TranspositionTable.
+
+    Phân biệt ba loại cắt tỉa: chu trình (trạng thái đang nằm trên đường đi hiện tại),
+    trạng thái đã duyệt ở độ sâu nông hơn, và chạm giới hạn độ sâu. Một trạng thái
+    thất bại mà cây con không chạm giới hạn độ sâu và không phụ thuộc vào tổ tiên
+    phía trên nó thì được đánh dấu EXHAUSTED và không bao giờ mở rộng lại.
+    """
+
+    def __init__(self, capacity: int = 1 << 18):
+        self.table = TranspositionTable(capacity)
+        self.on_path = {}
+        self.cutoffs = 0
+        self.low = float('inf')
+
+    def cutoff(self):
+        self.cutoffs += 1
+
+    def enter(self, key: Hashable, depth: int):
+        # None nếu phải cắt tỉa; ngược lại trả về token để truyền cho leave().
+        ancestor_depth = self.on_path.get(key)
+        if ancestor_depth is not None:
+            self.low = min(self.low, ancestor_depth)
+            return None
+        if not self.table.should_expand(key, depth):
+            if not self.table.is_exhausted(key):
+                self.cutoffs += 1
+            return None
+        self.on_path[key] = depth
+        token = (self.cutoffs, self.low)
+        self.low = float('inf')
+        return token
+
+    def leave(self, key: Hashable, depth: int, token):
+        cutoffs_before, outer_low = token
+        del self.on_path[key]
+        subtree_low = self.low
+        if self.cutoffs == cutoffs_before and subtree_low >= depth:
+            self.table.mark_exhausted(key)
+        self.low = min(outer_low, subtree_low) if subtree_low < depth else outer_low
+
+    def abandon(self, key: Hashable, token):
+        # Trạng thái nằm trong cây con đã được chứng minh chết (backjumping): rời đường đi và
+        # đánh dấu EXHAUSTED, bỏ qua thông tin cắt tỉa của cây con.
+        del self.on_path[key]
+        self.low = token[1]
+        self.table.mark_exhausted(key)
@@ -1,6 +1,11 @@
 import time
+import heapq
 from collections import deque
-from typing import List, Tuple, Set, FrozenSet
+from typing import List, Tuple, Optional, Set, FrozenSet, Union
+
+from level_context import LevelContext, get_level_context, UNREACHABLE
+from external_bfs import ExternalBFS
+from start_uncertainty import StartUncertainty, packed_start_belief
 
 def save_unobservable_solution(level_idx, path,elapsed_time):
     if path is None:
@@ -13,77 +18,242 @@ def save_unobservable_solution(level_idx, path,elapsed_time):
         f.write(f"Path Unobservable: {path}\n\n")
     print(f"Unobservable: Đã lưu lời giải cho Level {level_idx} vào solutions.txt")
 
-def solve_with_unobservable_search(level_data: List[List[str]], level_idx: int,
-                                  possible_start_states: List[Tuple[Tuple[int, int], FrozenSet[Tuple[int, int]]]] = None):
+# Ngân sách mặc định của bản external: không có nó, belief vô nghiệm chạy tới khi đầy đĩa.
+EXTERNAL_MAX_RECORDS = 10_000_000
+
+def _solve_external(ctx: LevelContext, start_belief: Tuple[int, ...], buffer_states, work_dir,
+                    max_records: int, deadline: Optional[float]):
+    # Belief được ghi thành chuỗi các trạng thái đóng gói, sắp xếp, cùng độ dài.
+    width = ctx.state_bytes
+
+    def split(rec: bytes):
+        return [int.from_bytes(rec[i:i + width], 'big') for i in range(0, len(rec), width)]
+
+    def successors(rec: bytes):
+        keys = split(rec)
+        for action in range(4):
+            nxt = set()
+            for key in keys:
+                moved = ctx.apply_action(key, action)
+                nxt.add(key if moved is None else moved)
+            if any(ctx.has_dead_box(k) for k in nxt):
+                continue
+            yield action, b''.join(k.to_bytes(width, 'big') for k in sorted(nxt))
+
+    def is_goal(rec: bytes) -> bool:
+        return all(ctx.is_solved_key(k) for k in split(rec))
+
+    start = b''.join(k.to_bytes(width, 'big') for k in start_belief)
+    searcher = ExternalBFS(successors, is_goal, buffer_records=buffer_states, work_dir=work_dir)
+    path = searcher.search(start, max_records=max_records, deadline=deadline)
+    return path, 'budget' if searcher.budget_exceeded else 'exhausted'
+
+def _dominated(belief: Tuple[int, ...], members: Set[int], by_min,
+               g_cost: Optional[dict] = None, g: int = 0) -> bool:
+    # Một belief đã thấy A ⊂ belief thì belief không bao giờ dễ hơn A: mọi kế hoạch cho
+    # belief cũng giải được A, và A nằm ở độ sâu không lớn hơn trong BFS (với A* thì
+    # cần thêm g(A) <= g). A ⊂ belief đòi hỏi phần tử nhỏ nhất của A thuộc belief,
+    # nên chỉ cần xét by_min[x] với x trong belief.
+    for x in belief:
+        for other in by_min.get(x, ()):
+            if len(other) < len(belief) and members.issuperset(other):
+                if g_cost is None or g_cost.get(other, g + 1) <= g:
+                    return True
+    return False
+
+class StateHeuristicMemo:
+    """Cận dưới số bước cho một trạng thái đóng gói: tổng số lần đẩy tối thiểu của từng thùng.
+
+    Mỗi bước đi đẩy được tối đa một thùng một ô nên giá trị này chấp nhận được và nhất quán.
+    Kết quả được nhớ theo trạng thái vì cùng một trạng thái xuất hiện trong rất nhiều belief;
+    None nghĩa là có thùng không bao giờ tới được goal.
+    """
+
+    def __init__(self, ctx: LevelContext, capacity: int = 1_000_000):
+        self.ctx = ctx
+        self.capacity = capacity
+        self.memo = {}
+
+    def __call__(self, key: int) -> Optional[int]:
+        h = self.memo.get(key, -1)
+        if h != -1:
+            return h
+        ctx = self.ctx
+        bits = key >> ctx.player_bits
+        h = 0
+        while bits:
+            low = bits & -bits
+            d = ctx.box_distance[low.bit_length() - 1]
+            if d == UNREACHABLE:
+                h = None
+                break
+            h += d
+            bits ^= low
+        if len(self.memo) >= self.capacity:
+            self.memo.clear()
+        self.memo[key] = h
+        return h
+
+def _belief_heuristic(belief, state_h: StateHeuristicMemo) -> Optional[int]:
+    # Belief chỉ được giải khi mọi trạng thái thành viên được giải: lấy max các cận dưới.
+    best = 0
+    for key in belief:
+        h = state_h(key)
+        if h is None:
+            return None
+        if h > best:
+            best = h
+    return best
+
+def _solve_astar(ctx: LevelContext, start: Tuple[int, ...], dominance: bool,
+                 max_nodes: Optional[int], deadline: Optional[float]):
+    # A* conformant trên belief đóng gói, h(belief) = max h(trạng thái) nên vẫn tối ưu.
+    state_h = StateHeuristicMemo(ctx)
+    start_h = _belief_heuristic(start, state_h)
+    if start_h is None:
+        return None, 'exhausted'
+
+    parents = {start: None}
+    g_cost = {start: 0}
+    by_min = {start[0]: [start]}
+    counter = 0
+    pq = [(start_h, 0, counter, start)]
+    closed = set()
+    expanded = 0
+
+    while pq:
+        _, g, _, belief = heapq.heappop(pq)
+        if belief in closed or g > g_cost[belief]:
+            continue
 
-    def get_goals(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char in ['.', '+', '*']}
+        if all(ctx.is_solved_key(k) for k in belief):
+            path = []
+            while parents[belief] is not None:
+                belief, action = parents[belief]
+                path.append(action)
+            path.reverse()
+            return path, 'solved'
 
-    def get_walls(g: List[List[str]]) -> Set[Tuple[int, int]]:
-        return {(x, y) for y, row in enumerate(g) for x, char in enumerate(row) if char == '#'}
+        if (max_nodes is not None and expanded >= max_nodes) or (deadline is not None and time.time() > deadline):
+            return None, 'budget'
+        expanded += 1
+        closed.add(belief)
 
-    goals = get_goals(level_data)
-    walls = get_walls(level_data)
-    directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+        new_g = g + 1
+        for action in range(4):
+            members = set()
+            for key in belief:
+                moved = ctx.apply_action(key, action)
+                members.add(key if moved is None else moved)
+            next_belief = tuple(sorted(members))
+            if next_belief in closed or new_g >= g_cost.get(next_belief, new_g + 1):
+                continue
+            h = _belief_heuristic(next_belief, state_h)
+            if h is None:
+                continue
+            if dominance and next_belief not in g_cost and _dominated(next_belief, members, by_min, g_cost, new_g):
+                continue
+            if next_belief not in g_cost:
+                by_min.setdefault(next_belief[0], []).append(next_belief)
+            g_cost[next_belief] = new_g
+            parents[next_belief] = (belief, action)
+            counter += 1
+            heapq.heappush(pq, (new_g + h, new_g, counter, next_belief))
+
+    return None, 'exhausted'
+
+def _solve_packed(ctx: LevelContext, start: Tuple[int, ...], dominance: bool,
+                  max_nodes: Optional[int], deadline: Optional[float]):
+    # Belief là tuple đã sắp xếp các trạng thái đóng gói; đường đi dựng lại từ con trỏ cha.
+    parents = {start: None}
+    by_min = {start[0]: [start]}
+    queue = deque([start])
+    expanded = 0
+
+    while queue:
+        belief = queue.popleft()
+
+        if all(ctx.is_solved_key(k) for k in belief):
+            path = []
+            while parents[belief] is not None:
+                belief, action = parents[belief]
+                path.append(action)
+            path.reverse()
+            return path, 'solved'
+
+        if (max_nodes is not None and expanded >= max_nodes) or (deadline is not None and time.time() > deadline):
+            return None, 'budget'
+        expanded += 1
+
+        for action in range(4):
+            members = set()
+            for key in belief:
+                moved = ctx.apply_action(key, action)
+                members.add(key if moved is None else moved)
+            # Chỉ cần một trạng thái có thùng ở dead square là cả belief không giải được.
+            if any(ctx.has_dead_box(k) for k in members):
+                continue
+            next_belief = tuple(sorted(members))
+            if next_belief in parents:
+                continue
+            if dominance and _dominated(next_belief, members, by_min):
+                continue
+            parents[next_belief] = (belief, action)
+            by_min.setdefault(next_belief[0], []).append(next_belief)
+            queue.append(next_belief)
+
+    return None, 'exhausted'
+
+def solve_with_unobservable_search(level_data: List[List[str]], level_idx: int,
+                                  possible_start_states: Union[StartUncertainty, List[Tuple[Tuple[int, int], FrozenSet[Tuple[int, int]]]], None] = None,
+                                  context: Optional[LevelContext] = None,
+                                  external_memory: bool = False,
+                                  buffer_states: int = 1_000_000,
+                                  work_dir: Optional[str] = None,
+                                  dominance: bool = True,
+                                  max_nodes: Optional[int] = None,
+                                  max_time: Optional[float] = None,
+                                  search: str = 'bfs'):
+
+    if search not in ('bfs', 'astar'):
+        print(f"Unobservable: search phải là 'bfs' hoặc 'astar', nhận được {search!r}.")
+        return None
+
+    ctx = get_level_context(level_data, context)
 
     if possible_start_states is None:
-        player = None
-        boxes = []
-        for y, row in enumerate(level_data):
-            for x, ch in enumerate(row):
-                if ch in ['@', '+']:
-                    player = (x, y)
-                if ch in ['$', '*']:
-                    boxes.append((x, y))
-        if player is None:
+        if ctx.player is None:
             print(f"Unobservable: no player found in level {level_idx}")
             return None
-        possible_start_states = [(player, frozenset(boxes))]
-
-    initial_belief_state = frozenset(possible_start_states)
+        possible_start_states = [ctx.initial_state()]
 
-    queue = deque([([], initial_belief_state)])
-    visited = {initial_belief_state}
+    start_belief = packed_start_belief(ctx, possible_start_states)
+    if not start_belief:
+        print(f"Unobservable: Tập trạng thái bắt đầu rỗng cho Level {level_idx}.")
+        return None
 
-    print(f"Unobservable: Bắt đầu giải Level {level_idx}...")
     start_time = time.time()
+    deadline = start_time + max_time if max_time is not None else None
 
-    while queue:
-        path, current_belief_state = queue.popleft()
-
-        if all(goals.issubset(s[1]) for s in current_belief_state):
-            elapsed_time = time.time() - start_time
-            print(f"Unobservable: Tìm thấy lời giải sau {elapsed_time:.2f} giây.")
-            save_unobservable_solution(level_idx, path,elapsed_time)
-            return path
-
-        for action, (dx, dy) in enumerate(directions):
-            next_belief_state_builder = set()
-
-            for player_pos, boxes_pos in current_belief_state:
-                next_player_pos = (player_pos[0] + dx, player_pos[1] + dy)
-                if next_player_pos in walls:
-                    next_belief_state_builder.add((player_pos, boxes_pos))
-                    continue
-
-                new_boxes_pos = boxes_pos
-                if next_player_pos in boxes_pos:
-                    next_box_pos = (next_player_pos[0] + dx, next_player_pos[1] + dy)
-                    if next_box_pos in walls or next_box_pos in boxes_pos:
-                        next_belief_state_builder.add((player_pos, boxes_pos))
-                        continue
-                    box_list = list(boxes_pos)
-                    box_list.remove(next_player_pos)
-                    box_list.append(next_box_pos)
-                    new_boxes_pos = frozenset(sorted(box_list))
-
-                next_belief_state_builder.add((next_player_pos, new_boxes_pos))
-
-            next_belief_state = frozenset(next_belief_state_builder)
-            if next_belief_state not in visited:
-                visited.add(next_belief_state)
-                queue.append((path + [action], next_belief_state))
-
-    print(f"Unobservable: Không tìm thấy lời giải cho Level {level_idx}.")
-    return None
+    if external_memory:
+        # Với bản external, max_nodes giới hạn tổng số belief được ghi ra đĩa.
+        print(f"Unobservable (external): Bắt đầu giải Level {level_idx}...")
+        max_records = max_nodes if max_nodes is not None else EXTERNAL_MAX_RECORDS
+        path, status = _solve_external(ctx, start_belief, buffer_states, work_dir, max_records, deadline)
+    else:
+        print(f"Unobservable: Bắt đầu giải Level {level_idx}...")
+        # search='astar' dùng A* conformant có heuristic, 'bfs' là BFS trên belief.
+        solver = _solve_astar if search == 'astar' else _solve_packed
+        path, status = solver(ctx, start_belief, dominance, max_nodes, deadline)
 
+    if path is not None:
+        elapsed_time = time.time() - start_time
+        print(f"Unobservable: Tìm thấy lời giải sau {elapsed_time:.2f} giây.")
+        save_unobservable_solution(level_idx, path,elapsed_time)
+        return path
+
+    if status == 'budget':
+        print(f"Unobservable: Hết ngân sách tìm kiếm cho Level {level_idx}.")
+    else:
+        print(f"Unobservable: Không tìm thấy lời giải cho Level {level_idx}.")
+    return None